@@ -0,0 +1,427 @@
+""" The benchmarks module times the inner loops of the engine.  Run it directly
+to print a report.  The numbers are only meaningful relative to each other, so
+compare reports taken on the same machine before and after a change. """
+
+from __future__ import division
+
+import sys
+import timeit
+
+from vector import *
+from shapes import *
+from flocking import *
+from spatial import *
+from collisions import *
+
+# Utilities {{{1
+def footprint(instance):
+    """ Return the number of bytes used by the given object, including its
+    attribute dictionary if it has one.  The attributes themselves are not
+    counted, since they are usually shared. """
+
+    size = sys.getsizeof(instance)
+    if hasattr(instance, "__dict__"):
+        size += sys.getsizeof(instance.__dict__)
+    return size
+
+def per_call(function, number=100000):
+    """ Return the best time, in microseconds, that the given function took
+    to run once. """
+
+    timer = timeit.Timer(function)
+    best = min(timer.repeat(repeat=3, number=number))
+    return 1e6 * best / number
+
+def report(title, rows):
+    """ Print a table of labeled measurements. """
+    print title
+    for label, value, unit in rows:
+        print "    %-28s %10.3f %s" % (label, value, unit)
+    print
+
+# Geometry {{{1
+def geometry_benchmarks():
+    """ Measure the size of the basic geometric objects and the time it takes
+    to build them and to ask them for derived values. """
+
+    A = Vector(3, 4); B = Vector(1, 2)
+    line = Line(A, B)
+    circle = Circle(A, 5)
+    square = Rectangle(0, 0, 10, 10)
+    polygon = Polygon(list(square.vertices))
+
+    report("Memory per object:", [
+            ("Vector", footprint(A), "bytes"),
+            ("Line", footprint(line), "bytes"),
+            ("Circle", footprint(circle), "bytes"),
+            ("Rectangle", footprint(square), "bytes"),
+            ("Polygon", footprint(polygon), "bytes") ])
+
+    report("Time per operation:", [
+            ("Vector()", per_call(lambda: Vector(3, 4)), "us"),
+            ("Vector + Vector", per_call(lambda: A + B), "us"),
+            ("Vector * scalar", per_call(lambda: A * 2), "us"),
+            ("Vector.magnitude", per_call(lambda: A.magnitude), "us"),
+            ("Vector.normal", per_call(lambda: A.normal), "us"),
+            ("Vector.random", per_call(lambda: Vector.random()), "us"),
+            ("Line()", per_call(lambda: Line(A, B)), "us"),
+            ("Circle()", per_call(lambda: Circle(A, 5)), "us"),
+            ("Circle.move", per_call(lambda: circle.move(B)), "us"),
+            ("Rectangle()", per_call(lambda: Rectangle(0, 0, 1, 1)), "us"),
+            ("Polygon()", per_call(
+                lambda: Polygon(polygon.vertices), 10000), "us") ])
+
+# Serialization {{{1
+def serialization_benchmarks():
+    """ Compare the size and speed of packed shapes against pickled ones. """
+
+    import pickle
+
+    circle = Circle(Vector(123.456, 345.678), 10)
+    packed = circle.pack()
+    pickled = pickle.dumps(circle, 2)
+
+    report("Circle serialization:", [
+            ("pickled size", len(pickled), "bytes"),
+            ("packed size", len(packed), "bytes"),
+            ("packed size (single)", len(circle.pack(True)), "bytes"),
+            ("pickle.dumps", per_call(lambda: pickle.dumps(circle, 2)), "us"),
+            ("pickle.loads", per_call(lambda: pickle.loads(pickled)), "us"),
+            ("Circle.pack", per_call(lambda: circle.pack()), "us"),
+            ("Circle.unpack", per_call(lambda: Circle.unpack(packed)), "us") ])
+
+# Collisions {{{1
+def collision_benchmarks():
+    """ Measure the time taken by the most common collision tests. """
+
+    A = Vector(3, 4); B = Vector(40, 12)
+    line = Line(A, B); other = Line(Vector(0, 20), Vector(30, -5))
+
+    circle = Circle(Vector(12, 10), 5)
+    nearby = Circle(Vector(20, 14), 4)
+    box = Rectangle(10, 10, 30, 30)
+
+    report("Time per collision test:", [
+            ("points_nearby", per_call(
+                lambda: Collisions.points_nearby(A, B, 10)), "us"),
+            ("point_near_line", per_call(
+                lambda: Collisions.point_near_line(A, line, 5)), "us"),
+            ("lines_touching", per_call(
+                lambda: Collisions.lines_touching(line, other)), "us"),
+            ("circles_touching", per_call(
+                lambda: Collisions.circles_touching(circle, nearby)), "us"),
+            ("circle_touching_shape", per_call(
+                lambda: Collisions.circle_touching_shape(circle, box)), "us"),
+            ("shapes_touching", per_call(
+                lambda: Collisions.shapes_touching(box, box.box)), "us") ])
+
+# Polygons {{{1
+def polygon_benchmarks():
+    """ Compare the separating axis test for pairs of polygons against
+    checking every edge of one polygon against the other. """
+
+    def every_edge(first, second):
+        point_inside_shape = Collisions.point_inside_shape
+        shape_touching_line = Collisions.shape_touching_line
+
+        if point_inside_shape(first.center, second): return True
+        if point_inside_shape(second.center, first): return True
+
+        for edge in first.edges:
+            if shape_touching_line(second, edge):
+                return True
+        return False
+
+    rows = []
+
+    for sides in 4, 8, 16:
+        first = Polygon.from_regular(Vector(0, 0), 10, sides)
+        touching = Polygon.from_regular(Vector(15, 5), 10, sides, 0.1)
+        apart = Polygon.from_regular(Vector(25, 5), 10, sides, 0.1)
+
+        for label, second in ("touching", touching), ("apart", apart):
+            assert every_edge(first, second) == \
+                    Collisions.shapes_touching(first, second)
+
+            rows += [
+                    ("%d-gons %s, edges" % (sides, label), per_call(
+                        lambda: every_edge(first, second), 1000), "us"),
+                    ("%d-gons %s, axes" % (sides, label), per_call(
+                        lambda: Collisions.shapes_touching(first, second),
+                        1000), "us") ]
+
+    report("Time per polygon pair:", rows)
+
+# Obstacles {{{1
+def obstacle_benchmarks(count=400):
+    """ Compare finding the walls near a circle by testing every wall against
+    finding them with a bounding volume hierarchy. """
+
+    walls = []
+    for index in range(count):
+        x = 25 * (index % 20); y = 25 * (index // 20)
+        walls.append(Rectangle(x, y, x + 10, y + 20))
+
+    hierarchy = BoundingVolumeHierarchy(walls)
+    circle = Circle(Vector(240, 260), 10)
+
+    def brute_force():
+        circle_touching_shape = Collisions.circle_touching_shape
+        return [wall for wall in walls if circle_touching_shape(circle, wall)]
+
+    def indexed():
+        circle_touching_shape = Collisions.circle_touching_shape
+        return [wall for wall in hierarchy.query_circle(circle)
+                if circle_touching_shape(circle, wall)]
+
+    assert set(map(id, brute_force())) == set(map(id, indexed()))
+
+    report("Circle against %d walls:" % count, [
+            ("every wall", per_call(brute_force, 100), "us"),
+            ("bounding volume hierarchy", per_call(indexed, 1000), "us") ])
+
+    rays = [Line.from_direction(Vector(240, 260), 100 * Vector.from_degrees(
+        angle)) for angle in range(0, 360, 10)]
+
+    assert Collisions.ray_casts(rays, walls) == \
+            Collisions.ray_casts(rays, hierarchy)
+
+    report("%d rays against %d walls:" % (len(rays), count), [
+            ("every wall", per_call(
+                lambda: Collisions.ray_casts(rays, walls), 1) / 1000, "ms"),
+            ("bounding volume hierarchy", per_call(
+                lambda: Collisions.ray_casts(rays, hierarchy), 10) / 1000,
+                "ms") ])
+
+# Crowds {{{1
+def crowd_benchmarks(count=300):
+    """ Compare finding every pair of touching sprites by testing all pairs
+    against finding them with each of the broad phase indices.  Half of the
+    sprites are packed into one corner, since clustering is where a fixed
+    grid starts to struggle. """
+
+    boundary = Rectangle.from_size(500, 500)
+    sprites = []
+
+    for index in range(count):
+        sprite = Sprite()
+        position = Vector(index * 37 % 500, index * 53 % 500)
+        if index % 2: position /= 5
+        sprite.setup(position, 5)
+        sprites.append(sprite)
+
+    grid = SpatialHash(boundary, 20)
+    sweep = SweepAndPrune()
+
+    for sprite in sprites:
+        grid.insert(sprite)
+        sweep.insert(sprite)
+
+    def brute_force():
+        circles_touching = Collisions.circles_touching
+        circles = [sprite.get_circle() for sprite in sprites]
+        return [(first, second)
+                for index, first in enumerate(circles)
+                for second in circles[index + 1:]
+                if circles_touching(first, second)]
+
+    def indexed():
+        grid.update_all()
+        return grid.touching()
+
+    def swept():
+        sweep.update()
+        return sweep.touching()
+
+    def broadcast():
+        centers = [sprite.get_position() for sprite in sprites]
+        radii = [sprite.get_radius() for sprite in sprites]
+        return BatchCollisions.circle_pairs_touching(centers, radii)
+
+    assert len(brute_force()) == len(indexed()) == len(broadcast()) == \
+            len(swept())
+
+    report("Touching pairs among %d sprites:" % count, [
+            ("every pair", per_call(brute_force, 1) / 1000, "ms"),
+            ("spatial hash", per_call(indexed, 10) / 1000, "ms"),
+            ("sweep and prune", per_call(swept, 10) / 1000, "ms"),
+            ("numpy broadcast", per_call(broadcast, 10) / 1000, "ms") ])
+
+# Queries {{{1
+def query_benchmarks(count=300):
+    """ Compare finding the sprites near a point by checking every sprite
+    against asking the spatial hash and the quadtree. """
+
+    boundary = Rectangle.from_size(500, 500)
+    grid = SpatialHash(boundary, 20)
+    quadtree = LooseQuadtree(boundary)
+    sprites = []
+
+    for index in range(count):
+        sprite = Sprite()
+        position = Vector(index * 37 % 500, index * 53 % 500)
+        sprite.setup(position, 5)
+        sprites.append(sprite)
+
+        grid.insert(sprite)
+        quadtree.insert(sprite)
+
+    center = Vector(240, 260); radius = 40
+    view = Rectangle.from_center(center, 100, 80)
+
+    def brute_force():
+        circle = Circle(center, radius)
+        circles_touching = Collisions.circles_touching
+        return [sprite for sprite in sprites
+                if circles_touching(circle, sprite.get_circle())]
+
+    assert len(brute_force()) == len(grid.query_radius(center, radius)) \
+            == len(quadtree.query_radius(center, radius))
+
+    report("Queries among %d sprites:" % count, [
+            ("radius, every sprite", per_call(brute_force, 100), "us"),
+            ("radius, spatial hash", per_call(
+                lambda: grid.query_radius(center, radius), 1000), "us"),
+            ("radius, quadtree", per_call(
+                lambda: quadtree.query_radius(center, radius), 1000), "us"),
+            ("rectangle, quadtree", per_call(
+                lambda: quadtree.query_rect(view), 1000), "us"),
+            ("5 nearest, quadtree", per_call(
+                lambda: quadtree.nearest(center, 5), 1000), "us") ])
+
+# Coherence {{{1
+def coherence_benchmarks(count=200):
+    """ Compare testing every pair of slowly drifting sprites from scratch
+    each frame against testing them through a pair cache. """
+
+    boundary = Rectangle.from_size(500, 500)
+    sprites = []
+
+    for index in range(count):
+        sprite = Sprite()
+        position = Vector(index * 37 % 500, index * 53 % 500)
+        sprite.setup(position, 5, speed=20)
+        sprite.set_velocity(Vector.from_radians(index) * 20)
+        sprites.append(sprite)
+
+    cache = PairCache()
+
+    def drift():
+        for sprite in sprites:
+            sprite.update(0.025)
+            sprite.bounce(0.025, boundary)
+
+    def from_scratch():
+        drift()
+        circles_touching = Collisions.circles_touching
+        circles = [sprite.get_circle() for sprite in sprites]
+        return [(first, second)
+                for index, first in enumerate(circles)
+                for second in circles[index + 1:]
+                if circles_touching(first, second)]
+
+    def cached():
+        drift()
+        return cache.pairs_touching(sprites)
+
+    cached(); cache.reset_counters()
+    frame = per_call(cached, 10)
+
+    report("Touching pairs among %d drifting sprites:" % count, [
+            ("every pair", per_call(from_scratch, 10) / 1000, "ms"),
+            ("pair cache", frame / 1000, "ms"),
+            ("pair cache skip rate", 100 * cache.get_skip_rate(), "%") ])
+
+# Sprites {{{1
+def sprite_benchmarks(count=10000):
+    """ Measure how long it takes to integrate a large number of sprites that
+    are seeking a common target and bouncing off the walls, both as separate
+    sprites and as a single flock.  The sprites are also timed with a
+    scheduler that only watches one corner of the field, and when they are
+    all steered at once by a pipeline. """
+
+    boundary = Rectangle.from_size(500, 500)
+    target = DummyTarget(boundary.center, 5)
+    sprites = []
+    flock = Flock() if numpy is not None else None
+    scheduler = Scheduler([DummyTarget(Vector(0, 0), 5)], near=100, far=300)
+
+    for index in range(count):
+        sprite = Sprite()
+        position = Vector(index % 500, index // 20 % 500)
+        sprite.setup(position, 5, force=200, speed=100)
+        sprite.add_behavior(Seek(sprite, 1, target))
+        sprites.append(sprite)
+
+        if flock is not None:
+            flock.add(position, 5, force=200, speed=100)
+
+    def update():
+        for sprite in sprites:
+            sprite.update(0.025)
+            sprite.bounce(0.025, boundary)
+
+    def update_scheduled():
+        for sprite in sprites:
+            sprite.set_scheduler(scheduler)
+        update()
+        for sprite in sprites:
+            sprite.set_scheduler(None)
+
+    pipeline = Pipeline(sprites)
+
+    def update_pipeline():
+        pipeline.update(0.025)
+        for sprite in sprites:
+            sprite.bounce(0.025, boundary)
+
+    def update_flock():
+        # This is the same seek behavior, written out for the whole flock.
+        position = flock.positions[:count]
+        velocity = flock.velocities[:count]
+        speed = flock.speeds[:count, numpy.newaxis]
+        force = flock.forces[:count, numpy.newaxis]
+
+        offset = target.get_position().get_tuple() - position
+        distance = Flock.magnitudes(offset)[:, numpy.newaxis]
+        desired = offset / distance * speed - velocity
+
+        magnitude = Flock.magnitudes(desired)[:, numpy.newaxis]
+        flock.accelerations[:count] = numpy.where(
+                magnitude > force, force * (desired / magnitude), desired)
+
+        flock.update(0.025)
+        flock.bounce(0.025, boundary)
+
+    frame = per_call(update, 5)
+    rows = [("%d sprites per frame" % count, frame / 1000, "ms"),
+            ("per sprite", frame / count, "us")]
+
+    frame = per_call(update_scheduled, 5)
+    rows += [("%d scheduled per frame" % count, frame / 1000, "ms"),
+            ("skipped evaluations", 100 * scheduler.get_skip_rate(), "%")]
+
+    if numpy is not None:
+        frame = per_call(update_pipeline, 5)
+        rows += [("%d in a pipeline per frame" % count, frame / 1000, "ms")]
+
+    if flock is not None:
+        frame = per_call(update_flock, 20)
+        rows += [("%d flock members per frame" % count, frame / 1000, "ms"),
+                ("per flock member", frame / count, "us")]
+
+    report("Sprite integration:", rows)
+# }}}1
+
+if __name__ == "__main__":
+    random_directions.seed(0)
+
+    geometry_benchmarks()
+    serialization_benchmarks()
+    collision_benchmarks()
+    polygon_benchmarks()
+    obstacle_benchmarks()
+    crowd_benchmarks()
+    query_benchmarks()
+    coherence_benchmarks()
+    sprite_benchmarks()
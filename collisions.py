@@ -1,68 +1,36 @@
 from __future__ import division
 
-import math, shapes
-from vector import Vector
+import shapes, kernels
+from vector import Vector, VectorBatch, numpy
 
 class Collisions:
+    """ Decides whether or not points, lines and shapes are touching.  The
+    arithmetic is done by the kernels module; these functions just pull the
+    coordinates out of the vectors and shapes they are given. """
 
     # Points and Lines {{{1
     @staticmethod
     def points_nearby(first, second, padding):
-        return Vector.get_distance(first, second) <= padding
+        return kernels.points_nearby(
+                first.x, first.y, second.x, second.y, padding)
 
     @staticmethod
     def point_on_line(point, line):
-        if line.degenerate:
-            return Collisions.points_nearby(point, line.head, 0)
-
-        u = line.head - line.tail
-        v = point - line.tail
-
-        if u == v:
-            return True
-        if Vector.perp(u, v) != 0:
-            return False
-
-        try:
-            k = v.x // u.x
-        except ZeroDivisionError:
-            k = v.y // u.y
-
-        return k == 0
+        head, tail = line.head, line.tail
+        return kernels.point_on_line(
+                point.x, point.y, head.x, head.y, tail.x, tail.y)
 
     @staticmethod
     def point_near_line(point, line, padding):
-        if line.degenerate:
-            return Collisions.points_nearby(point, line.head, padding)
-
-        A, B = line.points
-        C = point; R = padding
-
-        a = (B.x - A.x)**2 + (B.y - A.y)**2
-        b = 2 * (B.x - A.x) * (A.x - C.x)       \
-                + 2 * (B.y - A.y) * (A.y - C.y)
-        c = C.x**2 + C.y**2 + A.x**2 + A.y**2   \
-                - 2 * (C.x * A.x + C.y * A.y) - R**2
-
-        discriminant = b**2 - 4 * a * c
-
-        if discriminant < 0:
-            return False
-        elif discriminant == 0:
-            u = v = -b / float(2 * a)
-        else:
-            u = (-b + math.sqrt(discriminant)) / float(2 * a)
-            v = (-b - math.sqrt(discriminant)) / float(2 * a)
-
-        if u < 0 and v < 0: return False
-        if u > 1 and v > 1: return False
-
-        return True
+        head, tail = line.head, line.tail
+        return kernels.point_near_line(
+                point.x, point.y, head.x, head.y, tail.x, tail.y, padding)
 
     @staticmethod
     def point_past_line(point, line, padding=0):
-        projection = Vector.dot(point - line.center, line.facing)
-        return projection <= padding
+        head, tail, facing = line.head, line.tail, line.facing
+        return kernels.point_past_line(point.x, point.y,
+                head.x, head.y, tail.x, tail.y, facing.x, facing.y, padding)
 
     # Points and Shapes {{{1
     @staticmethod
@@ -72,10 +40,13 @@ class Collisions:
 
     @staticmethod
     def point_near_shape(point, shape, padding):
-        past_edge = Collisions.point_past_line
+        point_past_line = kernels.point_past_line
+        x, y = point.x, point.y
 
         for edge in shape.edges:
-            if not past_edge(point, edge, padding):
+            head, tail, facing = edge.head, edge.tail, edge.facing
+            if not point_past_line(x, y, head.x, head.y, tail.x, tail.y,
+                    facing.x, facing.y, padding):
                 return False
         return True
 
@@ -91,73 +62,9 @@ class Collisions:
     # Lines Touching {{{1
     @staticmethod
     def lines_touching(first, second):
-
-        # Returns true if a degenerate, collinear point is on a line.
-        def within_bounds(point, line):
-            start, end = line.points
-
-            if start.x == end.x:
-                if point.x <= start.x and point.x >= end.x: return True
-                if point.x >= start.x and point.x <= end.x: return True
-            else:
-                if point.x <= start.x and point.x >= end.x: return True
-                if point.x >= start.x and point.x <= end.x: return True
-
-            return False
-
-        u = first.direction
-        v = second.direction
-
-        w = first.tail - second.tail
-        q = first.head - second.tail
-
-        denom = float(Vector.perp(u, v))
-
-        # Parallel, maybe coincident
-        if denom == 0:
-            # Check for coincidence
-            if Vector.perp(u, w) != 0 or Vector.perp(v, w) != 0:
-                return False
-
-            # Check for degeneracy
-            elif first.degenerate and second.degenerate:
-                return (first.head == second.head)
-
-            elif first.degenerate:
-                return within_bounds(first.head, second)
-
-            elif second.degenerate:
-                return within_bounds(second.head, second)
-
-            # Check for segment overlap
-            else:
-                try:
-                    s = q.x / v.x
-                    t = w.x / v.x
-                except ZeroDivisionError:
-                    s = q.y / v.y
-                    t = w.y / v.y
-
-                if s > t:
-                    s, t = t, s
-
-                if s > 1 or t < 0:
-                    return False
-
-                return True
-
-        # Skew: maybe intersecting.
-        else:
-
-            s = Vector.perp(v, w) / denom
-            if s < 0 or s > 1:
-                return False
-
-            t = Vector.perp(u, w) / denom
-            if t < 0 or t > 1:
-                return False
-
-            return True
+        A, B = first.points
+        C, D = second.points
+        return kernels.lines_touching(A.x, A.y, B.x, B.y, C.x, C.y, D.x, D.y)
 
     # Lines and Shapes {{{1
 
@@ -177,17 +84,27 @@ class Collisions:
 
     @staticmethod
     def shape_touching_line(shape, line):
-        lines_touching = Collisions.lines_touching
+        lines_touching = kernels.lines_touching
+        C, D = line.points
+        cx, cy, dx, dy = C.x, C.y, D.x, D.y
+
         for edge in shape.edges:
-            if lines_touching(edge, line):
+            A, B = edge.points
+            if lines_touching(A.x, A.y, B.x, B.y, cx, cy, dx, dy):
                 return True
         return False
 
     @staticmethod
     def shape_past_line(shape, line, padding):
-        point_past_line = Collisions.point_past_line
+        point_past_line = kernels.point_past_line
+        head, tail, facing = line.head, line.tail, line.facing
+
+        hx, hy, tx, ty = head.x, head.y, tail.x, tail.y
+        fx, fy = facing.x, facing.y
+
         for vertex in shape.vertices:
-            if point_past_line(vertex, line, padding):
+            if point_past_line(vertex.x, vertex.y,
+                    hx, hy, tx, ty, fx, fy, padding):
                 return True
         return False
     # }}}1
@@ -195,9 +112,9 @@ class Collisions:
     # Shapes Touching {{{1
     @staticmethod
     def circles_nearby(first, second, padding):
-        distance = first.radius + second.radius + padding
-        return Collisions.points_nearby(
-                first.center, second.center, distance)
+        A, B = first.center, second.center
+        return kernels.circles_nearby(A.x, A.y, first.radius,
+                B.x, B.y, second.radius, padding)
 
     @staticmethod
     def circles_touching(first, second):
@@ -205,13 +122,15 @@ class Collisions:
 
     @staticmethod
     def circle_touching_shape(circle, shape):
-        point_inside_shape = Collisions.point_inside_shape
-        circle_touching_edge = Collisions.circle_touching_line
+        point_near_line = kernels.point_near_line
+        center = circle.center
+        x, y, r = center.x, center.y, circle.radius
 
-        if point_inside_shape(circle.center, shape):
+        if Collisions.point_inside_shape(center, shape):
             return True
         for edge in shape.edges:
-            if circle_touching_edge(circle, edge):
+            A, B = edge.points
+            if point_near_line(x, y, A.x, A.y, B.x, B.y, r):
                 return True
 
         return False
@@ -226,27 +145,736 @@ class Collisions:
         # Optimized box/box collision
         if isinstance(first, shapes.Rectangle)   \
                 and isinstance(second, shapes.Rectangle):
+            return kernels.boxes_touching(
+                    first.left, first.top, first.right, first.bottom,
+                    second.left, second.top, second.right, second.bottom)
 
-            if first.top > second.bottom: return False
-            if first.bottom < second.top: return False
+        # Generic shape/shape collision
+        return Collisions.shapes_overlap(first, second) is not None
+    # }}}1
 
-            if first.left > second.right: return False
-            if first.right < second.left: return False
+    # Separating Axes {{{1
+    # Two convex shapes don't touch if and only if there is some edge normal
+    # that the shapes can be projected onto without overlapping.  The normals
+    # and coordinates are cached by the shapes, so static obstacles only pay
+    # to find them once.  These tests also return the minimum translation
+    # vector, which is the smallest displacement that would move the first
+    # shape out of the second.  Shapes that are only just touching give a null
+    # vector, so compare the result against None.
 
-            return True
+    @staticmethod
+    def shapes_overlap(first, second):
+        overlap = kernels.polygons_overlap(
+                first.coordinates, second.coordinates,
+                first.axes + second.axes)
 
-        # Generic shape/shape collision
-        point_inside_shape = Collisions.point_inside_shape
-        shape_touching_edge = Collisions.shape_touching_line
+        if overlap is not None:
+            depth, nx, ny = overlap
+            return Vector(depth * nx, depth * ny)
 
-        if point_inside_shape(first.center, second): return True
-        if point_inside_shape(second.center, first): return True
+    @staticmethod
+    def circle_shape_overlap(circle, shape):
+        center = circle.center
+        overlap = kernels.circle_polygon_overlap(
+                center.x, center.y, circle.radius,
+                shape.coordinates, shape.axes)
+
+        if overlap is not None:
+            depth, nx, ny = overlap
+            return Vector(depth * nx, depth * ny)
+    # }}}1
 
-        for edge in first.edges:
-            if shape_touching_edge(second, edge):
-                return True
+    # Bounding Boxes {{{1
+    # These tests are meant for the broad phase, where many boxes are checked
+    # against a single query.  They only deal with coordinates, so they don't
+    # need any of the derived values of the shapes.
 
-        return False
+    @staticmethod
+    def boxes_touching(first, second):
+        return kernels.boxes_touching(
+                first.left, first.top, first.right, first.bottom,
+                second.left, second.top, second.right, second.bottom)
+
+    @staticmethod
+    def circle_touching_box(circle, box):
+        center = circle.center
+        return kernels.circle_touching_box(center.x, center.y, circle.radius,
+                box.left, box.top, box.right, box.bottom)
+
+    @staticmethod
+    def line_touching_box(line, box):
+        head, tail = line.head, line.tail
+        return kernels.line_touching_box(head.x, head.y, tail.x, tail.y,
+                box.left, box.top, box.right, box.bottom)
+    # }}}1
+
+    # Swept Circles {{{1
+    # These tests take a circle at the start of a step along with how far it
+    # moves during that step, and return the fraction of the step that passes
+    # before it first touches the other object.  None means the circle gets
+    # through the whole step without touching anything, and 0 means it was
+    # touching to begin with.  Fast sprites can jump right over small targets
+    # in a single step, so these are more reliable than checking where the
+    # sprites end up.
+
+    @staticmethod
+    def circles_impact(first, first_displacement, second,
+            second_displacement=None):
+        A, B = first.center, second.center
+        U = first_displacement
+        V = second_displacement or Vector.null()
+
+        return kernels.circles_impact(
+                A.x, A.y, U.x, U.y, first.radius,
+                B.x, B.y, V.x, V.y, second.radius)
+
+    @staticmethod
+    def circle_line_impact(circle, displacement, line):
+        center, (head, tail) = circle.center, line.points
+        return kernels.circle_line_impact(
+                center.x, center.y, displacement.x, displacement.y,
+                circle.radius, head.x, head.y, tail.x, tail.y)
+
+    @staticmethod
+    def circle_shape_impact(circle, displacement, shape):
+        circle_line_impact = kernels.circle_line_impact
+        center = circle.center
+
+        if Collisions.point_inside_shape(center, shape):
+            return 0.0
+
+        x, y, r = center.x, center.y, circle.radius
+        dx, dy = displacement.x, displacement.y
+        earliest = None
+
+        for edge in shape.edges:
+            A, B = edge.points
+            time = circle_line_impact(x, y, dx, dy, r, A.x, A.y, B.x, B.y)
+
+            if time is not None and (earliest is None or time < earliest):
+                earliest = time
+
+        return earliest
+
+    @staticmethod
+    def circle_boundary_impact(circle, displacement, boundary):
+        center = circle.center
+        return kernels.circle_boundary_impact(
+                center.x, center.y, displacement.x, displacement.y,
+                circle.radius, boundary.left, boundary.top,
+                boundary.right, boundary.bottom)
+    # }}}1
+
+    # Ray Casts {{{1
+    # Rays are given as lines that start at their head and end at their tail,
+    # which is what Line.from_direction() builds.  The hit tests return the
+    # fraction of the way along the ray where it first meets the obstacle, or
+    # None if it doesn't.  Rays that start inside an obstacle hit it right
+    # away.
+
+    @staticmethod
+    def ray_hits_line(ray, line):
+        origin, end = ray.points
+        A, B = line.points
+        return kernels.ray_line_hit(origin.x, origin.y,
+                end.x - origin.x, end.y - origin.y, A.x, A.y, B.x, B.y)
+
+    @staticmethod
+    def ray_hits_circle(ray, circle):
+        (origin, end), center = ray.points, circle.center
+        return kernels.ray_circle_hit(origin.x, origin.y,
+                end.x - origin.x, end.y - origin.y,
+                center.x, center.y, circle.radius)
+
+    @staticmethod
+    def ray_hits_shape(ray, shape):
+        origin, end = ray.points
+        ox, oy = origin.x, origin.y
+        dx, dy = end.x - ox, end.y - oy
+
+        if isinstance(shape, shapes.Rectangle):
+            return kernels.ray_box_hit(ox, oy, dx, dy,
+                    shape.left, shape.top, shape.right, shape.bottom)
+
+        if Collisions.point_inside_shape(origin, shape):
+            return 0.0
+
+        ray_line_hit = kernels.ray_line_hit
+        earliest = None
+
+        for edge in shape.edges:
+            A, B = edge.points
+            time = ray_line_hit(ox, oy, dx, dy, A.x, A.y, B.x, B.y)
+
+            if time is not None and (earliest is None or time < earliest):
+                earliest = time
+
+        return earliest
+
+    @staticmethod
+    def ray_hits(ray, obstacle):
+        """ Return where the ray first meets the given line, circle or
+        polygon. """
+
+        if isinstance(obstacle, shapes.Circle):
+            return Collisions.ray_hits_circle(ray, obstacle)
+        if isinstance(obstacle, shapes.Line):
+            return Collisions.ray_hits_line(ray, obstacle)
+        return Collisions.ray_hits_shape(ray, obstacle)
+
+    @staticmethod
+    def ray_cast(ray, obstacles):
+        """ Return the distance from the start of the ray to the first
+        obstacle it hits, along with that obstacle.  Return None if the ray
+        doesn't hit anything.  The obstacles can either be a list or a spatial
+        index that provides a query_line() method, in which case only the
+        obstacles near the ray are tested. """
+
+        query_line = getattr(obstacles, 'query_line', None)
+        if query_line is not None:
+            obstacles = query_line(ray)
+
+        ray_hits = Collisions.ray_hits
+        earliest, closest = None, None
+
+        for obstacle in obstacles:
+            time = ray_hits(ray, obstacle)
+            if time is not None and (earliest is None or time < earliest):
+                earliest, closest = time, obstacle
+
+        if closest is not None:
+            return earliest * ray.direction.magnitude, closest
+
+    @staticmethod
+    def ray_casts(rays, obstacles):
+        """ Cast every ray in the given list, and return a list with the
+        result of ray_cast() for each one.  This is meant for things like AI
+        perception, where many rays are cast against the same obstacles
+        every frame.  When NumPy is installed, all of the rays are tested at
+        once by BatchCollisions.ray_casts(); otherwise each ray is cast on
+        its own. """
+
+        if numpy is not None:
+            return BatchCollisions.ray_casts(rays, obstacles)
+
+        ray_cast = Collisions.ray_cast
+        return [ray_cast(ray, obstacles) for ray in rays]
+    # }}}1
+
+class PairCache:
+    """ Remembers how far apart pairs of sprites were the last time they were
+    tested, so that pairs which can't have closed the gap since then don't
+    have to be tested again.  Each sprite keeps track of how far it has
+    traveled, so the cache only needs to compare the combined travel of the
+    two sprites against the gap they had.  This pays off when most sprites
+    are drifting slowly and the same pairs are checked every frame.
+
+    Pairs are keyed by the ids of the sprites, since hashing old-style
+    instances is surprisingly slow.  Each entry also holds on to its sprites,
+    so that their ids can't be reused while the entry exists.  That means
+    sprites are kept alive until they are forgotten, so call forget() when a
+    sprite leaves the game. """
+
+    # Constructor {{{1
+    def __init__(self):
+        self.pairs = {}
+
+        self.lookups = 0
+        self.hits = 0
+        self.skips = 0
+
+    # Methods {{{1
+    def circles_touching(self, first, second):
+        """ Return true if the circles of the two sprites are touching, using
+        the cached gap between them when it's still good enough. """
+
+        # Each pair is stored with the combined travel that the two sprites
+        # would need to reach before they could possibly touch.
+        travel = first.travel + second.travel
+        entry = self.pairs.get((id(first), id(second)))
+
+        self.lookups += 1
+
+        if entry is not None:
+            self.hits += 1
+            if travel < entry[0]:
+                self.skips += 1
+                return False
+
+        A, B = first.get_circle(), second.get_circle()
+        gap = kernels.circles_gap(A.center.x, A.center.y, A.radius,
+                B.center.x, B.center.y, B.radius)
+
+        self.remember(first, second, travel + gap)
+        return gap <= 0
+
+    def pairs_touching(self, sprites):
+        """ Return every pair of touching sprites in the given list.  This
+        does the same thing as calling circles_touching() on every pair, but
+        the loop is written out so that the pairs which get skipped cost as
+        little as possible. """
+
+        pairs = self.pairs
+        remember = self.remember
+        circles_gap = kernels.circles_gap
+
+        touching = []
+        lookups = hits = skips = 0
+
+        for index, first in enumerate(sprites):
+            first_id = id(first)
+            first_travel = first.travel
+
+            for second in sprites[index + 1:]:
+                travel = first_travel + second.travel
+                entry = pairs.get((first_id, id(second)))
+
+                lookups += 1
+
+                if entry is not None:
+                    hits += 1
+                    if travel < entry[0]:
+                        skips += 1
+                        continue
+
+                A, B = first.get_circle(), second.get_circle()
+                gap = circles_gap(A.center.x, A.center.y, A.radius,
+                        B.center.x, B.center.y, B.radius)
+
+                remember(first, second, travel + gap)
+
+                if gap <= 0:
+                    touching.append((first, second))
+
+        self.lookups += lookups
+        self.hits += hits
+        self.skips += skips
+
+        return touching
+
+    def remember(self, first, second, limit):
+        entry = limit, first, second
+        self.pairs[id(first), id(second)] = entry
+        self.pairs[id(second), id(first)] = entry
+
+    def forget(self, sprite):
+        """ Drop every pair that involves the given sprite. """
+        for key in [key for key in self.pairs if id(sprite) in key]:
+            del self.pairs[key]
+
+    def clear(self):
+        self.pairs = {}
+
+    def reset_counters(self):
+        self.lookups = self.hits = self.skips = 0
+
+    # Attributes {{{1
+    def get_lookups(self):
+        return self.lookups
+
+    def get_hits(self):
+        return self.hits
+
+    def get_skips(self):
+        return self.skips
+
+    def get_hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def get_skip_rate(self):
+        return self.skips / self.lookups if self.lookups else 0.0
+
+    def __len__(self):
+        return len(self.pairs) // 2
+    # }}}1
+
+class ContactTracker:
+    """ Remembers which pairs of sprites are touching, and reports each pair
+    once when it starts touching and once when it stops.  Something that
+    should happen when two sprites meet can then subscribe to the enter
+    events, rather than checking for contact every frame and happening over
+    and over again for as long as the sprites overlap.
+
+    Callbacks are given the two sprites in the pair, in the order they were
+    passed to update() when the event happened.  The tracker doesn't decide
+    what counts as touching; it just compares the pairs it's given each frame
+    with the pairs it was given the frame before. """
+
+    events = 'enter', 'stay', 'exit'
+
+    # Constructor {{{1
+    def __init__(self):
+        self.contacts = {}
+        self.callbacks = dict((event, []) for event in self.events)
+
+    def __len__(self):
+        return len(self.contacts)
+
+    def __iter__(self):
+        return iter(self.contacts.values())
+
+    # Methods {{{1
+    def callback(self, enter=None, stay=None, exit=None):
+        for event, callback in zip(self.events, (enter, stay, exit)):
+            if callback is not None:
+                self.callbacks[event].append(callback)
+
+    @staticmethod
+    def key(first, second):
+        # Pairs are keyed by id, since hashing old-style instances is slow.
+        key = id(first), id(second)
+        return key if key[0] < key[1] else (key[1], key[0])
+
+    def update(self, pairs):
+        """ Record which pairs are touching now, and fire the callbacks for
+        every pair that has started touching, is still touching, or has
+        stopped touching since the last update. """
+
+        key = ContactTracker.key
+        previous = self.contacts
+        contacts = dict((key(*pair), pair) for pair in pairs)
+
+        entered = [pair for k, pair in contacts.items() if k not in previous]
+        stayed = [pair for k, pair in contacts.items() if k in previous]
+        exited = [pair for k, pair in previous.items() if k not in contacts]
+
+        self.contacts = contacts
+
+        for event, pairs in zip(self.events, (entered, stayed, exited)):
+            for callback in self.callbacks[event]:
+                for first, second in pairs:
+                    callback(first, second)
+
+    def touching(self, first, second):
+        """ Return true if the two sprites were touching at the last update.
+        """
+        return ContactTracker.key(first, second) in self.contacts
+
+    def forget(self, sprite):
+        """ Drop every contact involving the given sprite, without firing
+        any exit events. """
+        for key in [key for key in self.contacts if id(sprite) in key]:
+            del self.contacts[key]
+    # }}}1
+
+class BatchCollisions:
+    """ Provides NumPy versions of the circle tests in the Collisions class.
+    Instead of a single circle, these functions take an array of centers and
+    an array of radii.  The centers can be given as a VectorBatch, as a list
+    of vectors, or as any array with two columns.  Distances are compared
+    after being squared, so no square roots are taken.  Every function here
+    agrees with its scalar counterpart in the Collisions class. """
+
+    # Utilities {{{1
+    @staticmethod
+    def coordinates(points):
+        """ Return the given points as an N x 2 array. """
+        if isinstance(points, VectorBatch):
+            return points.array
+        if len(points) and isinstance(points[0], Vector):
+            return VectorBatch.from_vectors(points).array
+        return numpy.asarray(points, dtype=float).reshape(-1, 2)
+
+    @staticmethod
+    def within(squared_distances, reach):
+        """ Return a mask of which distances are no longer than the given
+        reach.  A negative reach can't be met by any distance. """
+        reach = numpy.asarray(reach, dtype=float)
+        return (squared_distances <= reach * reach) & (reach >= 0)
+
+    # One Against Many {{{1
+    @staticmethod
+    def point_inside_circle(points, circle):
+        """ Return a mask of which points are inside the given circle. """
+        points = BatchCollisions.coordinates(points)
+        x, y = circle.center
+
+        dx = points[:, 0] - x; dy = points[:, 1] - y
+        return BatchCollisions.within(dx * dx + dy * dy, circle.radius)
+
+    @staticmethod
+    def circles_nearby(centers, radii, circle, padding):
+        """ Return a mask of which circles come within the given padding of
+        the given circle. """
+
+        centers = BatchCollisions.coordinates(centers)
+        radii = numpy.asarray(radii, dtype=float)
+        x, y = circle.center
+
+        dx = centers[:, 0] - x; dy = centers[:, 1] - y
+        reach = radii + circle.radius + padding
+
+        return BatchCollisions.within(dx * dx + dy * dy, reach)
+
+    @staticmethod
+    def circles_touching(centers, radii, circle):
+        """ Return a mask of which circles are touching the given circle. """
+        return BatchCollisions.circles_nearby(centers, radii, circle, 0)
+
+    # Many Against Many {{{1
+    @staticmethod
+    def circle_grid_nearby(first_centers, first_radii,
+            second_centers, second_radii, padding):
+        """ Return an N x M mask that records which of the first N circles
+        come within the given padding of which of the second M circles. """
+
+        first = BatchCollisions.coordinates(first_centers)
+        second = BatchCollisions.coordinates(second_centers)
+
+        first_radii = numpy.asarray(first_radii, dtype=float)
+        second_radii = numpy.asarray(second_radii, dtype=float)
+
+        dx = first[:, 0, numpy.newaxis] - second[numpy.newaxis, :, 0]
+        dy = first[:, 1, numpy.newaxis] - second[numpy.newaxis, :, 1]
+
+        reach = first_radii[:, numpy.newaxis] \
+                + second_radii[numpy.newaxis, :] + padding
+
+        return BatchCollisions.within(dx * dx + dy * dy, reach)
+
+    @staticmethod
+    def circle_grid_touching(first_centers, first_radii,
+            second_centers, second_radii):
+        """ Return an N x M mask that records which of the first N circles
+        are touching which of the second M circles. """
+        return BatchCollisions.circle_grid_nearby(first_centers, first_radii,
+                second_centers, second_radii, 0)
+
+    @staticmethod
+    def circle_pairs_nearby(centers, radii, padding):
+        """ Return the indices of every pair of circles in the given set that
+        come within the given padding of each other.  The result is a K x 2
+        array, and the first index in each pair is always the smaller. """
+
+        grid = BatchCollisions.circle_grid_nearby(
+                centers, radii, centers, radii, padding)
+
+        first, second = numpy.nonzero(numpy.triu(grid, 1))
+        return numpy.column_stack((first, second))
+
+    @staticmethod
+    def circle_pairs_touching(centers, radii):
+        """ Return the indices of every pair of touching circles in the given
+        set, as a K x 2 array. """
+        return BatchCollisions.circle_pairs_nearby(centers, radii, 0)
+
+    # Ray Casts {{{1
+    # The rays are given as an N x 2 array of starting points and an N x 2
+    # array of how far each ray extends.  Each test returns an N x K array
+    # with where every ray first meets every one of K obstacles, using the
+    # same arithmetic as the ray functions in the kernels module.  Misses are
+    # infinite instead of None, so the earliest hit is just the minimum.
+
+    @staticmethod
+    def ray_line_hits(origins, steps, heads, tails):
+        """ Return where each ray first meets each line segment. """
+
+        ox = origins[:, 0, numpy.newaxis]; oy = origins[:, 1, numpy.newaxis]
+        dx = steps[:, 0, numpy.newaxis]; dy = steps[:, 1, numpy.newaxis]
+        hx, hy = heads[:, 0], heads[:, 1]
+        tx, ty = tails[:, 0], tails[:, 1]
+
+        ux = hx - tx; uy = hy - ty
+        wx = tx - ox; wy = ty - oy
+
+        denom = dx * uy - dy * ux
+        skew = denom != 0
+        safe = numpy.where(skew, denom, 1)
+
+        # Skew: maybe crossing.
+        t = (wx * uy - wy * ux) / safe
+        s = (wx * dy - wy * dx) / safe
+
+        crossing = skew & (t >= 0) & (t <= 1) & (s >= 0) & (s <= 1)
+        hits = numpy.where(crossing, t, numpy.inf)
+
+        # Parallel, maybe collinear.
+        length = dx * dx + dy * dy
+        collinear = ~skew & (dx * wy - dy * wx == 0) & (length != 0)
+
+        if collinear.any():
+            safe = numpy.where(length != 0, length, 1)
+            near = (wx * dx + wy * dy) / safe
+            far = ((hx - ox) * dx + (hy - oy) * dy) / safe
+
+            near, far = numpy.minimum(near, far), numpy.maximum(near, far)
+            touching = collinear & (far >= 0) & (near <= 1)
+            hits = numpy.where(touching, numpy.maximum(near, 0.0), hits)
+
+        # Rays without any length only hit the lines they sit on.
+        point_on_line = kernels.point_on_line
+
+        for row in numpy.flatnonzero(length[:, 0] == 0):
+            x, y = map(float, origins[row])
+            for column, (A, B) in enumerate(zip(heads, tails)):
+                if point_on_line(x, y, *map(float, (A[0], A[1], B[0], B[1]))):
+                    hits[row, column] = 0.0
+
+        return hits
+
+    @staticmethod
+    def ray_circle_hits(origins, steps, centers, radii):
+        """ Return where each ray first meets each circle. """
+
+        px = origins[:, 0, numpy.newaxis] - centers[:, 0]
+        py = origins[:, 1, numpy.newaxis] - centers[:, 1]
+        dx = steps[:, 0, numpy.newaxis]; dy = steps[:, 1, numpy.newaxis]
+
+        c = px * px + py * py - radii * radii
+        a = dx * dx + dy * dy
+        b = px * dx + py * dy
+
+        # The ray has to be heading towards the circle to ever reach it.
+        discriminant = b * b - a * c
+        approaching = (a != 0) & (b < 0) & (discriminant >= 0)
+
+        root = numpy.sqrt(numpy.where(approaching, discriminant, 0))
+        time = (-b - root) / numpy.where(approaching, a, 1)
+
+        hits = numpy.where(approaching & (time <= 1), time, numpy.inf)
+        return numpy.where(c <= 0, 0.0, hits)
+
+    @staticmethod
+    def ray_box_hits(origins, steps, boxes):
+        """ Return where each ray first meets each box.  The boxes are given
+        as a K x 4 array of left, top, right and bottom coordinates. """
+
+        shape = len(origins), len(boxes)
+        start, end = numpy.zeros(shape), numpy.ones(shape)
+        missed = numpy.zeros(shape, dtype=bool)
+
+        # Clip the rays against each pair of parallel box edges in turn.
+        for axis in 0, 1:
+            position = origins[:, axis, numpy.newaxis]
+            step = steps[:, axis, numpy.newaxis]
+            low, high = boxes[:, axis], boxes[:, axis + 2]
+
+            still = step == 0
+            missed |= still & ((position < low) | (position > high))
+
+            safe = numpy.where(still, 1, step)
+            near = (low - position) / safe
+            far = (high - position) / safe
+
+            near, far = numpy.minimum(near, far), numpy.maximum(near, far)
+            start = numpy.where(still, start, numpy.maximum(start, near))
+            end = numpy.where(still, end, numpy.minimum(end, far))
+
+            missed |= start > end
+
+        return numpy.where(missed, numpy.inf, start)
+
+    @staticmethod
+    def ray_casts(rays, obstacles):
+        """ Cast every ray in the given list at once, and return the same list
+        of results that casting them one at a time would.  The obstacles are
+        sorted into tables of lines, circles, boxes and polygon edges, and
+        then every ray is tested against every table in a few array
+        operations.  A spatial index is only queried once, with the box
+        around all of the rays, so this works best when the rays are close
+        together, like the fan of rays a sprite casts to look around.  Rays
+        spread across the whole map get tested against every obstacle. """
+
+        if not rays:
+            return []
+
+        ends = numpy.array([(A.x, A.y, B.x, B.y)
+                for A, B in (ray.points for ray in rays)], dtype=float)
+
+        origins = ends[:, :2]
+        steps = ends[:, 2:] - origins
+
+        query_rect = getattr(obstacles, 'query_rect', None)
+        if query_rect is not None:
+            left, top = numpy.minimum(origins, ends[:, 2:]).min(axis=0)
+            right, bottom = numpy.maximum(origins, ends[:, 2:]).max(axis=0)
+            box = shapes.Rectangle(float(left), float(top),
+                    float(right), float(bottom))
+            obstacles = query_rect(box)
+
+        obstacles = list(obstacles)
+        lines, circles, boxes, edges = [], [], [], []
+
+        for owner, obstacle in enumerate(obstacles):
+            if isinstance(obstacle, shapes.Circle):
+                center = obstacle.center
+                circles.append((owner, center.x, center.y, obstacle.radius))
+
+            elif isinstance(obstacle, shapes.Line):
+                A, B = obstacle.points
+                lines.append((owner, A.x, A.y, B.x, B.y))
+
+            elif isinstance(obstacle, shapes.Rectangle):
+                boxes.append((owner, obstacle.left, obstacle.top,
+                    obstacle.right, obstacle.bottom))
+
+            else:
+                for edge in obstacle.edges:
+                    (A, B), facing = edge.points, edge.facing
+                    lines.append((owner, A.x, A.y, B.x, B.y))
+                    edges.append((owner, (A.x + B.x) / 2.0,
+                        (A.y + B.y) / 2.0, facing.x, facing.y))
+
+        times, owners = [], []
+
+        if lines:
+            table = numpy.array(lines)
+            times.append(BatchCollisions.ray_line_hits(
+                    origins, steps, table[:, 1:3], table[:, 3:5]))
+            owners.append(table[:, 0])
+
+        if circles:
+            table = numpy.array(circles)
+            times.append(BatchCollisions.ray_circle_hits(
+                    origins, steps, table[:, 1:3], table[:, 3]))
+            owners.append(table[:, 0])
+
+        if boxes:
+            table = numpy.array(boxes)
+            times.append(BatchCollisions.ray_box_hits(
+                    origins, steps, table[:, 1:]))
+            owners.append(table[:, 0])
+
+        # Rays that start behind every edge of a polygon are inside of it,
+        # so they hit it right away.
+        if edges:
+            table = numpy.array(edges)
+            owner = table[:, 0]
+
+            behind = (origins[:, 0, numpy.newaxis] - table[:, 1]) \
+                    * table[:, 3] + (origins[:, 1, numpy.newaxis] \
+                    - table[:, 2]) * table[:, 4] <= 0
+
+            starts = numpy.flatnonzero(
+                    numpy.r_[True, owner[1:] != owner[:-1]])
+            inside = numpy.logical_and.reduceat(behind, starts, axis=1)
+
+            times.append(numpy.where(inside, 0.0, numpy.inf))
+            owners.append(owner[starts])
+
+        if not times:
+            return [None] * len(rays)
+
+        # Ties go to whichever obstacle came first, like they do when each
+        # ray is cast on its own.
+        owners = numpy.concatenate(owners).astype(int)
+        order = numpy.argsort(owners, kind='mergesort')
+
+        times = numpy.hstack(times)[:, order]
+        owners = owners[order]
+
+        columns = times.argmin(axis=1)
+        earliest = times[numpy.arange(len(rays)), columns]
+
+        results = []
+        for ray, column, time in zip(rays, columns, earliest):
+            if time == numpy.inf:
+                results.append(None)
+            else:
+                distance = float(time) * ray.direction.magnitude
+                results.append((distance, obstacles[owners[column]]))
+
+        return results
     # }}}1
 
 if __name__ == "__main__":
@@ -563,6 +1191,405 @@ if __name__ == "__main__":
                     touching_zero[y][x]
     # }}}1
 
+    # Separating Axes {{{1
+    def separating_axes():
+        shapes_touching = Collisions.shapes_touching
+        shapes_overlap = Collisions.shapes_overlap
+        circle_shape_overlap = Collisions.circle_shape_overlap
+
+        def edges_touching(first, second):
+            # This is how polygons used to be compared, before the separating
+            # axis test was written.
+            point_inside_shape = Collisions.point_inside_shape
+            if point_inside_shape(first.center, second): return True
+            if point_inside_shape(second.center, first): return True
+
+            for edge in first.edges:
+                if Collisions.shape_touching_line(second, edge):
+                    return True
+            return False
+
+        def nudge(shape, overlap, scale):
+            return shape.move(overlap * scale)
+
+        origin = Vector(0, 0)
+        hexagon = Polygon.from_regular(origin, 5, 6)
+        circle = Circle(origin, 3)
+
+        for sides in 3, 4, 5, 8, 16:
+            for index in range(40):
+                angle = index * 0.37
+                offset = Vector.from_radians(index * 0.61) * (index % 13)
+                other = Polygon.from_regular(offset, 4, sides, angle)
+
+                # The separating axis test has to agree with the old one.
+                expected = edges_touching(hexagon, other)
+                assert shapes_touching(hexagon, other) == expected
+                assert shapes_touching(other, hexagon) == expected
+
+                overlap = shapes_overlap(other, hexagon)
+                assert (overlap is not None) == expected
+
+                # Moving by the translation vector should leave the shapes
+                # just touching, and moving a little further should pull
+                # them apart.
+                if overlap:
+                    assert shapes_touching(
+                            nudge(other, overlap, 0.999), hexagon)
+                    assert not shapes_touching(
+                            nudge(other, overlap, 1.001), hexagon)
+
+                # Likewise for circles.
+                shifted = circle.move(
+                        Vector.from_radians(index * 1.3) * (index % 11))
+                expected = Collisions.circle_touching_shape(shifted, other)
+                overlap = circle_shape_overlap(shifted, other)
+                assert (overlap is not None) == expected
+
+                if overlap:
+                    assert Collisions.circle_touching_shape(
+                            nudge(shifted, overlap, 0.999), other)
+                    assert not Collisions.circle_touching_shape(
+                            nudge(shifted, overlap, 1.001), other)
+
+        # Shapes that only share an edge are touching, but don't need to move.
+        left = Polygon.from_vertices(Rectangle(0, 0, 5, 5).vertices)
+        right = Polygon.from_vertices(Rectangle(5, 0, 10, 5).vertices)
+
+        assert shapes_touching(left, right)
+        assert shapes_overlap(left, right) == Vector.null()
+
+        right = right.move(Vector(1, 0))
+        assert not shapes_touching(left, right)
+        assert shapes_overlap(left, right) is None
+
+        # The translation vector points away from the second shape.
+        right = right.move(Vector(-2, 0))
+        assert shapes_overlap(left, right) == Vector(-1, 0)
+        assert shapes_overlap(right, left) == Vector(1, 0)
+        assert circle_shape_overlap(Circle(Vector(6, 2), 2), left) == \
+                Vector(1, 0)
+    # }}}1
+
+    # Ray Casts {{{1
+    def ray_casts():
+        ray_hits = Collisions.ray_hits
+
+        def close(first, second):
+            return abs(first - second) < 1e-9
+
+        origin = Vector(0, 0)
+        ray = Line.from_direction(origin, Vector(20, 0))
+
+        wall = Line(Vector(10, -5), Vector(10, 5))
+        circle = Circle(Vector(15, 0), 2)
+        box = Rectangle(4, -1, 6, 1)
+        triangle = Polygon([Vector(8, -4), Vector(12, 0), Vector(8, 4)])
+
+        assert close(ray_hits(ray, wall), 0.5)
+        assert close(ray_hits(ray, circle), 0.65)
+        assert close(ray_hits(ray, box), 0.2)
+        assert close(ray_hits(ray, triangle), 0.4)
+
+        # The closest obstacle wins, and the distance is measured along the
+        # ray rather than as a fraction.
+        obstacles = [wall, circle, box, triangle]
+        distance, obstacle = Collisions.ray_cast(ray, obstacles)
+
+        assert close(distance, 4) and obstacle is box
+        assert Collisions.ray_cast(ray.move(Vector(0, 10)), obstacles) is None
+
+        # Rays that start inside of something hit it right away.
+        inside = ray.move(Vector(15, 0))
+        assert ray_hits(inside, circle) == 0
+        assert ray_hits(ray.move(Vector(5, 0)), box) == 0
+        assert ray_hits(ray.move(Vector(9, 0)), triangle) == 0
+
+        # Rays that run along a line hit its near end.
+        along = Line(Vector(5, 0), Vector(25, 0))
+        assert close(ray_hits(ray, along), 0.25)
+        assert ray_hits(ray, along.move(Vector(0, 1))) is None
+
+        # Whether or not a ray hits something should agree with the tests
+        # for lines.
+        for index in range(100):
+            start = Vector(index % 10, index // 10) * 3 - Vector(4.7, 5.2)
+            ray = Line.from_direction(start, Vector.from_radians(index) * 20)
+
+            assert (ray_hits(ray, wall) is not None) == \
+                    Collisions.lines_touching(ray, wall)
+            assert (ray_hits(ray, circle) is not None) == \
+                    Collisions.circle_touching_line(circle, ray)
+
+            for shape in box, triangle:
+                touching = Collisions.point_inside_shape(ray.head, shape) \
+                        or Collisions.shape_touching_line(shape, ray)
+                assert (ray_hits(ray, shape) is not None) == touching
+
+        results = Collisions.ray_casts([ray, ray.move(Vector(0, 50))],
+                obstacles)
+        assert results[0] == Collisions.ray_cast(ray, obstacles)
+        assert results[1] is None
+
+        # Casting the rays all at once should give exactly the same answers
+        # as casting them one at a time, including for rays that start inside
+        # something, run along a line, or don't go anywhere.
+        if numpy is not None:
+            rays = [Line.from_direction(Vector(index % 7, index % 5) * 3 -
+                Vector(1, 3), Vector.from_degrees(index * 15) * 20)
+                for index in range(120)]
+
+            rays += [Line.from_direction(Vector(0, 0), Vector(20, 0)),
+                    Line.from_direction(Vector(10, 6), Vector(0, -20)),
+                    Line(Vector(10, 0), Vector(10, 0)),
+                    Line(Vector(30, 0), Vector(30, 0))]
+
+            obstacles.append(along)
+            results = BatchCollisions.ray_casts(rays, obstacles)
+
+            assert results[-4][1] is box and results[-3][1] is wall
+            assert results[-2] == (0, wall) and results[-1] is None
+
+            for ray, result in zip(rays, results):
+                assert result == Collisions.ray_cast(ray, obstacles)
+    # }}}1
+
+    # Pair Cache {{{1
+    def pair_cache():
+        from flocking import Sprite
+
+        cache, bulk = PairCache(), PairCache()
+        sprites = []
+
+        for index in range(20):
+            sprite = Sprite()
+            sprite.setup(Vector(index * 7 % 50, index * 11 % 50), 3,
+                    speed=10)
+            sprite.set_velocity(Vector.from_radians(index) * 10)
+            sprites.append(sprite)
+
+        boundary = Rectangle.from_size(50, 50)
+
+        for frame in range(100):
+            for sprite in sprites:
+                sprite.update(0.05)
+                sprite.bounce(0.05, boundary)
+
+            # The cache should always give the same answer as testing the
+            # circles directly.
+            expected = set()
+
+            for index, first in enumerate(sprites):
+                for second in sprites[index + 1:]:
+                    touching = Collisions.circles_touching(
+                            first.get_circle(), second.get_circle())
+                    assert cache.circles_touching(first, second) == touching
+                    assert cache.circles_touching(second, first) == touching
+
+                    if touching:
+                        expected.add((first, second))
+
+            assert set(bulk.pairs_touching(sprites)) == expected
+
+        pairs = len(sprites) * (len(sprites) - 1) // 2
+        assert len(cache) == pairs
+        assert cache.get_lookups() == 2 * 100 * pairs
+        assert cache.get_hits() == cache.get_lookups() - pairs
+        assert 0 < cache.get_skips() < cache.get_hits()
+        assert bulk.get_lookups() == 100 * pairs
+        assert expected and bulk.get_skips() > 0
+
+        # Teleporting a sprite has to invalidate its pairs.
+        first, second = sprites[0], sprites[1]
+        first.set_position(Vector(100, 100))
+        second.set_position(Vector(200, 200))
+        assert not cache.circles_touching(first, second)
+
+        second.set_position(Vector(104, 100))
+        assert cache.circles_touching(first, second)
+
+        cache.forget(first)
+        assert len(cache) == pairs - len(sprites) + 1
+    # }}}1
+
+    # Contact Tracker {{{1
+    def contact_tracker():
+        tracker = ContactTracker()
+        events = []
+
+        tracker.callback(
+                enter=lambda *pair: events.append(('enter', pair)),
+                exit=lambda *pair: events.append(('exit', pair)))
+        tracker.callback(
+                stay=lambda *pair: events.append(('stay', pair)))
+
+        a, b, c = Circle(Vector(0, 0), 1), Circle(Vector(1, 0), 1), \
+                Circle(Vector(2, 0), 1)
+
+        def update(*pairs):
+            del events[:]
+            tracker.update(pairs)
+            return sorted(events)
+
+        assert update() == []
+        assert update((a, b)) == [('enter', (a, b))]
+        assert tracker.touching(b, a) and not tracker.touching(a, c)
+
+        # Pairs are matched no matter what order they come in.
+        assert update((b, a)) == [('stay', (b, a))]
+        assert update((a, b), (b, c)) == \
+                sorted([('stay', (a, b)), ('enter', (b, c))])
+        assert len(tracker) == 2
+
+        assert update((b, c)) == [('exit', (a, b)), ('stay', (b, c))]
+        assert update() == [('exit', (b, c))]
+        assert len(tracker) == 0
+
+        # Forgetting a sprite doesn't fire any events.
+        update((a, b), (a, c))
+        tracker.forget(a)
+        assert len(tracker) == 0
+        assert update() == []
+    # }}}1
+
+    # Batches {{{1
+    def batches():
+        if numpy is None:
+            print "NumPy is not installed, skipping the batch tests."
+            return
+
+        centers = [5 * Vector(x, y) for x in range(5) for y in range(5)]
+        radii = [index % 4 for index in range(len(centers))]
+        circles = [Circle(*pair) for pair in zip(centers, radii)]
+
+        batch = VectorBatch.from_vectors(centers)
+        circle = Circle(Vector(10, 10), 3)
+
+        # One against many.
+        inside = BatchCollisions.point_inside_circle(batch, circle)
+        touching = BatchCollisions.circles_touching(centers, radii, circle)
+
+        for index, other in enumerate(circles):
+            assert inside[index] == \
+                    Collisions.point_inside_circle(other.center, circle)
+            assert touching[index] == \
+                    Collisions.circles_touching(other, circle)
+
+            for padding in -4, 2:
+                nearby = BatchCollisions.circles_nearby(
+                        batch.array, radii, circle, padding)
+                assert nearby[index] == \
+                        Collisions.circles_nearby(other, circle, padding)
+
+        # Many against many.
+        pairs = BatchCollisions.circle_pairs_touching(batch, radii)
+        pairs = set(tuple(pair) for pair in pairs.tolist())
+
+        expected = set()
+        for first in range(len(circles)):
+            for second in range(first + 1, len(circles)):
+                if Collisions.circles_touching(
+                        circles[first], circles[second]):
+                    expected.add((first, second))
+
+        assert pairs == expected
+
+        grid = BatchCollisions.circle_grid_touching(
+                batch, radii, [circle.center], [circle.radius])
+
+        assert grid.shape == (len(circles), 1)
+        assert list(grid[:, 0]) == list(touching)
+    # }}}1
+
+    # Swept Circles {{{1
+    def swept_circles():
+        circles_impact = Collisions.circles_impact
+        line_impact = Collisions.circle_line_impact
+        shape_impact = Collisions.circle_shape_impact
+        boundary_impact = Collisions.circle_boundary_impact
+
+        def close(first, second):
+            return abs(first - second) < 1e-9
+
+        mover = Circle(Vector(0, 0), 1)
+        target = Circle(Vector(10, 0), 1)
+
+        # A fast circle that would jump right over its target.
+        assert not Collisions.circles_touching(
+                mover.move(Vector(20, 0)), target)
+        assert close(circles_impact(mover, Vector(20, 0), target), 0.4)
+
+        # Both circles moving towards each other.
+        assert close(circles_impact(
+            mover, Vector(4, 0), target, Vector(-4, 0)), 1)
+
+        # Circles that miss, move apart, or don't get there in time.
+        assert circles_impact(mover, Vector(20, 5), target) is None
+        assert circles_impact(mover, Vector(-20, 0), target) is None
+        assert circles_impact(mover, Vector(5, 0), target) is None
+        assert circles_impact(mover, Vector(0, 0), target) is None
+
+        # Circles that start out touching.
+        assert circles_impact(
+                mover, Vector(-5, 0), mover.move(Vector(1, 0))) == 0
+
+        # The swept test should agree with the static test at the end of the
+        # step for slow sprites.
+        for dx in range(-12, 13, 3):
+            for dy in range(-12, 13, 3):
+                step = Vector(dx, dy) / 10
+                end = mover.move(step + Vector(8, 0))
+                time = circles_impact(mover.move(Vector(8, 0)), step, target)
+
+                if Collisions.circles_touching(end, target):
+                    assert time is not None
+
+        # Lines, from the side and from the ends.
+        wall = Line(Vector(5, -5), Vector(5, 5))
+
+        assert close(line_impact(mover, Vector(10, 0), wall), 0.4)
+        assert close(line_impact(
+            mover, Vector(-10, 0), wall.move(Vector(-10, 0))), 0.4)
+        assert line_impact(mover, Vector(3, 0), wall) is None
+        assert line_impact(mover, Vector(0, 10), wall) is None
+
+        end_on = Circle(Vector(5, -10), 1)
+        assert close(line_impact(end_on, Vector(0, 10), wall), 0.4)
+
+        corner = Circle(Vector(0, 6), 1)
+        assert line_impact(corner, Vector(10, 0), wall) is not None
+
+        # Circles past an end of a line and moving away from it, which would
+        # have reached it in the past.
+        floor = Line(Vector(10, 0), Vector(0, 0))
+        leaving = Circle(Vector(12, 1), 2)
+        assert line_impact(leaving, Vector(30, -10), floor) is None
+
+        sliver = Polygon([Vector(0, 0), Vector(10, 0), Vector(5, -0.1)])
+        assert shape_impact(leaving, Vector(30, -10), sliver) is None
+
+        # Polygons and rectangles.
+        box = Rectangle(5, -2, 7, 2)
+        assert close(shape_impact(mover, Vector(10, 0), box), 0.4)
+        assert shape_impact(mover, Vector(0, 10), box) is None
+        assert shape_impact(Circle(Vector(6, 0), 1), Vector(10, 0), box) == 0
+
+        triangle = Polygon.from_regular(Vector(10, 0), 4, 3)
+        assert shape_impact(mover, Vector(20, 0), triangle) is not None
+        assert shape_impact(mover, Vector(0, 20), triangle) is None
+
+        # Circles staying inside a boundary.
+        boundary = Rectangle(-10, -10, 10, 10)
+
+        assert close(boundary_impact(mover, Vector(18, 0), boundary), 0.5)
+        assert close(boundary_impact(mover, Vector(18, -36), boundary), 0.25)
+        assert boundary_impact(mover, Vector(5, 5), boundary) is None
+        assert boundary_impact(
+                Circle(Vector(9.5, 0), 1), Vector(1, 0), boundary) == 0
+        assert boundary_impact(
+                Circle(Vector(9.5, 0), 1), Vector(-1, 0), boundary) is None
+    # }}}1
+
     print "Testing collisions.py..."
 
     points_and_lines()
@@ -570,5 +1597,11 @@ if __name__ == "__main__":
 
     lines_and_shapes()
     shapes_and_circles()
+    separating_axes()
+    ray_casts()
+    pair_cache()
+    contact_tracker()
+    batches()
+    swept_circles()
 
     print "All tests passed."
@@ -1,97 +1,184 @@
 from __future__ import division
+
+import math
+import operator
+
+from itertools import chain, imap, izip
+
 from vector import *
 from shapes import *
 
 class Sprite:
     """ A parent class for every game object that can move.  This class stores
     position data and handles basic physics, but it is not meant to be
-    directly instantiated. """
+    directly instantiated.
+
+    The physics are integrated using plain floats rather than vectors, since
+    building immutable vectors and circles for every intermediate value was
+    the most expensive part of each update.  The public getters still return
+    vectors and circles, but they are only built when someone asks for them
+    and are reused until the sprite moves again. """
     # Constructor {{{1
 
-    def __init__(self):
-        self.circle = None
+    def __init__(self, facing=None):
         self.behaviors = []
-        self.facing = Vector.random()
 
-        self.velocity = Vector.null()
+        # Sprites face a random direction unless they are told otherwise.
+        # The direction comes from the shared stream in the vector module.
+        if facing is None:
+            facing = Vector.random()
+
+        self.x = self.y = 0.0
+        self.vx = self.vy = 0.0
+        self.fx, self.fy = facing
+        self.ax = self.ay = 0.0
+        self.radius = 0
+
+        # This is an upper bound on how far the sprite has moved since it was
+        # created.  Comparing two readings tells you how much closer the
+        # sprite could have gotten to anything, without having to remember
+        # where it used to be.
+        self.travel = 0.0
+
+        # Sprites with a scheduler only evaluate their behaviors as often as
+        # it thinks they deserve, and reuse the last force in between.
+        self.scheduler = None
+
+        self.circle = None
+        self.position = None
+        self.velocity = None
+        self.facing = None
+
         self.acceleration = Vector.null()
-        self.behavior_acceleration = Vector.null()
 
     def setup(self, position, radius, force=0.0, speed=0.0, facing=Vector.null()):
-        self.circle = Circle(position, radius)
+        self.set_circle(Circle(position, radius))
         self.force = force
         self.speed = speed
         if not facing == Vector.null():
-            self.facing = facing.normal
+            self.fx, self.fy = facing.normal
+            self.facing = None
+
+    def pack_state(self):
+        """ Pack the circle and the velocity into one single precision record.
+        This is all the network needs to refresh a remote copy of a sprite,
+        and it's much smaller than pickling the objects themselves. """
+        circle = self.get_circle().pack(single=True)
+        velocity = self.get_velocity().pack(single=True)
+        return circle + velocity
+
+    def unpack_state(self, state):
+        """ Move this sprite to the circle and velocity in a record made by
+        pack_state().  Nothing else about the sprite is changed. """
+        offset = Circle.packed_size(single=True)
+        self.set_circle(Circle.unpack(state, single=True))
+        self.set_velocity(Vector.unpack(state, offset, single=True))
 
     # Updates {{{1
     def update(self, time):
-        acceleration = self.acceleration
+        ax, ay = self.steer(time)
+        self.integrate(time, ax, ay)
+
+    def steer(self, time, snapshot=None):
+        """ Return the acceleration that the behaviors want.  If a snapshot
+        is given, the behaviors read every sprite from it instead of from the
+        sprites themselves.  Nothing but the behaviors is changed, so sprites
+        can be steered in any order, or at the same time. """
+
+        ax, ay = self.acceleration
+
         # Calculate change to acceleration. Accounts for the weight and
         # prioritization of each behavior. For these purposes, force and
         # acceleration are basically the same in name.
         remaining_force = self.force
+        scheduler = self.scheduler
+        if scheduler: detail = scheduler.detail(self)
+
         for behavior in self.behaviors:
-            ideal_force, weight = behavior.update()
-            force = ideal_force * weight
-            if force.magnitude <= remaining_force:
-                remaining_force -= force.magnitude
-                acceleration += force
+            if scheduler:
+                ideal_force, weight = scheduler.evaluate(
+                        behavior, time, detail, snapshot)
+            elif snapshot is not None:
+                ideal_force, weight = behavior.update(snapshot)
+            else:
+                ideal_force, weight = behavior.update()
+            fx = weight * ideal_force.x
+            fy = weight * ideal_force.y
+            magnitude = math.sqrt(fx * fx + fy * fy)
+            if magnitude <= remaining_force:
+                remaining_force -= magnitude
+                ax += fx; ay += fy
             elif remaining_force > 0:
-                final_force = force.normal * remaining_force
-                acceleration += final_force
+                ax += remaining_force * (fx / magnitude)
+                ay += remaining_force * (fy / magnitude)
                 break
             else:
                 break
 
+        return ax, ay
+
+    def integrate(self, time, ax, ay):
+        """ Move the sprite forward in time with the given acceleration. """
+
         # This is the "Velocity Verlet Algorithm".  I learned it in my
         # computational chemistry class, and it's a better way to integrate
         # Newton's equations of motions than what we were doing before.
-        self.velocity += acceleration * (time / 2)
+        half = time / 2
+
+        self.vx += half * ax; self.vy += half * ay
         self.check_velocity()
-        self.circle = Circle.move(self.circle, self.velocity * time)
-        self.velocity += acceleration * (time / 2)
+        self.x += time * self.vx; self.y += time * self.vy
+        self.travel += time * math.hypot(self.vx, self.vy)
+        self.vx += half * ax; self.vy += half * ay
         self.check_velocity()
 
-        if self.velocity.magnitude > 0.00001:
-            self.facing = self.velocity.normal
+        vx, vy = self.vx, self.vy
+        magnitude = math.sqrt(vx * vx + vy * vy)
 
-        self.behavior_acceleration = acceleration
+        if magnitude > 0.00001:
+            self.fx = vx / magnitude; self.fy = vy / magnitude
+            self.facing = None
 
-    def bounce(self, time, boundary):
-        x, y = self.circle.center
-        vx, vy = self.velocity
+        self.ax = ax; self.ay = ay
+        self.circle = self.position = self.velocity = None
 
+    def bounce(self, time, boundary):
+        x, y = self.x, self.y
         bounce = False
 
         # Check for collisions against the walls.
         if y < boundary.top or y > boundary.bottom:
             bounce = True
-            vy = -vy
+            self.vy = -self.vy
 
         if x < boundary.left or x > boundary.right:
             bounce = True
-            vx = -vx
+            self.vx = -self.vx
 
         # If there is a bounce, flip the velocity and move back onto the
         # screen.
         if bounce:
-            self.velocity = Vector(vx, vy)
-            self.circle = Circle.move(self.circle, self.velocity * time)
+            self.x += time * self.vx; self.y += time * self.vy
+            self.travel += time * math.hypot(self.vx, self.vy)
+            self.circle = self.position = self.velocity = None
 
     def wrap_around(self, boundary):
-        x, y = self.circle.center
-
-        x = x % boundary.width
-        y = y % boundary.height
+        x = self.x % boundary.width
+        y = self.y % boundary.height
 
-        position = Vector(x, y)
-        self.circle = Circle(position, self.circle.radius)
+        self.travel += abs(x - self.x) + abs(y - self.y)
+        self.x, self.y = x, y
+        self.circle = self.position = None
 
     # Methods {{{1
     def check_velocity(self):
-        if self.velocity.magnitude > self.speed:
-            self.velocity = self.velocity.normal * self.speed
+        vx, vy = self.vx, self.vy
+        magnitude = math.sqrt(vx * vx + vy * vy)
+
+        if magnitude > self.speed:
+            self.vx = self.speed * (vx / magnitude)
+            self.vy = self.speed * (vy / magnitude)
+            self.velocity = None
 
     def add_behavior(self, behavior):
         self.behaviors.append(behavior)
@@ -101,18 +188,24 @@ class Sprite:
 
     # Attributes {{{1
     def get_position(self):
-        return self.circle.center
+        if self.position is None:
+            self.position = Vector(self.x, self.y)
+        return self.position
 
     def get_velocity(self):
+        if self.velocity is None:
+            self.velocity = Vector(self.vx, self.vy)
         return self.velocity
 
     def get_acceleration(self):
         return self.acceleration
 
     def get_radius(self):
-        return self.circle.radius
+        return self.radius
 
     def get_circle(self):
+        if self.circle is None:
+            self.circle = Circle(self.get_position(), self.radius)
         return self.circle
     
     def get_speed(self):
@@ -122,19 +215,41 @@ class Sprite:
         return self.behaviors
 
     def get_facing(self):
+        if self.facing is None:
+            self.facing = Vector(self.fx, self.fy)
         return self.facing
 
     def get_behavior_acceleration(self):
-        return self.behavior_acceleration
+        return Vector(self.ax, self.ay)
+
+    def get_travel(self):
+        return self.travel
+
+    def get_scheduler(self):
+        return self.scheduler
     
     def set_position(self, position):
-        self.circle = Circle.move(self.circle, position - self.circle.center)
+        x, y = position
+        self.travel += abs(x - self.x) + abs(y - self.y)
+        self.x, self.y = x, y
+        self.position = position
+        self.circle = None
 
     def set_circle(self, circle):
+        x, y = circle.center
+        self.travel += abs(x - self.x) + abs(y - self.y)
+        self.travel += abs(circle.radius - self.radius)
+        self.x, self.y = x, y
+        self.radius = circle.radius
+        self.position = circle.center
         self.circle = circle
 
     def set_velocity(self, velocity):
+        self.vx, self.vy = velocity
         self.velocity = velocity
+
+    def set_scheduler(self, scheduler):
+        self.scheduler = scheduler
     # }}}1
 
 class DummyTarget (Sprite):
@@ -145,33 +260,674 @@ class DummyTarget (Sprite):
         self.setup(position, radius)
     # }}}1
 
+class Snapshot(object):
+    """ A frozen copy of what a group of sprites looked like at one moment.
+    Behaviors that are given a snapshot read every sprite from it, so their
+    results don't depend on which sprites have already moved.  That means
+    sprites can be steered in any order, or by several threads at once, and
+    still end up in the same places.
+
+    Snapshots are never changed once they are taken.  The idea is to keep
+    two of them: the one from the start of the current tick, which is read
+    while the sprites are being steered, and the next one, which is taken
+    once they have all moved.  Sprites that aren't in the snapshot, like
+    targets that never move, are read directly. """
+
+    class Frozen(object):
+        """ What a single sprite looked like when the snapshot was taken.
+        It has the same getters as a sprite, but no setters. """
+
+        __slots__ = ('position', 'velocity', 'facing', 'radius', 'speed')
+
+        def __init__(self, sprite):
+            self.position = sprite.get_position()
+            self.velocity = sprite.get_velocity()
+            self.facing = sprite.get_facing()
+            self.radius = sprite.get_radius()
+            self.speed = sprite.get_speed()
+
+        def get_position(self):
+            return self.position
+
+        def get_velocity(self):
+            return self.velocity
+
+        def get_facing(self):
+            return self.facing
+
+        def get_radius(self):
+            return self.radius
+
+        def get_speed(self):
+            return self.speed
+
+        def get_circle(self):
+            return Circle(self.position, self.radius)
+
+    # Constructor {{{1
+    def __init__(self, sprites, tick=0):
+        # The sprites are kept so their ids can't be reused while the
+        # snapshot is around.
+        self.sprites = tuple(sprites)
+        self.views = dict(
+                (id(sprite), Snapshot.Frozen(sprite))
+                for sprite in self.sprites)
+        self.tick = tick
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def __iter__(self):
+        return iter(self.sprites)
+
+    def __contains__(self, sprite):
+        return id(sprite) in self.views
+
+    # Methods {{{1
+    def view(self, sprite):
+        return self.views.get(id(sprite), sprite)
+
+    def steer(self, sprites, time, map=map):
+        """ Return the acceleration of each of the given sprites, with every
+        behavior reading from this snapshot.  Any function that works like
+        the builtin map() can be given, like the map() method of a thread
+        pool, and the answers will be the same. """
+        return map(lambda sprite: sprite.steer(time, self), sprites)
+
+    # Attributes {{{1
+    def get_tick(self):
+        return self.tick
+
+    def get_position(self, sprite):
+        return self.view(sprite).get_position()
+
+    def get_velocity(self, sprite):
+        return self.view(sprite).get_velocity()
+
+    def get_facing(self, sprite):
+        return self.view(sprite).get_facing()
+
+    def get_circle(self, sprite):
+        return self.view(sprite).get_circle()
+    # }}}1
+
+class Flock(object):
+    """ Stores a whole group of sprites in NumPy arrays, with one row per
+    sprite, so that they can all be integrated at once.  The physics are the
+    same as in the Sprite class: the same half step Verlet integration, speed
+    limit, wall bouncing and wrapping, done in the same order so that a flock
+    member follows exactly the same path as an equivalent sprite.
+
+    Behaviors aren't run by the flock.  Instead, whatever steers the flock
+    fills in the acceleration array before each update.  Individual members
+    can be reached through FlockMember views, which have the same getters and
+    setters as sprites, so game logic doesn't need to know about the arrays.
+    """
+
+    # Constructor {{{1
+    def __init__(self, capacity=64):
+        if numpy is None:
+            raise ImportError("Flock requires NumPy.")
+
+        self.count = 0
+        self.members = []
+
+        self.positions = numpy.zeros((capacity, 2))
+        self.velocities = numpy.zeros((capacity, 2))
+        self.accelerations = numpy.zeros((capacity, 2))
+        self.facings = numpy.zeros((capacity, 2))
+
+        self.radii = numpy.zeros(capacity)
+        self.speeds = numpy.zeros(capacity)
+        self.forces = numpy.zeros(capacity)
+        self.travel = numpy.zeros(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __getitem__(self, index):
+        return self.members[index]
+
+    # Members {{{1
+    def add(self, position, radius, force=0.0, speed=0.0, facing=None):
+        """ Add a sprite to the flock and return a view of it.  The arguments
+        are the same as for Sprite.setup(). """
+
+        if self.count == len(self.radii):
+            self.resize(2 * self.count)
+
+        index = self.count
+        self.count += 1
+
+        self.positions[index] = position.x, position.y
+        self.velocities[index] = 0, 0
+        self.accelerations[index] = 0, 0
+
+        if facing is None or facing == Vector.null():
+            facing = Vector.random()
+        self.facings[index] = facing.normal.x, facing.normal.y
+
+        self.radii[index] = radius
+        self.speeds[index] = speed
+        self.forces[index] = force
+        self.travel[index] = 0
+
+        member = FlockMember(self, index)
+        self.members.append(member)
+        return member
+
+    def remove(self, member):
+        """ Remove the given member from the flock.  The last member takes
+        its place, so the indices of the other members don't change. """
+
+        index, last = member.index, self.count - 1
+
+        for array in self.arrays():
+            array[index] = array[last]
+
+        moved = self.members.pop()
+        if moved is not member:
+            moved.index = index
+            self.members[index] = moved
+
+        member.flock = None
+        self.count -= 1
+
+    def resize(self, capacity):
+        for name in self.names:
+            array = getattr(self, name)
+            larger = numpy.zeros((capacity,) + array.shape[1:])
+            larger[:len(array)] = array
+            setattr(self, name, larger)
+
+    names = ('positions', 'velocities', 'accelerations', 'facings',
+            'radii', 'speeds', 'forces', 'travel')
+
+    def arrays(self):
+        return [getattr(self, name) for name in self.names]
+
+    # Updates {{{1
+    def update(self, time):
+        """ Integrate every member of the flock, using the accelerations
+        that have already been filled in. """
+
+        count = self.count
+        half = time / 2
+
+        position = self.positions[:count]
+        velocity = self.velocities[:count]
+        acceleration = self.accelerations[:count]
+
+        velocity += half * acceleration
+        self.check_velocity()
+        position += time * velocity
+        self.travel[:count] += time * numpy.hypot(*velocity.T)
+        velocity += half * acceleration
+        self.check_velocity()
+
+        magnitude = Flock.magnitudes(velocity)
+        moving = magnitude > 0.00001
+
+        self.facings[:count][moving] = \
+                velocity[moving] / magnitude[moving, numpy.newaxis]
+
+    @staticmethod
+    def magnitudes(vectors):
+        # This is written out the same way as in the Sprite class, rather
+        # than using hypot(), so that the two round off the same way.
+        x, y = vectors[:, 0], vectors[:, 1]
+        return numpy.sqrt(x * x + y * y)
+
+    def check_velocity(self):
+        count = self.count
+        velocity = self.velocities[:count]
+        speed = self.speeds[:count]
+
+        magnitude = Flock.magnitudes(velocity)
+        fast = magnitude > speed
+
+        velocity[fast] = speed[fast, numpy.newaxis] * \
+                (velocity[fast] / magnitude[fast, numpy.newaxis])
+
+    def bounce(self, time, boundary):
+        count = self.count
+        position = self.positions[:count]
+        velocity = self.velocities[:count]
+
+        x, y = position[:, 0], position[:, 1]
+
+        # Check for collisions against the walls.
+        vertical = (y < boundary.top) | (y > boundary.bottom)
+        horizontal = (x < boundary.left) | (x > boundary.right)
+
+        velocity[vertical, 1] *= -1
+        velocity[horizontal, 0] *= -1
+
+        # If there is a bounce, flip the velocity and move back onto the
+        # screen.
+        bounce = vertical | horizontal
+        step = time * velocity[bounce]
+
+        position[bounce] += step
+        self.travel[:count][bounce] += time * numpy.hypot(*velocity[bounce].T)
+
+    def wrap_around(self, boundary):
+        count = self.count
+        position = self.positions[:count]
+
+        wrapped = position % (boundary.width, boundary.height)
+        self.travel[:count] += numpy.abs(wrapped - position).sum(axis=1)
+        position[:] = wrapped
+    # }}}1
+
+class FlockMember(object):
+    """ A view of a single member of a flock.  It can be used anywhere that
+    a sprite is expected, except that it doesn't run any behaviors.  Reading
+    from a view always reflects the current state of the flock, and writing
+    to it changes the flock. """
+
+    __slots__ = ('flock', 'index')
+
+    def __init__(self, flock, index):
+        self.flock = flock
+        self.index = index
+
+    def __repr__(self):
+        return "<FlockMember %d>" % self.index
+
+    # Attributes {{{1
+    @property
+    def travel(self):
+        return float(self.flock.travel[self.index])
+
+    def get_position(self):
+        return Vector(*self.flock.positions[self.index])
+
+    def get_velocity(self):
+        return Vector(*self.flock.velocities[self.index])
+
+    def get_acceleration(self):
+        return Vector(*self.flock.accelerations[self.index])
+
+    def get_facing(self):
+        return Vector(*self.flock.facings[self.index])
+
+    def get_radius(self):
+        return float(self.flock.radii[self.index])
+
+    def get_circle(self):
+        return Circle(self.get_position(), self.get_radius())
+
+    def get_speed(self):
+        return float(self.flock.speeds[self.index])
+
+    def get_force(self):
+        return float(self.flock.forces[self.index])
+
+    def get_travel(self):
+        return self.travel
+
+    def set_position(self, position):
+        flock, index = self.flock, self.index
+        old = flock.positions[index]
+
+        flock.travel[index] += abs(position.x - old[0]) + \
+                abs(position.y - old[1])
+        flock.positions[index] = position.x, position.y
+
+    def set_circle(self, circle):
+        flock, index = self.flock, self.index
+
+        self.set_position(circle.center)
+        flock.travel[index] += abs(circle.radius - flock.radii[index])
+        flock.radii[index] = circle.radius
+
+    def set_velocity(self, velocity):
+        self.flock.velocities[self.index] = velocity.x, velocity.y
+
+    def set_acceleration(self, acceleration):
+        self.flock.accelerations[self.index] = acceleration.x, acceleration.y
+    # }}}1
+
+
+class Scheduler:
+    """ Decides how often the behaviors of each sprite are worth evaluating.
+    Every behavior class declares how many times per second it would like to
+    be updated.  Sprites near one of the observers (usually the players) get
+    exactly that, sprites further away get it divided by the slowdown, and
+    sprites beyond the far distance or outside the window get it divided by
+    the slowdown twice.  In between evaluations a behavior just repeats its
+    last force.  Counters are kept so you can see how much work was saved.
+    """
+
+    # Constructor {{{1
+    def __init__(self, observers=(), near=200, far=600, window=None,
+            slowdown=4):
+        self.observers = list(observers)
+        self.near = near
+        self.far = far
+        self.window = window
+        self.slowdown = slowdown
+
+        self.evaluations = 0
+        self.skips = 0
+
+    # Scheduling {{{1
+    def detail(self, sprite):
+        """ Return how many times longer than usual the given sprite's
+        behaviors can go between evaluations. """
+
+        x, y = sprite.x, sprite.y
+        distance = min([
+                math.hypot(x - observer.x, y - observer.y)
+                for observer in self.observers] or [self.far + 1])
+
+        if distance <= self.near:
+            return 1
+
+        window = self.window
+        visible = window is None or (
+                window.left <= x <= window.right and
+                window.top <= y <= window.bottom)
+
+        if distance <= self.far and visible:
+            return self.slowdown
+        else:
+            return self.slowdown * self.slowdown
+
+    def evaluate(self, behavior, time, detail=1, snapshot=None):
+        """ Return the force and weight from the given behavior, but only
+        call its update() method if enough time has passed since the last
+        time.  Behaviors without a frequency are updated every frame, unless
+        the detail is reduced. """
+
+        frequency = behavior.frequency
+
+        if frequency is None and detail == 1:
+            return self.update(behavior, snapshot)
+
+        behavior.wait -= time
+        if behavior.wait > 0:
+            self.skips += 1
+            return behavior.get_last_force(), behavior.weight
+
+        period = detail / frequency if frequency else detail * time
+        behavior.wait = max(behavior.wait + period, 0.0)
+
+        return self.update(behavior, snapshot)
+
+    def update(self, behavior, snapshot=None):
+        self.evaluations += 1
+        if snapshot is not None: return behavior.update(snapshot)
+        else: return behavior.update()
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def reset_counters(self):
+        self.evaluations = self.skips = 0
+
+    # Attributes {{{1
+    def get_observers(self):
+        return self.observers
+
+    def get_window(self):
+        return self.window
+
+    def get_evaluations(self):
+        return self.evaluations
+
+    def get_skips(self):
+        return self.skips
+
+    def get_skip_rate(self):
+        total = self.evaluations + self.skips
+        return self.skips / total if total else 0.0
+
+    def set_window(self, window):
+        self.window = window
+    # }}}1
+
+class Pipeline:
+    """ Steers a large group of sprites with fewer method calls.  Sprites
+    with the same stack of behavior classes form an archetype, and each
+    archetype is steered one behavior at a time for all of its sprites at
+    once, using the behavior's fuse() method.  The forces are then combined
+    with exactly the same prioritized budget that Sprite.update() uses, and
+    every sprite is integrated with the result.
+
+    Behaviors without a fuse() method are still evaluated one sprite at a
+    time, but only for the sprites that still have force left over, just like
+    in Sprite.update().  Unlike in Sprite.update(), every sprite is steered
+    before any of them move.  Sprites that override update() or have a
+    scheduler are simply updated on their own.  Call regroup() after
+    changing the behaviors of a sprite in the pipeline.
+
+    The sprites are still separate objects, so their state has to be read
+    into arrays and written back every frame, one sprite at a time.  That is
+    done with as few method calls as possible, and the last force of each
+    fused behavior is only turned into a vector when get_last_force() is
+    called, but it still limits how much faster this can be than updating
+    the sprites directly.  For much larger groups, keep them in a Flock. """
+
+    # Constructor {{{1
+    def __init__(self, sprites=()):
+        self.sprites = list(sprites)
+        self.archetypes = None
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def __iter__(self):
+        return iter(self.sprites)
+
+    # Sprites {{{1
+    def add(self, sprite):
+        self.sprites.append(sprite)
+        self.archetypes = None
+
+    def remove(self, sprite):
+        self.sprites.remove(sprite)
+        self.archetypes = None
+
+    def regroup(self):
+        """ Sort the sprites into archetypes.  The sprites that can't be
+        steered as a group are kept under the key None. """
+
+        archetypes = {}
+        for sprite in self.sprites:
+            key = Pipeline.archetype(sprite)
+            archetypes.setdefault(key, []).append(sprite)
+
+        self.archetypes = archetypes
+        return archetypes
+
+    @staticmethod
+    def archetype(sprite):
+        update = getattr(sprite.update, 'im_func', None)
+        if update is not Sprite.update.im_func or sprite.scheduler:
+            return None
+        return tuple(behavior.__class__ for behavior in sprite.behaviors)
+
+    # Updates {{{1
+    def update(self, time):
+        archetypes = self.archetypes or self.regroup()
+
+        for key, sprites in archetypes.items():
+            if key is None or numpy is None:
+                for sprite in sprites:
+                    sprite.update(time)
+            else:
+                self.steer(key, sprites, time)
+
+    def steer(self, archetype, sprites, time):
+        """ Steer and integrate every sprite of one archetype. """
+
+        count = len(sprites)
+
+        # Everything is read out of the sprites in one pass, without calling
+        # any of their methods.
+        state = imap(Pipeline.state, sprites)
+        state = numpy.fromiter(chain.from_iterable(state), float, count * 12)
+        state = state.reshape(count, 12)
+        stacks = map(Pipeline.stack, sprites)
+
+        positions, velocities = state[:, 0:2], state[:, 2:4]
+        facings, travel = state[:, 4:6], state[:, 6]
+        radii, speeds, remaining = state[:, 7], state[:, 8], state[:, 9]
+        ax, ay = state[:, 10], state[:, 11]
+
+        rows = numpy.arange(count)
+
+        for column, kind in enumerate(archetype):
+            behaviors = [stacks[row][column] for row in rows.tolist()]
+
+            if kind.fuse is not None:
+                forces = kind.fuse(behaviors, positions[rows],
+                        velocities[rows], speeds[rows])
+
+                # The last forces are only turned into vectors if someone
+                # asks for them.
+                for row, behavior in enumerate(behaviors):
+                    behavior.last_force = None
+                    behavior.fused = forces
+                    behavior.row = row
+            else:
+                forces = numpy.array([behavior.update()[0].get_tuple()
+                    for behavior in behaviors], dtype=float).reshape(-1, 2)
+
+            weights = numpy.array([behavior.weight for behavior in behaviors])
+            fx = weights * forces[:, 0]
+            fy = weights * forces[:, 1]
+            magnitude = numpy.sqrt(fx * fx + fy * fy)
+            left = remaining[rows]
+
+            # Sprites with enough force left take the whole thing.  Sprites
+            # without enough take what they can, and then they're done.
+            whole = magnitude <= left
+            part = ~whole & (left > 0)
+
+            full = rows[whole]
+            remaining[full] -= magnitude[whole]
+            ax[full] += fx[whole]; ay[full] += fy[whole]
+
+            ax[rows[part]] += left[part] * (fx[part] / magnitude[part])
+            ay[rows[part]] += left[part] * (fy[part] / magnitude[part])
+
+            rows = full
+            if not len(rows): break
+
+        # The sprites are integrated together by a flock, which moves them
+        # exactly like Sprite.integrate() would, and then written back.
+        flock = Flock(capacity=1)
+        flock.count = count
+
+        flock.positions, flock.velocities = positions, velocities
+        flock.accelerations = state[:, 10:12]
+        flock.facings, flock.travel = facings, travel
+        flock.radii, flock.speeds = radii, speeds
+
+        flock.update(time)
+
+        for sprite, row in izip(sprites, state.tolist()):
+            sprite.x, sprite.y, sprite.vx, sprite.vy, sprite.fx, sprite.fy, \
+                    sprite.travel = row[:7]
+            sprite.ax, sprite.ay = row[10:12]
+            sprite.circle = sprite.position = None
+            sprite.velocity = sprite.facing = None
+
+    state = operator.attrgetter('x', 'y', 'vx', 'vy', 'fx', 'fy', 'travel',
+            'radius', 'speed', 'force', 'acceleration.x', 'acceleration.y')
+    stack = operator.attrgetter('behaviors')
+
+    @staticmethod
+    def positions(targets):
+        """ Return an array of the positions of the given targets.  Many
+        sprites tend to share a target, so each one is only asked once.  The
+        targets are remembered by id, which is only safe because they are
+        all still referred to by their behaviors until this returns. """
+
+        cache = {}
+        positions = []
+
+        for target in targets:
+            key = id(target)
+            if key not in cache:
+                cache[key] = target.get_position().get_tuple()
+            positions.append(cache[key])
+
+        return numpy.array(positions, dtype=float).reshape(-1, 2)
+
+    def get_archetypes(self):
+        return self.archetypes or self.regroup()
+    # }}}1
 
 class Base:
-    # The Base class for all behavior classes.
+    # The Base class for all behavior classes.  The frequency is how many
+    # times per second the behavior wants to be evaluated when a scheduler is
+    # in charge, or None for every frame.
     # Base {{{1
+    frequency = None
+
+    # Behaviors that can steer many sprites at once override this with a
+    # static method that takes a list of behaviors of this class and arrays
+    # of the positions, velocities and speeds of their sprites, and returns
+    # an array of forces.  It must compute exactly what update() would.
+    fuse = None
+
     def __init__ (self, sprite, weight):
         self.sprite = sprite
         self.weight = weight
         self.last_force = Vector.null()
 
+        # Seconds left until a scheduler will evaluate this behavior again.
+        self.wait = 0.0
+
+        # A pipeline leaves the last force in one of its arrays, along with
+        # the row it's in, and sets last_force to None.
+        self.fused = None
+        self.row = 0
+
+    def read(self, snapshot, *sprites):
+        """ Return the given sprites as they were when the snapshot was
+        taken, or just the sprites if there isn't a snapshot. """
+        if snapshot is None: return sprites
+        return [snapshot.view(sprite) for sprite in sprites]
+
     def get_last_force(self):
+        if self.last_force is None:
+            self.last_force = Vector(*self.fused[self.row].tolist())
+            self.fused = None
         return self.last_force
+
+    def get_frequency(self):
+        return self.frequency
     # }}}1
 
 class Seek(Base):
     # Seek {{{1
+    frequency = 30
+
     def __init__ (self, sprite, weight, target, los=0.0):
         Base.__init__(self, sprite, weight)
 
         self.target = target
         self.los = los
 
-    def update (self):
-        desired_direction = self.target.get_position() - self.sprite.get_position()
+    def update (self, snapshot=None):
+        sprite, target = self.read(snapshot, self.sprite, self.target)
+
+        desired_direction = target.get_position() - sprite.get_position()
         if 0.0 == self.los or desired_direction.magnitude <= self.los:
             desired_normal = desired_direction.normal
-            desired_velocity = desired_normal * self.sprite.get_speed()
-            force = desired_velocity - self.sprite.get_velocity()
+            desired_velocity = desired_normal * sprite.get_speed()
+            force = desired_velocity - sprite.get_velocity()
         else:
             force = Vector.null()
 
@@ -181,25 +937,47 @@ class Seek(Base):
         # acceleration is basically the same as force. 
         self.last_force = force
         return force, self.weight
+
+    @staticmethod
+    def fuse(behaviors, positions, velocities, speeds):
+        targets = Pipeline.positions(behavior.target for behavior in behaviors)
+        directions = targets - positions
+        los = numpy.array([behavior.los for behavior in behaviors])
+
+        magnitudes = Flock.magnitudes(directions)
+        seeing = (los == 0.0) | (magnitudes <= los)
+
+        if (seeing & (magnitudes == 0)).any():
+            raise NullVectorError()
+
+        normals = directions[seeing] / magnitudes[seeing, numpy.newaxis]
+        forces = numpy.zeros_like(directions)
+        forces[seeing] = normals * speeds[seeing, numpy.newaxis] \
+                - velocities[seeing]
+        return forces
     # }}}1
 
 class Flee(Base):
     # Flee {{{1
+    frequency = 30
+
     def __init__ (self, sprite, weight, target, los=0.0):
         Base.__init__(self, sprite, weight)
 
         self.target = target
         self.los = los
 
-    def update (self):
-        desired_direction = self.sprite.get_position() - self.target.get_position()
+    def update (self, snapshot=None):
+        sprite, target = self.read(snapshot, self.sprite, self.target)
+
+        desired_direction = sprite.get_position() - target.get_position()
         if 0.0 == self.los or desired_direction.magnitude <= self.los:
             try:
                 desired_normal = desired_direction.normal
             except NullVectorError:
                 desired_normal = Vector.null()
-            desired_velocity = desired_normal * self.sprite.get_speed()
-            force = desired_velocity - self.sprite.get_velocity()
+            desired_velocity = desired_normal * sprite.get_speed()
+            force = desired_velocity - sprite.get_velocity()
         else:
             force = Vector.null()
 
@@ -209,11 +987,33 @@ class Flee(Base):
         # acceleration is basically the same as force. 
         self.last_force = force
         return force, self.weight
+
+    @staticmethod
+    def fuse(behaviors, positions, velocities, speeds):
+        targets = Pipeline.positions(behavior.target for behavior in behaviors)
+        directions = positions - targets
+        los = numpy.array([behavior.los for behavior in behaviors])
+
+        magnitudes = Flock.magnitudes(directions)
+        seeing = (los == 0.0) | (magnitudes <= los)
+        moving = seeing & (magnitudes > 0)
+
+        normals = numpy.zeros_like(directions)
+        normals[moving] = \
+                directions[moving] / magnitudes[moving, numpy.newaxis]
+
+        forces = numpy.zeros_like(directions)
+        forces[seeing] = normals[seeing] * speeds[seeing, numpy.newaxis] \
+                - velocities[seeing]
+        return forces
     # }}}1
 
 class Wander(Base):
     # Wander {{{1
-    def __init__ (self, sprite, weight, radius, distance, jitter):
+    frequency = 10
+
+    def __init__ (self, sprite, weight, radius, distance, jitter,
+            directions=None):
         Base.__init__(self, sprite, weight)
 
         self.target = Sprite()
@@ -224,21 +1024,27 @@ class Wander(Base):
         self.d = distance
         self.j = jitter
 
-        circle_position = Vector.random() * radius
+        # Wandering sprites ask for a random direction every frame, so they
+        # can be given their own stream to make their paths reproducible.
+        self.directions = directions or random_directions
+
+        circle_position = Vector.random(radius, self.directions)
         self.target.setup(circle_position, 1)
 
         #self.seek_target.setup(circle_position, 1)
 
-    def update(self):
+    def update(self, snapshot=None):
+        # The target is private to this behavior, so it's read directly.
+        sprite, = self.read(snapshot, self.sprite)
         circle_position = self.target.get_position()
 
-        jitter = Vector.random() * self.j
+        jitter = Vector.random(self.j, self.directions)
         wander_position = circle_position + jitter
         new_circle_position = wander_position.normal * self.r
 
         self.target.set_position(new_circle_position)
 
-        facing_offset = self.sprite.get_facing() * self.d
+        facing_offset = sprite.get_facing() * self.d
         relative_position = new_circle_position + facing_offset
         
         #self.seek_target.set_position(relative_position)
@@ -250,6 +1056,8 @@ class Wander(Base):
 
 class Arrive(Base):
     # Arrive {{{1
+    frequency = 30
+
     def __init__ (self, sprite, weight, target, los=0.0, urgency=0.3):
         Base.__init__(self, sprite, weight)
 
@@ -259,14 +1067,16 @@ class Arrive(Base):
         elif urgency < 0.0: urgency = 0.0
         self.urgency = urgency
 
-    def update (self):
-        desired_direction = self.target.get_position() - self.sprite.get_position()
-        max_speed = self.sprite.get_speed()
+    def update (self, snapshot=None):
+        sprite, target = self.read(snapshot, self.sprite, self.target)
+
+        desired_direction = target.get_position() - sprite.get_position()
+        max_speed = sprite.get_speed()
         if 0.0 == self.los or desired_direction.magnitude <= self.los:
             desired_velocity = desired_direction * self.urgency
             if desired_velocity.magnitude > max_speed:
                 desired_velocity = max_speed * desired_direction.normal
-            force = desired_velocity - self.sprite.get_velocity()
+            force = desired_velocity - sprite.get_velocity()
         else:
             force = Vector.null()
 
@@ -277,6 +1087,535 @@ class Arrive(Base):
         self.last_force = force
         return force, self.weight
 
+    @staticmethod
+    def fuse(behaviors, positions, velocities, speeds):
+        targets = Pipeline.positions(behavior.target for behavior in behaviors)
+        directions = targets - positions
+        los = numpy.array([behavior.los for behavior in behaviors])
+        urgency = numpy.array([behavior.urgency for behavior in behaviors])
+
+        magnitudes = Flock.magnitudes(directions)
+        seeing = (los == 0.0) | (magnitudes <= los)
+
+        desired = directions * urgency[:, numpy.newaxis]
+        fast = Flock.magnitudes(desired) > speeds
+
+        desired[fast] = speeds[fast, numpy.newaxis] * \
+                (directions[fast] / magnitudes[fast, numpy.newaxis])
+
+        forces = numpy.zeros_like(directions)
+        forces[seeing] = desired[seeing] - velocities[seeing]
+        return forces
+
     def get_target(self):
         return self.target
     # }}}1
+
+class Neighborhood(Base):
+    # The base class for behaviors that react to every sprite within a
+    # certain radius.  The neighbors are found by asking a spatial index, which
+    # is anything with a query_radius() method, so that only nearby sprites
+    # are ever looked at.
+    # Neighborhood {{{1
+    frequency = 10
+
+    def __init__ (self, sprite, weight, index, radius):
+        Base.__init__(self, sprite, weight)
+
+        self.index = index
+        self.radius = radius
+
+    def get_neighbors(self, snapshot=None):
+        # The index itself can't be frozen, so it must not change while a
+        # snapshot is being used.  The neighbors it finds are still read
+        # from the snapshot.
+        sprite, = self.read(snapshot, self.sprite)
+        neighbors = self.index.query_radius(sprite.get_position(), self.radius)
+        neighbors = [other for other in neighbors if other is not self.sprite]
+        return self.read(snapshot, *neighbors)
+
+    def steer(self, direction, snapshot=None):
+        # Steer towards the given direction at full speed, like Seek does.
+        sprite, = self.read(snapshot, self.sprite)
+
+        if not direction:
+            force = Vector.null()
+        else:
+            desired_velocity = direction.normal * sprite.get_speed()
+            force = desired_velocity - sprite.get_velocity()
+
+        self.last_force = force
+        return force, self.weight
+
+    def get_index(self):
+        return self.index
+
+    def get_radius(self):
+        return self.radius
+    # }}}1
+
+class Separation(Neighborhood):
+    # Separation {{{1
+    def update (self, snapshot=None):
+        # Move away from every neighbor, and most urgently from the closest.
+        sprite, = self.read(snapshot, self.sprite)
+        x, y = sprite.get_position()
+        rx = ry = 0.0
+
+        for other in self.get_neighbors(snapshot):
+            ox, oy = other.get_position()
+            dx = x - ox; dy = y - oy
+            distance = dx * dx + dy * dy
+
+            if distance > 0:
+                rx += dx / distance; ry += dy / distance
+
+        return self.steer(Vector(rx, ry), snapshot)
+    # }}}1
+
+class Alignment(Neighborhood):
+    # Alignment {{{1
+    def update (self, snapshot=None):
+        # Try to match the average velocity of the neighbors.
+        sprite, = self.read(snapshot, self.sprite)
+        neighbors = self.get_neighbors(snapshot)
+
+        if neighbors:
+            velocity = sum((other.get_velocity() for other in neighbors),
+                    Vector.null()) / len(neighbors)
+            force = velocity - sprite.get_velocity()
+        else:
+            force = Vector.null()
+
+        self.last_force = force
+        return force, self.weight
+    # }}}1
+
+class Cohesion(Neighborhood):
+    # Cohesion {{{1
+    def update (self, snapshot=None):
+        # Head for the middle of the neighbors.
+        sprite, = self.read(snapshot, self.sprite)
+        neighbors = self.get_neighbors(snapshot)
+
+        if neighbors:
+            center = sum((other.get_position() for other in neighbors),
+                    Vector.null()) / len(neighbors)
+            direction = center - sprite.get_position()
+        else:
+            direction = Vector.null()
+
+        return self.steer(direction, snapshot)
+    # }}}1
+
+if __name__ == "__main__":
+
+    # Flock Tests {{{1
+    def flock_tests():
+        """ Make sure that members of a flock follow exactly the same paths as
+        equivalent sprites. """
+
+        if numpy is None:
+            print "NumPy is not installed, skipping the flock tests."
+            return
+
+        boundary = Rectangle.from_size(100, 80)
+        flock = Flock(capacity=4)
+        sprites, members = [], []
+
+        for index in range(50):
+            position = Vector(index * 37 % 100, index * 53 % 80)
+            facing = Vector.from_radians(index)
+
+            sprite = Sprite()
+            sprite.setup(position, 2, force=50, speed=10 + index % 20,
+                    facing=facing)
+            sprites.append(sprite)
+
+            members.append(flock.add(position, 2, force=50,
+                speed=10 + index % 20, facing=facing))
+
+        assert len(flock) == len(sprites)
+
+        # Setting up a sprite counts as moving it from the origin, but adding
+        # a member to a flock doesn't.
+        starts = dict((sprite, sprite.get_travel()) for sprite in sprites)
+
+        for frame in range(100):
+            for index, (sprite, member) in enumerate(zip(sprites, members)):
+                push = Vector.from_radians(frame * 0.1 + index) * 40
+                sprite.acceleration = push
+                member.set_acceleration(push)
+
+            for sprite in sprites:
+                sprite.update(0.05)
+                sprite.bounce(0.05, boundary)
+                if frame % 10 == 0:
+                    sprite.wrap_around(boundary)
+
+            flock.update(0.05)
+            flock.bounce(0.05, boundary)
+            if frame % 10 == 0:
+                flock.wrap_around(boundary)
+
+            for sprite, member in zip(sprites, members):
+                assert member.get_position() == sprite.get_position()
+                assert member.get_velocity() == sprite.get_velocity()
+                assert member.get_facing() == sprite.get_facing()
+                travel = sprite.get_travel() - starts[sprite]
+                assert abs(member.get_travel() - travel) < 1e-9
+
+        # The views can be used to move members directly.
+        member = members[7]
+        member.set_circle(Circle(Vector(1, 2), 3))
+
+        assert member.get_circle() == Circle(Vector(1, 2), 3)
+        assert flock.radii[7] == 3
+
+        # Removing a member moves the last one into its place.
+        last = members[-1]
+        position = last.get_position()
+
+        flock.remove(members[3])
+
+        assert len(flock) == len(members) - 1
+        assert last.index == 3 and flock[3] is last
+        assert last.get_position() == position
+    # }}}1
+
+    # Neighborhood Tests {{{1
+    def neighborhood_tests():
+        """ Make sure the neighborhood behaviors push sprites the right way,
+        and that they give the same answers with a spatial index as they do
+        when every sprite is checked. """
+
+        from spatial import SpatialHash
+
+        class EverySprite:
+            def __init__(self, sprites): self.sprites = sprites
+            def query_radius(self, center, radius):
+                return [sprite for sprite in self.sprites if
+                        (sprite.get_position() - center).magnitude_squared
+                        <= (radius + sprite.get_radius()) ** 2]
+
+        def sprite(x, y, vx=0, vy=0):
+            sprite = Sprite()
+            sprite.setup(Vector(x, y), 1, force=10, speed=5)
+            sprite.set_velocity(Vector(vx, vy))
+            return sprite
+
+        # A sprite with one neighbor to its right.
+        me, other = sprite(0, 0), sprite(3, 0, 0, 2)
+        index = EverySprite([me, other])
+
+        force, weight = Separation(me, 2, index, 10).update()
+        assert force == Vector(-5, 0) and weight == 2
+
+        force, weight = Cohesion(me, 1, index, 10).update()
+        assert force == Vector(5, 0)
+
+        force, weight = Alignment(me, 1, index, 10).update()
+        assert force == Vector(0, 2)
+
+        # Sprites without neighbors don't get pushed anywhere.
+        for behavior in Separation, Alignment, Cohesion:
+            force, weight = behavior(me, 1, index, 1).update()
+            assert force == Vector.null()
+
+        # A whole crowd, through a spatial hash.
+        import random; random.seed(0)
+        crowd = [sprite(random.uniform(0, 60), random.uniform(0, 60),
+                random.uniform(-3, 3), random.uniform(-3, 3))
+                for index in range(60)]
+
+        grid = SpatialHash(Rectangle.from_size(60, 60), 10)
+        for member in crowd:
+            grid.insert(member)
+
+        every = EverySprite(crowd)
+
+        for member in crowd:
+            for behavior in Separation, Alignment, Cohesion:
+                indexed, weight = behavior(member, 1, grid, 8).update()
+                expected, weight = behavior(member, 1, every, 8).update()
+                assert (indexed - expected).magnitude < 1e-9
+
+            member.add_behavior(Separation(member, 1, grid, 8))
+            member.add_behavior(Alignment(member, 1, grid, 8))
+            member.add_behavior(Cohesion(member, 1, grid, 8))
+
+        # The behaviors fit into the force budget like any other.
+        for frame in range(20):
+            for member in crowd:
+                member.update(0.05)
+            grid.update_all()
+
+        for member in crowd:
+            assert member.get_velocity().magnitude <= 5 + 1e-9
+    # }}}1
+
+    # Scheduler Tests {{{1
+    def scheduler_tests():
+        """ Make sure that sprites are evaluated less often the further they
+        are from the observers, and that the forces in between are reused. """
+
+        player = DummyTarget(Vector(0, 0), 5)
+        window = Rectangle.from_size(1000, 1000)
+        scheduler = Scheduler([player], near=100, far=400, window=window)
+
+        def sprite(x, y):
+            sprite = Sprite()
+            sprite.setup(Vector(x, y), 1, force=10, speed=5)
+            sprite.add_behavior(Seek(sprite, 1, player))
+            sprite.set_scheduler(scheduler)
+            return sprite
+
+        def evaluations(sprite, expected, frames=120, time=1/60):
+            # Rounding can move an evaluation over by a frame.
+            scheduler.reset_counters()
+            for frame in range(frames):
+                sprite.update(time)
+
+            evaluations = scheduler.get_evaluations()
+            assert evaluations + scheduler.get_skips() == frames
+            return abs(evaluations - expected) <= 1
+
+        # Seek wants 30 updates a second, which is every other frame.
+        assert scheduler.detail(sprite(50, 0)) == 1
+        assert evaluations(sprite(50, 0), 60)
+
+        # Further away it gets a quarter of that, and off the screen or
+        # beyond the far distance it gets a sixteenth.
+        assert scheduler.detail(sprite(300, 0)) == 4
+        assert evaluations(sprite(300, 0), 15)
+
+        assert scheduler.detail(sprite(0, -200)) == 16
+        assert scheduler.detail(sprite(500, 0)) == 16
+        assert evaluations(sprite(500, 0), 8, frames=240)
+
+        # Slow frames still get one evaluation each.
+        assert evaluations(sprite(50, 0), 10, frames=10, time=0.1)
+
+        # The skipped frames repeat the last force.
+        far = sprite(300, 0); seek = far.get_behaviors()[0]
+        far.update(1/60); first = seek.get_last_force()
+        far.set_velocity(Vector(1, 1))
+        assert seek.get_last_force() is first
+        assert scheduler.evaluate(seek, 1/60, 4) == (first, 1)
+
+        # Behaviors without a frequency are evaluated every frame up close.
+        close = sprite(50, 0)
+        close.get_behaviors()[0].frequency = None
+        assert evaluations(close, 120)
+
+        # Scheduling with a high enough frequency changes nothing.
+        scheduled, unscheduled = sprite(50, 20), sprite(50, 20)
+        unscheduled.set_scheduler(None)
+        for behavior in scheduled.get_behaviors():
+            behavior.frequency = 1000
+
+        for frame in range(100):
+            scheduled.update(1/60); unscheduled.update(1/60)
+
+        assert scheduled.get_circle() == unscheduled.get_circle()
+        assert scheduled.get_velocity() == unscheduled.get_velocity()
+    # }}}1
+
+    # Pipeline Tests {{{1
+    def pipeline_tests():
+        """ Make sure that sprites steered by a pipeline follow exactly the
+        same paths as sprites that update themselves. """
+
+        if numpy is None:
+            print "NumPy is not installed, skipping the pipeline tests."
+            return
+
+        boundary = Rectangle.from_size(200, 200)
+        target = DummyTarget(Vector(100, 100), 5)
+        threat = DummyTarget(Vector(60, 140), 5)
+
+        def crowd():
+            sprites = []
+            for index in range(60):
+                sprite = Sprite()
+                position = Vector(index * 37 % 200, index * 53 % 200)
+                sprite.setup(position, 2, force=40 + index % 3 * 30,
+                        speed=20, facing=Vector(1, 0))
+
+                if index % 4 == 0:
+                    sprite.add_behavior(Seek(sprite, 1, target))
+                    sprite.add_behavior(Flee(sprite, 2, threat, los=50))
+                elif index % 4 == 1:
+                    sprite.add_behavior(Arrive(sprite, 1, target, urgency=2))
+                elif index % 4 == 2:
+                    directions = RandomDirections(index)
+                    sprite.add_behavior(Flee(sprite, 3, threat, los=80))
+                    sprite.add_behavior(Wander(sprite, 1, 5, 10, 1,
+                            directions=directions))
+                else:
+                    sprite.set_scheduler(Scheduler([target]))
+                    sprite.add_behavior(Seek(sprite, 1, target, los=100))
+
+                sprites.append(sprite)
+            return sprites
+
+        sprites, steered = crowd(), crowd()
+        pipeline = Pipeline(steered)
+
+        archetypes = pipeline.get_archetypes()
+        assert len(archetypes) == 4
+        assert len(archetypes[None]) == 15
+        assert len(archetypes[Seek, Flee]) == 15
+
+        for frame in range(100):
+            for sprite in sprites:
+                sprite.update(0.05)
+                sprite.bounce(0.05, boundary)
+
+            pipeline.update(0.05)
+            for sprite in steered:
+                sprite.bounce(0.05, boundary)
+
+        for sprite, other in zip(sprites, steered):
+            assert sprite.get_circle() == other.get_circle()
+            assert sprite.get_velocity() == other.get_velocity()
+            assert sprite.get_facing() == other.get_facing()
+
+            for behavior, fused in zip(sprite.behaviors, other.behaviors):
+                assert behavior.get_last_force() == fused.get_last_force()
+
+            assert abs(sprite.get_travel() - other.get_travel()) < 1e-9
+
+        # Behaviors that are updated normally after being fused report the
+        # new force, not the fused one.
+        seek = steered[0].behaviors[0]
+        pipeline.update(0.05)
+        force, weight = seek.update()
+        assert seek.get_last_force() is force
+
+        # Changing the behaviors of a sprite moves it to another archetype.
+        steered[0].remove_behavior(steered[0].behaviors[1])
+        pipeline.regroup()
+        assert len(pipeline.get_archetypes()[Seek,]) == 1
+    # }}}1
+
+    # Snapshot Tests {{{1
+    def snapshot_tests():
+        """ Make sure that sprites steered from a snapshot end up in the same
+        places no matter what order they are steered in. """
+
+        from spatial import SpatialHash
+        from multiprocessing.dummy import Pool
+
+        boundary = Rectangle.from_size(100, 100)
+
+        def crowd():
+            grid = SpatialHash(boundary, 10)
+            sprites = []
+
+            for index in range(40):
+                sprite = Sprite()
+                position = Vector(index * 37 % 100, index * 53 % 100)
+                sprite.setup(position, 2, force=30, speed=10,
+                        facing=Vector(1, 0))
+                sprites.append(sprite)
+                grid.insert(sprite)
+
+            # Each sprite chases the next one, so the sprites that move first
+            # change where the others are going.
+            for sprite, target in zip(sprites, sprites[1:] + sprites[:1]):
+                sprite.add_behavior(Separation(sprite, 2, grid, 8))
+                sprite.add_behavior(Seek(sprite, 1, target))
+                sprite.add_behavior(Alignment(sprite, 1, grid, 8))
+
+            return sprites, grid
+
+        def play(sprites, grid, order, map=map):
+            for frame in range(30):
+                snapshot = Snapshot(sprites, frame)
+                accelerations = snapshot.steer(order(sprites), 0.1, map)
+
+                for sprite, (ax, ay) in zip(order(sprites), accelerations):
+                    sprite.integrate(0.1, ax, ay)
+                    sprite.bounce(0.1, boundary)
+
+                grid.update_all()
+
+            return [sprite.get_circle() for sprite in sprites]
+
+        forwards = lambda sprites: sprites
+        backwards = lambda sprites: sprites[::-1]
+
+        pool = Pool(4)
+        expected = play(*crowd(), order=forwards)
+
+        assert play(*crowd(), order=backwards) == expected
+        assert play(*crowd(), order=forwards, map=pool.map) == expected
+        pool.close()
+
+        # Without a snapshot, the order matters.
+        def update(sprites, grid, order):
+            for frame in range(30):
+                for sprite in order(sprites):
+                    sprite.update(0.1)
+                    sprite.bounce(0.1, boundary)
+                grid.update_all()
+            return [sprite.get_circle() for sprite in sprites]
+
+        assert update(*crowd(), order=forwards) != \
+                update(*crowd(), order=backwards)
+
+        # Snapshots don't change when the sprites do.
+        sprites, grid = crowd()
+        snapshot = Snapshot(sprites)
+        before = snapshot.get_position(sprites[0])
+
+        sprites[0].update(0.1)
+        assert sprites[0].get_position() != before
+        assert snapshot.get_position(sprites[0]) == before
+
+        target = DummyTarget(Vector(5, 5), 1)
+        assert target not in snapshot and sprites[0] in snapshot
+        assert snapshot.view(target) is target
+    # }}}1
+
+    # State Tests {{{1
+    def state_tests():
+        """ Make sure that sprites can be packed for the network without
+        changing how they are pickled or copied. """
+
+        import copy, pickle
+
+        target = DummyTarget(Vector(10, 10), 1)
+        sprite = Sprite()
+        sprite.setup(Vector(1 / 3, 2 / 3), 2, force=10, speed=5)
+        sprite.set_velocity(Vector(0.1, 0.2))
+        sprite.add_behavior(Seek(sprite, 1, target))
+
+        for clone in copy.deepcopy(sprite), pickle.loads(pickle.dumps(sprite)):
+            assert clone.get_circle() == sprite.get_circle()
+            assert clone.get_velocity() == sprite.get_velocity()
+            assert clone.get_facing() == sprite.get_facing()
+            assert clone.get_speed() == 5 and len(clone.get_behaviors()) == 1
+            assert clone.get_behaviors()[0].sprite is clone
+
+        # Packed records are single precision, so they only come close.
+        remote = Sprite()
+        remote.unpack_state(sprite.pack_state())
+
+        offset = remote.get_position() - sprite.get_position()
+        assert 0 < offset.magnitude < 1e-6
+        assert remote.get_radius() == 2
+        assert (remote.get_velocity() - sprite.get_velocity()).magnitude < 1e-6
+    # }}}1
+
+    print "Testing flocking.py..."
+
+    state_tests()
+    flock_tests()
+    neighborhood_tests()
+    scheduler_tests()
+    pipeline_tests()
+    snapshot_tests()
+
+    print "All tests passed."
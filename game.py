@@ -23,6 +23,13 @@ class Game:
         Protocol = protocols[settings.role]
         self.network = Protocol(self, settings.host, settings.port)
 
+        # In fixed step mode, the world is always updated with the same time
+        # step.  The time left over after each frame is saved for the next
+        # one, and the fraction of a step it represents tells the gui how far
+        # to draw the sprites between their last two positions.
+        self.accumulator = 0
+        self.interpolation = 1
+
     def __iter__(self):
         yield self.world
         yield self.gui
@@ -45,17 +52,50 @@ class Game:
     def get_network(self):
         return self.network
 
+    def get_interpolation(self):
+        return self.interpolation
+
     def play(self):
         clock = pygame.time.Clock()
         frequency = settings.clock_rate
 
         while self.world.is_playing():
             time = clock.tick(frequency) / 1000
-            for system in self:
-                system.update(time)
+
+            if settings.fixed_step:
+                self.step(time)
+                self.gui.update(time)
+                self.network.update(time)
+
+            else:
+                for system in self:
+                    system.update(time)
 
         raw_input("\nPress <Enter> to exit the game.")
 
+    def step(self, time):
+        """ Update the world as many times as the given time allows, using a
+        fixed time step.  If the game falls too far behind, the extra time is
+        dropped rather than making the next frame even slower.  Returns the
+        number of steps taken. """
+
+        step = 1 / settings.step_rate
+        steps = 0
+
+        self.accumulator += time
+
+        while self.accumulator >= step:
+            if steps == settings.max_steps:
+                self.accumulator %= step
+                break
+
+            self.world.update(step)
+            self.accumulator -= step
+            steps += 1
+
+        self.interpolation = self.accumulator / step
+        return steps
+
 if __name__ == "__main__":
     try: 
         game = Game()
@@ -66,6 +66,10 @@ class Gui:
         world = self.world
         screen = self.screen
 
+        # Sprites are drawn between their last two positions, so that motion
+        # stays smooth when the world is updated at a different rate.
+        fraction = self.game.get_interpolation()
+
         # Draw the background.
         screen.fill(settings.background_color)
 
@@ -81,7 +85,7 @@ class Gui:
         you = world.get_you(), your_color
         
         for player, color in me, you:
-            position = player.get_position().get_pygame()
+            position = world.interpolate(player, fraction).get_pygame()
             radius = player.get_radius()
 
             pygame.draw.circle(screen, color, position, radius)
@@ -90,7 +94,7 @@ class Gui:
         button = world.get_button()
 
         color = settings.button_color
-        position = button.get_position().get_pygame()
+        position = world.interpolate(button, fraction).get_pygame()
         radius = button.get_radius()
 
         if world.is_eater(): progress = 1
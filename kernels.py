@@ -0,0 +1,421 @@
+""" The kernels module contains the arithmetic behind every collision test.
+Each function takes plain coordinates rather than vectors or shapes, compares
+squared distances wherever it can, and allocates as little as possible.  The
+Collisions class is a thin layer on top of these functions that unpacks the
+shapes, so most code should use that class instead.
+
+Lines are always given head first and then tail, and boxes are given as left,
+top, right and bottom. """
+
+from __future__ import division
+
+import math
+
+# Points and Lines {{{1
+def points_nearby(ax, ay, bx, by, padding):
+    """ Return true if the two points are within the given distance. """
+    dx = ax - bx; dy = ay - by
+    return padding >= 0 and dx * dx + dy * dy <= padding * padding
+
+def point_on_line(px, py, hx, hy, tx, ty):
+    """ Return true if the point lies on the line segment. """
+    if hx == tx and hy == ty:
+        return px == hx and py == hy
+
+    ux = hx - tx; uy = hy - ty
+    vx = px - tx; vy = py - ty
+
+    if ux == vx and uy == vy:
+        return True
+    if ux * vy - uy * vx != 0:
+        return False
+
+    try:
+        k = vx // ux
+    except ZeroDivisionError:
+        k = vy // uy
+
+    return k == 0
+
+def point_near_line(px, py, hx, hy, tx, ty, padding):
+    """ Return true if the point is within the given distance of any part of
+    the line segment. """
+
+    ux = hx - tx; uy = hy - ty
+    length = ux * ux + uy * uy
+
+    # Find the point on the segment that is closest to the given point.
+    if length == 0:
+        cx = tx; cy = ty
+    else:
+        t = ((px - tx) * ux + (py - ty) * uy) / length
+        t = 0 if t < 0 else 1 if t > 1 else t
+        cx = tx + t * ux; cy = ty + t * uy
+
+    return points_nearby(px, py, cx, cy, padding)
+
+def point_past_line(px, py, hx, hy, tx, ty, fx, fy, padding=0):
+    """ Return true if the point is no further than the given padding in
+    front of the line, as determined by the line's facing. """
+
+    cx = (hx + tx) / 2.0; cy = (hy + ty) / 2.0
+    return (px - cx) * fx + (py - cy) * fy <= padding
+
+# Lines Touching {{{1
+def point_within_bounds(px, py, hx, hy, tx, ty):
+    """ Return true if a point that is already known to be collinear with a
+    line segment falls between its endpoints. """
+
+    if hx == tx:
+        return min(hy, ty) <= py <= max(hy, ty)
+    return min(hx, tx) <= px <= max(hx, tx)
+
+def lines_touching(ahx, ahy, atx, aty, bhx, bhy, btx, bty):
+    """ Return true if the two line segments touch or cross. """
+
+    ux = ahx - atx; uy = ahy - aty
+    vx = bhx - btx; vy = bhy - bty
+
+    wx = atx - btx; wy = aty - bty
+    qx = ahx - btx; qy = ahy - bty
+
+    denom = float(ux * vy - uy * vx)
+
+    # Parallel, maybe coincident
+    if denom == 0:
+        # Check for coincidence
+        if ux * wy - uy * wx != 0 or vx * wy - vy * wx != 0:
+            return False
+
+        first_degenerate = (ux == 0 and uy == 0)
+        second_degenerate = (vx == 0 and vy == 0)
+
+        # Check for degeneracy
+        if first_degenerate and second_degenerate:
+            return ahx == bhx and ahy == bhy
+
+        elif first_degenerate:
+            return point_within_bounds(ahx, ahy, bhx, bhy, btx, bty)
+
+        elif second_degenerate:
+            return point_within_bounds(bhx, bhy, ahx, ahy, atx, aty)
+
+        # Check for segment overlap
+        else:
+            try:
+                s = qx / vx
+                t = wx / vx
+            except ZeroDivisionError:
+                s = qy / vy
+                t = wy / vy
+
+            if s > t:
+                s, t = t, s
+
+            return not (s > 1 or t < 0)
+
+    # Skew: maybe intersecting.
+    else:
+        s = (vx * wy - vy * wx) / denom
+        if s < 0 or s > 1:
+            return False
+
+        t = (ux * wy - uy * wx) / denom
+        return not (t < 0 or t > 1)
+
+# Circles {{{1
+def circles_nearby(ax, ay, ar, bx, by, br, padding):
+    """ Return true if the two circles are within the given distance. """
+    return points_nearby(ax, ay, bx, by, ar + br + padding)
+
+def circles_gap(ax, ay, ar, bx, by, br):
+    """ Return the distance between the edges of the two circles.  This is
+    negative if the circles overlap. """
+    return math.hypot(ax - bx, ay - by) - ar - br
+
+def circle_near_line(cx, cy, r, hx, hy, tx, ty, padding):
+    """ Return true if the circle is within the given distance of the line
+    segment. """
+    return point_near_line(cx, cy, hx, hy, tx, ty, r + padding)
+
+# Separating Axes {{{1
+# Convex polygons are given as flat tuples of coordinates, like (x0, y0, x1,
+# y1, ...), and the axes to test are given the same way as a tuple of unit
+# normals.  Instead of a boolean, the overlap tests return the shallowest
+# overlap they found as a (depth, nx, ny) tuple, where the normal points in the
+# direction that the first shape would have to move to get out of the second.
+# None is returned if some axis separates the two shapes.
+
+def project(coordinates, nx, ny):
+    """ Return the range covered by the given points along the given axis. """
+
+    low = high = coordinates[0] * nx + coordinates[1] * ny
+
+    for index in range(2, len(coordinates), 2):
+        distance = coordinates[index] * nx + coordinates[index + 1] * ny
+        if distance < low: low = distance
+        elif distance > high: high = distance
+
+    return low, high
+
+def polygons_overlap(first, second, axes):
+    """ Return the shallowest overlap between two convex polygons. """
+
+    best = None
+
+    for index in range(0, len(axes), 2):
+        nx = axes[index]; ny = axes[index + 1]
+
+        first_low, first_high = project(first, nx, ny)
+        second_low, second_high = project(second, nx, ny)
+
+        if first_high < second_low or second_high < first_low:
+            return None
+
+        # Decide which way the first polygon would have to move along this
+        # axis to get out of the second, and how far.
+        forward = second_high - first_low
+        backward = first_high - second_low
+
+        if forward <= backward:
+            if best is None or forward < best[0]:
+                best = forward, nx, ny
+        else:
+            if best is None or backward < best[0]:
+                best = backward, -nx, -ny
+
+    return best
+
+def circle_polygon_overlap(cx, cy, r, polygon, axes):
+    """ Return the shallowest overlap between a circle and a convex polygon.
+    Besides the edge normals, the axis running from the closest vertex to the
+    center of the circle also has to be checked. """
+
+    # Find the vertex closest to the circle.
+    closest = None
+
+    for index in range(0, len(polygon), 2):
+        dx = cx - polygon[index]; dy = cy - polygon[index + 1]
+        distance = dx * dx + dy * dy
+
+        if closest is None or distance < closest:
+            closest = distance; vx = dx; vy = dy
+
+    best = None
+
+    for index in range(0, len(axes) + 2, 2):
+        if index < len(axes):
+            nx = axes[index]; ny = axes[index + 1]
+        elif closest > 0:
+            scale = math.sqrt(closest)
+            nx = vx / scale; ny = vy / scale
+        else:
+            break
+
+        center = cx * nx + cy * ny
+        low, high = project(polygon, nx, ny)
+
+        if center + r < low or high < center - r:
+            return None
+
+        forward = high - (center - r)
+        backward = (center + r) - low
+
+        if forward <= backward:
+            if best is None or forward < best[0]:
+                best = forward, nx, ny
+        else:
+            if best is None or backward < best[0]:
+                best = backward, -nx, -ny
+
+    return best
+
+# Swept Circles {{{1
+# These functions find the earliest moment that a moving circle touches
+# something.  Motion is given as a displacement over the whole step, and time
+# is measured as a fraction of that step.  None is returned if the circle
+# doesn't touch anything before the end of the step.
+
+def circles_impact(ax, ay, adx, ady, ar, bx, by, bdx, bdy, br):
+    """ Return the time at which two moving circles first touch. """
+
+    # Work in the frame of the second circle, so only one of them moves.
+    px = ax - bx; py = ay - by
+    dx = adx - bdx; dy = ady - bdy
+    reach = ar + br
+
+    c = px * px + py * py - reach * reach
+    if c <= 0:
+        return 0.0
+
+    a = dx * dx + dy * dy
+    b = px * dx + py * dy
+
+    # The circles have to be approaching each other to ever touch.
+    if a == 0 or b >= 0:
+        return None
+
+    discriminant = b * b - a * c
+    if discriminant < 0:
+        return None
+
+    time = (-b - math.sqrt(discriminant)) / a
+    return time if time <= 1 else None
+
+def circle_line_impact(cx, cy, dx, dy, r, hx, hy, tx, ty):
+    """ Return the time at which a moving circle first touches a line
+    segment.  The circle can either hit the body of the segment or one of its
+    endpoints, and the earliest of those is returned. """
+
+    if point_near_line(cx, cy, hx, hy, tx, ty, r):
+        return 0.0
+
+    earliest = circles_impact(cx, cy, dx, dy, r, hx, hy, 0, 0, 0)
+    time = circles_impact(cx, cy, dx, dy, r, tx, ty, 0, 0, 0)
+
+    if earliest is None or (time is not None and time < earliest):
+        earliest = time
+
+    ux = hx - tx; uy = hy - ty
+    length = ux * ux + uy * uy
+
+    if length == 0:
+        return earliest
+
+    # Find when the circle reaches the near side of the line, and check that
+    # it does so between the endpoints.
+    scale = math.sqrt(length)
+    nx = -uy / scale; ny = ux / scale
+
+    distance = (cx - tx) * nx + (cy - ty) * ny
+    approach = dx * nx + dy * ny
+
+    if distance * approach >= 0:
+        return earliest
+
+    side = r if distance > 0 else -r
+    time = (side - distance) / approach
+
+    if time < 0 or time > 1 or (earliest is not None and time >= earliest):
+        return earliest
+
+    x = cx + time * dx - tx; y = cy + time * dy - ty
+    along = (x * ux + y * uy) / length
+
+    return time if 0 <= along <= 1 else earliest
+
+def circle_boundary_impact(cx, cy, dx, dy, r, left, top, right, bottom):
+    """ Return the time at which a moving circle that is meant to stay inside
+    the given box first touches one of its walls.  Only walls that the circle
+    is moving towards count, and a circle that is already pushing through a
+    wall hits it immediately. """
+
+    earliest = None
+
+    for position, step, low, high in \
+            (cx, dx, left, right), (cy, dy, top, bottom):
+
+        if step > 0:
+            time = (high - r - position) / step
+        elif step < 0:
+            time = (low + r - position) / step
+        else:
+            continue
+
+        time = max(0.0, time)
+        if time <= 1 and (earliest is None or time < earliest):
+            earliest = time
+
+    return earliest
+
+# Boxes {{{1
+def boxes_touching(al, at, ar, ab, bl, bt, br, bb):
+    """ Return true if the two boxes overlap or share an edge. """
+    return not (at > bb or ab < bt or al > br or ar < bl)
+
+def circle_touching_box(cx, cy, r, left, top, right, bottom):
+    """ Return true if the circle overlaps the box. """
+    dx = max(left - cx, 0, cx - right)
+    dy = max(top - cy, 0, cy - bottom)
+    return dx * dx + dy * dy <= r * r
+
+def line_touching_box(hx, hy, tx, ty, left, top, right, bottom):
+    """ Return true if any part of the line segment is inside the box. """
+    return ray_box_hit(tx, ty, hx - tx, hy - ty,
+            left, top, right, bottom) is not None
+
+# Rays {{{1
+# Rays start at a point and extend along a displacement.  These functions
+# return the fraction of the way along the displacement where the ray first
+# meets a shape, or None if it never does.  Rays that start inside a shape hit
+# it right away.
+
+def ray_line_hit(ox, oy, dx, dy, hx, hy, tx, ty):
+    """ Return where the ray first meets the line segment. """
+
+    ux = hx - tx; uy = hy - ty
+    wx = tx - ox; wy = ty - oy
+
+    denom = dx * uy - dy * ux
+
+    # Parallel, maybe collinear.
+    if denom == 0:
+        if dx * wy - dy * wx != 0:
+            return None
+
+        length = dx * dx + dy * dy
+        if length == 0:
+            return 0.0 if point_on_line(ox, oy, hx, hy, tx, ty) else None
+
+        # Find where each end of the segment falls along the ray.
+        near = (wx * dx + wy * dy) / length
+        far = ((hx - ox) * dx + (hy - oy) * dy) / length
+
+        if near > far:
+            near, far = far, near
+        if far < 0 or near > 1:
+            return None
+
+        return max(near, 0.0)
+
+    # Skew: maybe crossing.
+    t = (wx * uy - wy * ux) / denom
+    s = (wx * dy - wy * dx) / denom
+
+    if 0 <= t <= 1 and 0 <= s <= 1:
+        return t
+    return None
+
+def ray_circle_hit(ox, oy, dx, dy, cx, cy, r):
+    """ Return where the ray first meets the circle. """
+    return circles_impact(ox, oy, dx, dy, 0, cx, cy, 0, 0, r)
+
+def ray_box_hit(ox, oy, dx, dy, left, top, right, bottom):
+    """ Return where the ray first meets the box. """
+
+    # Clip the ray against each pair of parallel box edges in turn.  If
+    # nothing is left of the ray, then it missed the box.
+    start, end = 0.0, 1.0
+
+    for position, step, low, high in \
+            (ox, dx, left, right), (oy, dy, top, bottom):
+
+        if step == 0:
+            if position < low or position > high:
+                return None
+            continue
+
+        near = (low - position) / step
+        far = (high - position) / step
+
+        if near > far:
+            near, far = far, near
+
+        start = max(start, near)
+        end = min(end, far)
+
+        if start > end:
+            return None
+
+    return start
+# }}}1
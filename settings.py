@@ -13,6 +13,10 @@ port = arguments.option("port", default=0, cast=int) + 11249
 print host, port
 
 clock_rate = 40
+
+fixed_step = False
+step_rate = 40
+max_steps = 5
 refresh_rate = 100 / 1000
 
 size = Rectangle.from_size(500, 500)
@@ -7,6 +7,10 @@ from tokens import *
 from shapes import *
 
 clock_rate = 40
+
+fixed_step = False
+step_rate = 40
+max_steps = 5
 refresh_rate = 100 / 1000
 
 size = Rectangle.from_size(500, 500)
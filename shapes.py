@@ -13,6 +13,8 @@ All of the shape classes are immutable and are not meant to be subclassed. """
 
 from __future__ import division
 
+import struct
+
 from vector import *
 
 class Line(object):
@@ -33,20 +35,84 @@ class Line(object):
         point is taken to be the tail of the line, although a distinction is
         hardly ever made. """
         return Line(tail, tail + direction, normal)
+
+    def move(self, displacement):
+        """ Return a line that is offset from this one.  The normal doesn't
+        change, so it is handed to the new line instead of being found
+        again. """
+
+        line = Line(self.__head + displacement,
+                self.__tail + displacement, self.__facing)
+
+        line.__normal = self.__normal
+        line.__degenerate = self.__degenerate
+        return line
+
+    def transform(self, cosine, sine, pivot, displacement):
+        """ Return a line that has been rotated about the given pivot and then
+        offset.  The rotation is given as a cosine and a sine, so that they
+        only have to be found once for a whole shape.  The facing and the
+        normal are rotated along with the line, which is cheaper than finding
+        a new normal. """
+
+        def rotate(v):
+            return Vector(cosine * v.x - sine * v.y, sine * v.x + cosine * v.y)
+
+        offset = pivot + displacement
+
+        head = rotate(self.__head - pivot) + offset
+        tail = rotate(self.__tail - pivot) + offset
+        facing = self.__facing
+
+        line = Line(head, tail, facing if facing is None else rotate(facing))
+
+        if self.__normal is not None:
+            line.__normal = rotate(self.__normal)
+        line.__degenerate = self.__degenerate
+
+        return line
+    # }}}1
+
+    # Serialization {{{1
+    # Lines are packed as their head, their tail and their facing, followed
+    # by a flag that records whether or not the line had a facing.
+    formats = struct.Struct('<6dB'), struct.Struct('<6fB')
+
+    @staticmethod
+    def packed_size(single=False):
+        return Line.formats[single].size
+
+    @staticmethod
+    def unpack(buffer, offset=0, single=False):
+        values = Line.formats[single].unpack_from(buffer, offset)
+        hx, hy, tx, ty, fx, fy, facing = values
+
+        facing = Vector(fx, fy) if facing else None
+        return Line(Vector(hx, hy), Vector(tx, ty), facing)
+
+    def pack(self, single=False):
+        head, tail = self.__head, self.__tail
+        facing = self.__facing or Vector.null()
+
+        return Line.formats[single].pack(head.x, head.y, tail.x, tail.y,
+                facing.x, facing.y, self.__facing is not None)
     # }}}1
 
     # Operators {{{1
+    # The normal isn't found until it is needed, since that takes a square
+    # root and most lines never get asked for it.
+    __slots__ = ('__head', '__tail', '__facing', '__normal', '__degenerate')
+
     def __init__(self, head, tail, facing=None):
         self.__head = head
         self.__tail = tail
         self.__facing = facing
 
-        try:
-            self.__normal = (head - tail).get_orthonormal()
-            self.__degenerate = False
-        except NullVectorError:
-            self.__normal = None
-            self.__degenerate = True
+        self.__normal = None
+        self.__degenerate = None
+
+    def __reduce__(self):
+        return Line, (self.__head, self.__tail, self.__facing)
 
     def __eq__(self, other):
         if self.facing != other.facing:
@@ -74,6 +140,8 @@ class Line(object):
 
     @property
     def degenerate(self):
+        if self.__degenerate is None:
+            self.__degenerate = (self.__head == self.__tail)
         return self.__degenerate
 
     @property
@@ -83,6 +151,10 @@ class Line(object):
 
     @property
     def normal(self):
+        if self.__normal is None and not self.degenerate:
+            direction = self.__head - self.__tail
+            self.__normal = direction.get_orthonormal()
+
         assert self.__normal
         return self.__normal
 
@@ -90,6 +162,10 @@ class Line(object):
     def center(self):
         return (self.head + self.tail) / 2.0
 
+    @property
+    def box(self):
+        return Rectangle.from_corners(self.__head, self.__tail)
+
     @property
     def points(self):
         return (self.head, self.tail)
@@ -110,6 +186,7 @@ class Line(object):
     def get_normal(self): return self.normal
     
     def get_center(self): return self.center
+    def get_box(self): return self.box
     def get_points(self): return self.points
     def get_direction(self): return self.direction
 
@@ -133,11 +210,35 @@ class Circle(object):
         return Circle(self.center + displacement, self.radius)
     # }}}1
 
+    # Serialization {{{1
+    formats = struct.Struct('<3d'), struct.Struct('<3f')
+
+    @staticmethod
+    def packed_size(single=False):
+        return Circle.formats[single].size
+
+    @staticmethod
+    def unpack(buffer, offset=0, single=False):
+        x, y, radius = Circle.formats[single].unpack_from(buffer, offset)
+        return Circle(Vector(x, y), radius)
+
+    def pack(self, single=False):
+        center = self.__center
+        return Circle.formats[single].pack(center.x, center.y, self.__radius)
+    # }}}1
+
     # Operators {{{1
+    # Circles are moved every frame, but their bounding boxes are only needed
+    # by the spatial queries.  The box is built the first time it's used.
+    __slots__ = ('__center', '__radius', '__box')
+
     def __init__(self, center, radius):
         self.__center = center
         self.__radius = radius
-        self.__box = Rectangle.from_circle(self)
+        self.__box = None
+
+    def __reduce__(self):
+        return Circle, (self.__center, self.__radius)
 
     def __eq__(self, other):
         return (self.center == other.center and
@@ -157,6 +258,8 @@ class Circle(object):
 
     @property
     def box(self):
+        if self.__box is None:
+            self.__box = Rectangle.from_circle(self)
         return self.__box
 
     @property
@@ -188,6 +291,8 @@ class Shape(object):
     supposed to be an abstract base class; it is meant to be inherited rather
     than instantiated. """
 
+    __slots__ = ()
+
     # Attributes {{{1
     @property
     def edges(self): raise NotImplementedError
@@ -199,17 +304,57 @@ class Shape(object):
     @property
     def box(self): raise NotImplementedError
 
+    @property
+    def coordinates(self): raise NotImplementedError
+    @property
+    def axes(self): raise NotImplementedError
+
     @property
     def pygame(self): raise NotImplementedError
 
     def get_edges(self): return self.edges
     def get_vertices(self): return self.vertices
 
+    def get_coordinates(self): return self.coordinates
+    def get_axes(self): return self.axes
+
     def get_center(self): return self.center
     def get_box(self): return self.box
 
     def get_pygame(self): return self.pygame
 
+    # Transformations {{{1
+    def rotate(self, angle, pivot=None):
+        """ Return a polygon that has been rotated by the given angle, in
+        radians, about the given pivot.  The pivot defaults to the center of
+        this shape. """
+        return self.transform(Vector.null(), angle, pivot)
+
+    def transform(self, displacement, angle=0, pivot=None):
+        """ Return a polygon that has been rotated about the given pivot and
+        then offset.  The vertices, edges and center of this shape are carried
+        over to the new one, so no square roots are taken and the vertices
+        don't have to be checked again.  The bounding box is left to be found
+        when it's needed. """
+
+        center = self.center
+        pivot = center if pivot is None else pivot
+
+        cosine = math.cos(angle)
+        sine = math.sin(angle)
+
+        def place(v):
+            x = v.x - pivot.x; y = v.y - pivot.y
+            return Vector(
+                    cosine * x - sine * y + pivot.x + displacement.x,
+                    sine * x + cosine * y + pivot.y + displacement.y)
+
+        vertices = [place(vertex) for vertex in self.vertices]
+        edges = [edge.transform(cosine, sine, pivot, displacement)
+                for edge in self.edges]
+
+        return Polygon.from_cached(vertices, place(center), edges)
+
     # Setup Methods {{{1
     @staticmethod
     def check_vertices(vertices):
@@ -252,6 +397,26 @@ class Shape(object):
 
         return edges
 
+    @staticmethod
+    def find_axes(edges):
+        """ Return the edge normals as a flat tuple of coordinates.  Parallel
+        edges share an axis, so a regular polygon with an even number of sides
+        only needs half as many axes as it has edges. """
+
+        axes = []
+
+        for edge in edges:
+            facing = edge.facing
+            x, y = facing.x, facing.y
+
+            for index in range(0, len(axes), 2):
+                if abs(x * axes[index + 1] - y * axes[index]) < 1e-12:
+                    break
+            else:
+                axes += x, y
+
+        return tuple(axes)
+
     @staticmethod
     def yield_vertices(vertices, count):
         size = len(vertices)
@@ -278,29 +443,124 @@ class Polygon(Shape):
         must must convex; an assertion will fail if it isn't. """
         return Polygon(vertices)
 
+    @staticmethod
+    def from_trusted_vertices(vertices):
+        """ Create a polygon from a list of vertices that are already known to
+        describe a convex shape.  The convexity check is skipped, so this
+        should only be used for vertices that came from another polygon or
+        that were validated some other way. """
+        return Polygon(vertices, trusted=True)
+
+    @staticmethod
+    def from_cached(vertices, center=None, edges=None, box=None, axes=None):
+        """ Create a polygon from trusted vertices and any derived values
+        that are already known.  This is meant for building one polygon out
+        of another, and the values aren't checked against each other. """
+
+        polygon = Polygon(vertices, trusted=True)
+
+        polygon.__center = center
+        polygon.__edges = edges
+        polygon.__box = box
+        polygon.__axes = axes
+
+        return polygon
+
     @staticmethod
     def from_regular(center, radius, sides, angle=0):
         """ Create a regular polygon with the given number of sides. """
         vertices = []
 
         for index in range(sides):
-            normal = Vector.from_radians(2 * pi * index / sides + angle)
+            normal = Vector.from_radians(2 * math.pi * index / sides + angle)
             vertex = center + radius * normal
             vertices.append(vertex)
 
         return Polygon(vertices)
+
+    def move(self, displacement):
+        """ Return a polygon that is offset from this one.  Every value that
+        has already been found for this polygon just moves along with it, and
+        the axes don't change at all. """
+
+        vertices = [vertex + displacement for vertex in self.__vertices]
+        center, edges, box = self.__center, self.__edges, self.__box
+
+        if center is not None:
+            center = center + displacement
+        if edges is not None:
+            edges = [edge.move(displacement) for edge in edges]
+        if box is not None:
+            box = box.move(displacement)
+
+        return Polygon.from_cached(vertices, center, edges, box, self.__axes)
+    # }}}1
+
+    # Serialization {{{1
+    # Polygons are packed as a vertex count followed by the coordinates of
+    # each vertex, so unlike the other shapes their size isn't fixed.
+    header = struct.Struct('<H')
+    formats = '<%dd', '<%df'
+
+    @staticmethod
+    def packed_size(count, single=False):
+        coordinates = Polygon.formats[single] % (2 * count)
+        return Polygon.header.size + struct.calcsize(coordinates)
+
+    @staticmethod
+    def unpack(buffer, offset=0, single=False, trusted=False):
+        """ Read a polygon from the given offset into a buffer.  The vertices
+        are checked unless the buffer is trusted. """
+
+        count, = Polygon.header.unpack_from(buffer, offset)
+        offset += Polygon.header.size
+
+        layout = Polygon.formats[single] % (2 * count)
+        coordinates = struct.unpack_from(layout, buffer, offset)
+
+        vertices = [Vector(x, y) for x, y in
+                zip(coordinates[0::2], coordinates[1::2])]
+
+        return Polygon(vertices, trusted)
+
+    def pack(self, single=False):
+        vertices = self.__vertices
+        layout = Polygon.formats[single] % (2 * len(vertices))
+
+        coordinates = []
+        for vertex in vertices:
+            coordinates += vertex.x, vertex.y
+
+        return Polygon.header.pack(len(vertices)) + \
+                struct.pack(layout, *coordinates)
     # }}}1
 
     # Operators {{{1
-    def __init__(self, vertices):
-        self.__vertices = Polygon.check_vertices(vertices)
-        self.__center = Polygon.find_center(vertices)
-        self.__edges = Polygon.find_edges(vertices, self.__center)
-        self.__box = Rectangle.from_shape(self)
+    # The vertices are checked right away, so that illegal polygons fail where
+    # they are created.  Everything derived from the vertices is found the
+    # first time it is needed.
+    __slots__ = ('__vertices', '__center', '__edges', '__box',
+            '__coordinates', '__axes')
+
+    def __init__(self, vertices, trusted=False):
+        if not trusted:
+            Polygon.check_vertices(vertices)
+
+        self.__vertices = vertices
+        self.__center = None
+        self.__edges = None
+        self.__box = None
+        self.__coordinates = None
+        self.__axes = None
+
+    def __reduce__(self):
+        return Polygon, (self.__vertices, True)
 
     # Attributes {{{1
     @property
     def edges(self):
+        if self.__edges is None:
+            self.__edges = Polygon.find_edges(self.__vertices, self.center)
         return self.__edges
 
     @property
@@ -309,12 +569,31 @@ class Polygon(Shape):
 
     @property
     def box(self):
+        if self.__box is None:
+            self.__box = Rectangle.from_shape(self)
         return self.__box
 
     @property
     def center(self):
+        if self.__center is None:
+            self.__center = Polygon.find_center(self.__vertices)
         return self.__center
 
+    @property
+    def coordinates(self):
+        if self.__coordinates is None:
+            coordinates = []
+            for vertex in self.__vertices:
+                coordinates += vertex.x, vertex.y
+            self.__coordinates = tuple(coordinates)
+        return self.__coordinates
+
+    @property
+    def axes(self):
+        if self.__axes is None:
+            self.__axes = Polygon.find_axes(self.edges)
+        return self.__axes
+
     @property
     def pygame(self):
         return [vertex.pygame for vertex in self.vertices]
@@ -379,15 +658,15 @@ class Rectangle(Shape):
 
     @staticmethod
     def from_shape(shape):
-        top, left = shape.center
-        bottom, right = shape.center
+        left, top = shape.center
+        right, bottom = shape.center
 
         for vertex in shape.vertices:
             top = min(top, vertex.y)
             left = min(left, vertex.x)
 
             bottom = max(bottom, vertex.y)
-            right = max(right, vertex.y)
+            right = max(right, vertex.x)
 
         return Rectangle(left, top, right, bottom)
 
@@ -414,7 +693,30 @@ class Rectangle(Shape):
         return Rectangle(left, top, right, bottom)
     # }}}1
 
+    # Serialization {{{1
+    formats = struct.Struct('<4d'), struct.Struct('<4f')
+
+    @staticmethod
+    def packed_size(single=False):
+        return Rectangle.formats[single].size
+
+    @staticmethod
+    def unpack(buffer, offset=0, single=False):
+        values = Rectangle.formats[single].unpack_from(buffer, offset)
+        return Rectangle(*values)
+
+    def pack(self, single=False):
+        return Rectangle.formats[single].pack(
+                self.__left, self.__top, self.__right, self.__bottom)
+    # }}}1
+
     # Operators {{{1
+    # The edges, vertices and center are built the first time they are asked
+    # for.  Building the edges is relatively expensive, since each one has to
+    # find its own normal.
+    __slots__ = ('__left', '__top', '__right', '__bottom',
+            '__edges', '__vertices', '__center')
+
     def __init__(self, left, top, right, bottom):
         self.__left = min(left, right)
         self.__top = min(top, bottom)
@@ -422,6 +724,14 @@ class Rectangle(Shape):
         self.__right = max(right, left)
         self.__bottom = max(bottom, top)
 
+        self.__edges = None
+        self.__vertices = None
+        self.__center = None
+
+    def __reduce__(self):
+        return Rectangle, (
+                self.__left, self.__top, self.__right, self.__bottom)
+
     def __eq__(self, other):
         return (type(self) == type(other) and
                 self.top == other.top and
@@ -492,24 +802,40 @@ class Rectangle(Shape):
 
     @property
     def edges(self):
-        return (self.top_edge, self.bottom_edge,
-                self.left_edge, self.right_edge)
+        if self.__edges is None:
+            self.__edges = (self.top_edge, self.bottom_edge,
+                    self.left_edge, self.right_edge)
+        return self.__edges
 
     @property
     def vertices(self):
-        return (self.top_left, self.top_right,
-                self.bottom_right, self.bottom_left)
+        if self.__vertices is None:
+            self.__vertices = (self.top_left, self.top_right,
+                    self.bottom_right, self.bottom_left)
+        return self.__vertices
 
     @property
     def center(self):
-        x = (self.left + self.right) / 2.0
-        y = (self.top + self.bottom) / 2.0
-        return Vector(x, y)
+        if self.__center is None:
+            x = (self.__left + self.__right) / 2.0
+            y = (self.__top + self.__bottom) / 2.0
+            self.__center = Vector(x, y)
+        return self.__center
 
     @property
     def box(self):
         return self
 
+    @property
+    def coordinates(self):
+        left, top = self.__left, self.__top
+        right, bottom = self.__right, self.__bottom
+        return left, top, right, top, right, bottom, left, bottom
+
+    @property
+    def axes(self):
+        return 1.0, 0.0, 0.0, 1.0
+
     @property
     def pygame(self):
         import pygame
@@ -544,6 +870,7 @@ if __name__ == "__main__":
     from pygame.locals import *
 
     from pprint import *
+    import pickle
 
     # Line Tests {{{1
     def line_tests():
@@ -600,6 +927,9 @@ if __name__ == "__main__":
         assert shrunk_circle == circle
         assert moved_circle == circle
 
+        assert pickle.loads(pickle.dumps(circle)) == circle
+        assert pickle.loads(pickle.dumps(circle)).get_box() == box
+
     # Shape Tests {{{1
     def polygon_tests():
         top_left = Vector(10, 10); top_right = Vector(20, 10)
@@ -615,6 +945,7 @@ if __name__ == "__main__":
             assert False    # Concave polygon created.
 
         polygon = Polygon(vertices)
+        trusted = Polygon.from_trusted_vertices(vertices)
 
         top = Vector(0, -1); bottom = Vector(0, 1)
         left = Vector(-1, 0); right = Vector(1, 0)
@@ -631,8 +962,12 @@ if __name__ == "__main__":
         assert polygon.get_box() == box
         assert polygon.get_center() == center
 
+        assert trusted.get_box() == box
+        assert trusted.get_center() == center
+
         for edge in edges:
             assert edge in polygon.edges
+            assert edge in trusted.edges
         for vertex in vertices:
             assert vertex in polygon.vertices
             assert vertex.pygame in polygon.pygame
@@ -683,6 +1018,125 @@ if __name__ == "__main__":
         assert golden == Rectangle(
                 left - 1, top - 1, right - 1, bottom - 1).move(Vector(1, 1))
 
+        # Rectangles and polygons with the same corners give the same flat
+        # coordinates.
+        polygon = Polygon([
+                Vector(left, top), Vector(right, top),
+                Vector(right, bottom), Vector(left, bottom) ])
+
+        assert type(golden.coordinates) is type(polygon.coordinates) is tuple
+        assert golden.coordinates == polygon.coordinates
+        assert hash(golden.coordinates) == hash(polygon.coordinates)
+
+    # Transform Tests {{{1
+    def transform_tests():
+        def close(A, B):
+            return (A - B).magnitude < 1e-9
+
+        def same(line, other):
+            if not close(line.facing, other.facing): return False
+            if close(line.head, other.head):
+                return close(line.tail, other.tail)
+            if close(line.head, other.tail):
+                return close(line.tail, other.head)
+            return False
+
+        def matches(lines, others):
+            for line in lines:
+                for other in others:
+                    if same(line, other): break
+                else:
+                    return False
+            return True
+
+        top_left = Vector(10, 10); top_right = Vector(30, 10)
+        bottom_left = Vector(10, 20); bottom_right = Vector(30, 20)
+
+        vertices = [top_left, top_right, bottom_right, bottom_left]
+        displacement = Vector(5, -5)
+
+        polygon = Polygon(vertices)
+        polygon.edges
+
+        # Moving a polygon should give the same shape as building one from
+        # moved vertices, whether or not its edges were already found.
+        golden = Polygon([vertex + displacement for vertex in vertices])
+
+        for original in polygon, Polygon(vertices):
+            moved = original.move(displacement)
+
+            assert moved.vertices == golden.vertices
+            assert moved.center == golden.center
+            assert moved.box == golden.box
+
+            for edge in golden.edges:
+                assert edge in moved.edges
+
+        # Rotating a polygon a quarter turn about its center should give the
+        # same shape turned on its side.
+        rotated = polygon.rotate(math.pi / 2)
+        golden = Polygon([
+                Vector(25, 5), Vector(25, 25),
+                Vector(15, 25), Vector(15, 5) ])
+
+        assert close(rotated.center, polygon.center)
+        assert matches(rotated.edges, golden.edges)
+
+        for edge in rotated.edges:
+            assert abs(Vector.dot(edge.normal, edge.direction)) < 1e-9
+
+        box = rotated.box
+        assert abs(box.left - 15) < 1e-9 and abs(box.right - 25) < 1e-9
+        assert abs(box.top - 5) < 1e-9 and abs(box.bottom - 25) < 1e-9
+
+        # Rectangles are turned into polygons when they're transformed.
+        rectangle = Rectangle.from_corners(top_left, bottom_right)
+        transformed = rectangle.transform(displacement, math.pi / 2)
+
+        assert isinstance(transformed, Polygon)
+        assert matches(transformed.edges, golden.move(displacement).edges)
+        assert close(transformed.center, rectangle.center + displacement)
+
+        # Bounding boxes of polygons should hug their vertices.
+        triangle = Polygon([Vector(0, 0), Vector(10, 0), Vector(0, 30)])
+        assert triangle.box == Rectangle(0, 0, 10, 30)
+
+    # Serialization Tests {{{1
+    def serialization_tests():
+        line = Line(Vector(1, 2), Vector(3, 4), Vector(0, 1))
+        bare_line = Line(Vector(1, 2), Vector(3, 4))
+        circle = Circle(Vector(1.5, 2.5), 3)
+        rectangle = Rectangle(1, 2, 3, 4)
+        polygon = Polygon([Vector(0, 0), Vector(4, 0), Vector(0, 3)])
+
+        for shape in line, circle, rectangle:
+            Shape = type(shape)
+            for single in False, True:
+                packed = shape.pack(single)
+                assert len(packed) == Shape.packed_size(single)
+                assert Shape.unpack(packed, single=single) == shape
+
+        copy = Line.unpack(bare_line.pack())
+        assert copy.points == bare_line.points
+        assert copy.pack() == bare_line.pack()
+
+        for single in False, True:
+            packed = polygon.pack(single)
+            copy = Polygon.unpack(packed, single=single)
+
+            assert len(packed) == Polygon.packed_size(3, single)
+            assert copy.vertices == polygon.vertices
+
+        # Records can be read straight out of a larger buffer.
+        buffer = memoryview(
+                circle.pack() + polygon.pack() + rectangle.pack())
+
+        offset = Circle.packed_size()
+        assert Circle.unpack(buffer) == circle
+        assert Polygon.unpack(buffer, offset).vertices == polygon.vertices
+
+        offset += Polygon.packed_size(3)
+        assert Rectangle.unpack(buffer[offset:]) == rectangle
     # }}}1
 
     print "Testing shapes.py..."
@@ -691,6 +1145,8 @@ if __name__ == "__main__":
     circle_tests()
     polygon_tests()
     rectangle_tests()
+    transform_tests()
+    serialization_tests()
 
     print "All tests passed."
 
@@ -0,0 +1,361 @@
+""" The shards module spreads a very large flock over several processes.  The
+map is cut into vertical strips, and each strip is simulated by its own worker
+process.  All of the flock's arrays live in shared memory, so the workers never
+have to send sprites to each other.  Instead, each worker reads the sprites
+near its strip (the ghosts) straight out of the arrays from the last tick, and
+writes the sprites it owns into a second copy of the arrays.  The two copies
+trade places after every tick, so nobody ever reads something that is being
+written.  The main process is left free for game rules, networking and
+drawing. """
+
+from __future__ import division
+
+import multiprocessing
+
+from vector import *
+from shapes import *
+from flocking import *
+
+class Shards(object):
+    """ A flock that is simulated by a pool of worker processes, one for each
+    strip of the map.  Members are added with the same arguments as
+    Flock.add(), but the capacity is fixed once the arrays are allocated.
+
+    Steering is done by the given function, which is called in each worker
+    with a Flock holding the members of that strip and the positions and
+    velocities of every sprite within the margin of it.  It should fill in
+    the acceleration array of the flock.  The margin must be at least as
+    large as the furthest the steering function looks, or sprites near the
+    edges of the strips won't see all of their neighbors.  The function has
+    to be picklable, so it must be defined at the top level of a module. """
+
+    # Constructor {{{1
+    def __init__(self, bounds, shards=None, capacity=4096, margin=0,
+            steering=None):
+        if numpy is None:
+            raise ImportError("Shards requires NumPy.")
+
+        self.bounds = bounds
+        self.shards = shards or multiprocessing.cpu_count()
+        self.capacity = capacity
+        self.margin = margin
+        self.steering = steering
+
+        self.count = 0
+        self.front = 0
+
+        self.buffers = Shards.allocate(capacity), Shards.allocate(capacity)
+        self.views = [Shards.arrays(buffer) for buffer in self.buffers]
+
+        self.workers = []
+        self.connections = []
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @staticmethod
+    def allocate(capacity):
+        """ Allocate one shared copy of every flock array. """
+        buffer = {}
+        for name in Flock.names:
+            width = 1 if name in Shards.scalars else 2
+            buffer[name] = multiprocessing.RawArray('d', capacity * width)
+        return buffer
+
+    @staticmethod
+    def arrays(buffer):
+        """ Wrap each shared array in a NumPy array without copying it. """
+        arrays = {}
+        for name, raw in buffer.items():
+            array = numpy.frombuffer(raw, dtype=numpy.float64)
+            if name not in Shards.scalars:
+                array = array.reshape(-1, 2)
+            arrays[name] = array
+        return arrays
+
+    scalars = 'radii', 'speeds', 'forces', 'travel'
+
+    # Members {{{1
+    def add(self, position, radius, force=0.0, speed=0.0, facing=None):
+        """ Add a member to the flock and return its index.  This should only
+        be called between updates. """
+
+        if self.count == self.capacity:
+            raise ValueError("Shards are full (%d members)." % self.capacity)
+
+        index = self.count
+        self.count += 1
+
+        if facing is None or facing == Vector.null():
+            facing = Vector.random()
+
+        arrays = self.views[self.front]
+
+        arrays['positions'][index] = position.x, position.y
+        arrays['velocities'][index] = 0, 0
+        arrays['accelerations'][index] = 0, 0
+        arrays['facings'][index] = facing.normal.x, facing.normal.y
+
+        arrays['radii'][index] = radius
+        arrays['speeds'][index] = speed
+        arrays['forces'][index] = force
+        arrays['travel'][index] = 0
+
+        return index
+
+    # Workers {{{1
+    def start(self):
+        if self.workers:
+            raise RuntimeError("The shards have already been started.")
+
+        for shard in range(self.shards):
+            parent, child = multiprocessing.Pipe()
+            arguments = child, self.buffers, self.bounds, shard, \
+                    self.shards, self.margin, self.steering
+
+            worker = multiprocessing.Process(
+                    target=Shards.serve, args=arguments)
+            worker.daemon = True
+            worker.start()
+
+            self.workers.append(worker)
+            self.connections.append(parent)
+
+    def stop(self):
+        for connection in self.connections:
+            connection.send(None)
+
+        for worker in self.workers:
+            worker.join()
+
+        self.workers = []
+        self.connections = []
+
+    def update(self, time):
+        """ Advance every member by the given time.  Each worker simulates its
+        own strip, and this waits until all of them are done.  Returns how
+        many members each worker owned. """
+
+        if not self.workers:
+            raise RuntimeError("The shards have to be started first.")
+
+        message = time, self.front, self.count
+
+        for connection in self.connections:
+            connection.send(message)
+
+        owned = [connection.recv() for connection in self.connections]
+
+        self.front = 1 - self.front
+        return owned
+
+    @staticmethod
+    def serve(connection, buffers, bounds, shard, shards, margin, steering):
+        """ The main loop of a worker process.  It waits to be told to take a
+        step, and stops when it is sent None. """
+
+        views = [Shards.arrays(buffer) for buffer in buffers]
+
+        while True:
+            message = connection.recv()
+            if message is None: break
+
+            time, front, count = message
+            read, write = views[front], views[1 - front]
+
+            owned = Shards.step(read, write, count, time, bounds, shard,
+                    shards, margin, steering)
+
+            connection.send(owned)
+
+    @staticmethod
+    def step(read, write, count, time, bounds, shard, shards, margin,
+            steering):
+        """ Simulate the members of one strip for a single tick.  This is
+        where the work of each worker is done. """
+
+        x = read['positions'][:count, 0]
+        left, right = Shards.strip(bounds, shard, shards)
+
+        owned = numpy.flatnonzero(Shards.owners(x, bounds, shards) == shard)
+        nearby = (x >= left - margin) & (x <= right + margin)
+        nearby = numpy.flatnonzero(nearby)
+
+        # Copy the members of this strip into a regular flock, so that they
+        # move exactly like the members of any other flock would.
+        flock = Flock(capacity=1)
+        flock.count = len(owned)
+
+        for name in Flock.names:
+            setattr(flock, name, read[name][owned])
+
+        flock.accelerations[:] = 0
+
+        if steering is not None:
+            positions = read['positions'][nearby]
+            velocities = read['velocities'][nearby]
+            steering(flock, positions, velocities)
+
+        flock.update(time)
+        flock.bounce(time, bounds)
+
+        for name in Flock.names:
+            write[name][owned] = getattr(flock, name)
+
+        return len(owned)
+
+    @staticmethod
+    def owners(x, bounds, shards):
+        """ Return which strip each of the given x coordinates falls in.
+        Sprites that have wandered off the map belong to the nearest strip. """
+        strips = (x - bounds.left) * (shards / bounds.width)
+        return numpy.clip(strips.astype(int), 0, shards - 1)
+
+    @staticmethod
+    def strip(bounds, shard, shards):
+        width = bounds.width / shards
+        return bounds.left + shard * width, bounds.left + (shard + 1) * width
+
+    # Attributes {{{1
+    def get_positions(self):
+        return self.views[self.front]['positions'][:self.count]
+
+    def get_velocities(self):
+        return self.views[self.front]['velocities'][:self.count]
+
+    def get_facings(self):
+        return self.views[self.front]['facings'][:self.count]
+
+    def get_radii(self):
+        return self.views[self.front]['radii'][:self.count]
+
+    def get_travel(self):
+        return self.views[self.front]['travel'][:self.count]
+
+    def get_position(self, index):
+        return Vector(*self.get_positions()[index])
+    # }}}1
+
+class Separate(object):
+    """ A steering function for shards that pushes each member away from
+    every sprite within the given radius, more strongly from the closer ones,
+    with no more than the given weight of its force. """
+
+    # Separate {{{1
+    def __init__(self, radius, weight=1.0):
+        self.radius = radius
+        self.weight = weight
+
+    def __call__(self, flock, positions, velocities):
+        count = flock.count
+        if not count or not len(positions):
+            return
+
+        mine = flock.positions[:count]
+
+        offsets = mine[:, numpy.newaxis, :] - positions[numpy.newaxis, :, :]
+        distances = (offsets * offsets).sum(axis=2)
+
+        # Ignore sprites that are too far away, and each member itself.
+        close = (distances > 0) & (distances <= self.radius * self.radius)
+        scale = numpy.where(close, 1 / numpy.where(close, distances, 1), 0)
+        push = (offsets * scale[:, :, numpy.newaxis]).sum(axis=1)
+
+        magnitude = Flock.magnitudes(push)[:, numpy.newaxis]
+        limit = self.weight * flock.forces[:count, numpy.newaxis]
+
+        flock.accelerations[:count] = numpy.where(magnitude > 0,
+                limit * push / numpy.where(magnitude > 0, magnitude, 1), 0)
+    # }}}1
+
+if __name__ == "__main__":
+
+    # Shard Tests {{{1
+    def shard_tests():
+        """ Make sure that a flock split between several processes follows
+        the same paths as a flock that is simulated all in one piece. """
+
+        import random; random.seed(0)
+
+        bounds = Rectangle.from_size(400, 200)
+        steering = Separate(15)
+
+        shards = Shards(bounds, shards=3, capacity=300, margin=15,
+                steering=steering)
+        reference = Shards(bounds, shards=1, capacity=300, margin=15,
+                steering=steering)
+
+        for index in range(300):
+            position = Vector(random.uniform(0, 400), random.uniform(0, 200))
+            facing = Vector.random()
+
+            shards.add(position, 5, force=100, speed=50, facing=facing)
+            reference.add(position, 5, force=100, speed=50, facing=facing)
+
+        try: shards.add(Vector(0, 0), 5)
+        except ValueError: pass
+        else: raise AssertionError
+
+        # Nothing moves until the workers are running.
+        before = shards.get_positions().copy()
+
+        try: shards.update(0.05)
+        except RuntimeError: pass
+        else: raise AssertionError
+
+        assert (shards.get_positions() == before).all()
+
+        # Step the reference in this process, without any workers.
+        def step(reference, time):
+            front = reference.views[reference.front]
+            back = reference.views[1 - reference.front]
+            Shards.step(front, back, reference.count, time, bounds, 0, 1,
+                    reference.margin, reference.steering)
+            reference.front = 1 - reference.front
+
+        with shards:
+            try: shards.start()
+            except RuntimeError: pass
+            else: raise AssertionError
+
+            assert len(shards.workers) == 3
+
+            for tick in range(40):
+                owned = shards.update(0.05)
+                step(reference, 0.05)
+
+                # Every member belongs to exactly one strip.
+                assert sum(owned) == 300
+
+        assert len(shards) == 300
+        assert not shards.workers
+
+        error = numpy.abs(shards.get_positions() - reference.get_positions())
+        assert error.max() < 1e-6
+
+        error = numpy.abs(shards.get_velocities() - reference.get_velocities())
+        assert error.max() < 1e-6
+
+        # The members actually moved apart, and they stayed on the map.
+        assert shards.get_travel().min() > 0
+
+        x, y = shards.get_positions().T
+        assert (x > -10).all() and (x < 410).all()
+        assert (y > -10).all() and (y < 210).all()
+    # }}}1
+
+    print "Testing shards.py..."
+
+    if numpy is None:
+        print "NumPy is not installed, skipping the shard tests."
+    else:
+        shard_tests()
+
+    print "All tests passed."
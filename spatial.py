@@ -0,0 +1,950 @@
+""" The spatial module provides indices that can quickly find the shapes in a
+particular region of the map.  None of these indices decide whether or not two
+shapes are actually touching.  Instead, they return a short list of candidates
+that should then be checked using the functions in the collisions module. """
+
+from __future__ import division
+
+import math
+import heapq
+
+import kernels
+
+from vector import *
+from shapes import *
+from collisions import *
+
+class BoundingVolumeHierarchy(object):
+    """ Organizes a fixed set of shapes into a tree of nested bounding boxes.
+    This is meant for static obstacles like walls, which are added once when a
+    map is created.  Queries only descend into the branches whose boxes touch
+    the query, so they take logarithmic time in the number of shapes.  Any
+    shape with a box attribute can be indexed. """
+
+    class Node(object):
+        """ A single branch of the hierarchy.  Leaves hold a few shapes and
+        internal nodes hold exactly two children. """
+
+        __slots__ = ('box', 'children', 'shapes')
+
+        def __init__(self, box, children=(), shapes=()):
+            self.box = box
+            self.children = children
+            self.shapes = shapes
+
+    # Constructor {{{1
+    def __init__(self, shapes, leaf_size=4):
+        self.leaf_size = leaf_size
+        self.shapes = list(shapes)
+
+        boxes = [(shape.box, shape) for shape in self.shapes]
+        self.root = self.build(boxes) if boxes else None
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __iter__(self):
+        return iter(self.shapes)
+
+    def build(self, boxes):
+        """ Recursively build a node for the given list of (box, shape) pairs.
+        The pairs are split at the median of the longer side of their combined
+        bounding box, which keeps the tree balanced. """
+
+        left = min(box.left for box, shape in boxes)
+        top = min(box.top for box, shape in boxes)
+        right = max(box.right for box, shape in boxes)
+        bottom = max(box.bottom for box, shape in boxes)
+
+        bounds = Rectangle(left, top, right, bottom)
+
+        if len(boxes) <= self.leaf_size:
+            shapes = tuple(shape for box, shape in boxes)
+            return BoundingVolumeHierarchy.Node(bounds, shapes=shapes)
+
+        if bounds.width >= bounds.height:
+            key = lambda pair: pair[0].left + pair[0].right
+        else:
+            key = lambda pair: pair[0].top + pair[0].bottom
+
+        boxes.sort(key=key)
+        middle = len(boxes) // 2
+
+        children = self.build(boxes[:middle]), self.build(boxes[middle:])
+        return BoundingVolumeHierarchy.Node(bounds, children=children)
+
+    # Queries {{{1
+    def query(self, touching):
+        """ Return every shape whose box passes the given test.  The test is
+        also used to prune whole branches, so it has to be a test that any
+        box enclosing a passing box would also pass. """
+
+        candidates = []
+        if self.root is None:
+            return candidates
+
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if not touching(node.box):
+                continue
+
+            if node.children:
+                stack.extend(node.children)
+            else:
+                candidates.extend(
+                        shape for shape in node.shapes if touching(shape.box))
+
+        return candidates
+
+    def query_rect(self, rectangle):
+        """ Return the shapes whose boxes touch the given rectangle. """
+        boxes_touching = Collisions.boxes_touching
+        return self.query(lambda box: boxes_touching(rectangle, box))
+
+    def query_circle(self, circle):
+        """ Return the shapes whose boxes touch the given circle. """
+        circle_touching_box = Collisions.circle_touching_box
+        return self.query(lambda box: circle_touching_box(circle, box))
+
+    def query_line(self, line):
+        """ Return the shapes whose boxes are crossed by the given line. """
+        line_touching_box = Collisions.line_touching_box
+        return self.query(lambda box: line_touching_box(line, box))
+
+    def query_shape(self, shape):
+        """ Return the shapes whose boxes touch the given line, circle or
+        polygon.  Polygons are tested using their bounding boxes. """
+
+        if isinstance(shape, Circle): return self.query_circle(shape)
+        if isinstance(shape, Line): return self.query_line(shape)
+        return self.query_rect(shape.box)
+    # }}}1
+
+class SpatialHash(object):
+    """ Sorts moving sprites into the cells of a uniform grid based on the
+    centers of their circles.  Finding every pair of sprites that might be
+    touching only requires looking at neighboring cells, so it takes time
+    proportional to the number of sprites plus the number of pairs.  The grid
+    covers the given bounds, but sprites that wander outside of them are
+    still handled correctly.  Any object with get_position() and get_radius()
+    methods can be indexed. """
+
+    # Constructor {{{1
+    def __init__(self, bounds, cell_size=None):
+        self.bounds = bounds
+        self.cell_size = cell_size or max(bounds.width, bounds.height) / 16
+
+        self.cells = {}
+        self.locations = {}
+        self.max_radius = 0
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __iter__(self):
+        return iter(self.locations)
+
+    def __contains__(self, sprite):
+        return sprite in self.locations
+
+    # Updates {{{1
+    def locate(self, position):
+        """ Return the key of the cell containing the given position. """
+        x = (position.x - self.bounds.left) // self.cell_size
+        y = (position.y - self.bounds.top) // self.cell_size
+        return int(x), int(y)
+
+    def insert(self, sprite):
+        key = self.locate(sprite.get_position())
+
+        self.cells.setdefault(key, []).append(sprite)
+        self.locations[sprite] = key
+        self.max_radius = max(self.max_radius, sprite.get_radius())
+
+    def remove(self, sprite):
+        key = self.locations.pop(sprite)
+        cell = self.cells[key]
+
+        cell.remove(sprite)
+        if not cell: del self.cells[key]
+
+    def update(self, sprite):
+        """ Move the given sprite into the right cell, if it's changed cells
+        since it was last inserted or updated. """
+
+        key = self.locate(sprite.get_position())
+        if key == self.locations[sprite]:
+            return
+
+        self.remove(sprite)
+        self.cells.setdefault(key, []).append(sprite)
+        self.locations[sprite] = key
+
+    def update_all(self):
+        for sprite in self.locations.keys():
+            self.update(sprite)
+
+    # Queries {{{1
+    def reach(self, distance):
+        """ Return how many cells away from a sprite another sprite could be
+        if the two are within the given distance of each other. """
+        return int(math.ceil(distance / self.cell_size)) or 1
+
+    def pairs(self):
+        """ Return every pair of sprites that are in the same or neighboring
+        cells.  These are only candidates; use touching() to find the pairs
+        that are actually touching.  The neighbors are only looked for in one
+        direction, so each pair is only reported once. """
+
+        reach = self.reach(2 * self.max_radius)
+        offsets = [(dx, dy) for dx in range(0, reach + 1)
+                            for dy in range(-reach, reach + 1)
+                            if dx > 0 or dy > 0]
+
+        cells = self.cells
+        pairs = []
+
+        for (x, y), cell in cells.items():
+            for index, first in enumerate(cell):
+                for second in cell[index + 1:]:
+                    pairs.append((first, second))
+
+            for dx, dy in offsets:
+                neighbor = cells.get((x + dx, y + dy))
+                if neighbor is None: continue
+
+                for first in cell:
+                    for second in neighbor:
+                        pairs.append((first, second))
+
+        return pairs
+
+    def touching(self):
+        """ Return every pair of sprites whose circles are touching. """
+        circles_touching = Collisions.circles_touching
+        return [(first, second) for first, second in self.pairs()
+                if circles_touching(first.get_circle(), second.get_circle())]
+
+    def query_radius(self, center, radius):
+        """ Return every sprite whose circle comes within the given radius of
+        the given point. """
+
+        reach = radius + self.max_radius
+        left, top = self.locate(center - Vector(reach, reach))
+        right, bottom = self.locate(center + Vector(reach, reach))
+
+        nearby = []
+        for x in range(left, right + 1):
+            for y in range(top, bottom + 1):
+                for sprite in self.cells.get((x, y), ()):
+                    distance = radius + sprite.get_radius()
+                    offset = sprite.get_position() - center
+                    if offset.magnitude_squared <= distance * distance:
+                        nearby.append(sprite)
+
+        return nearby
+    # }}}1
+
+class LooseQuadtree(object):
+    """ Sorts moving sprites into a tree of square cells that are split into
+    quarters as they get smaller.  Each sprite is stored in the smallest cell
+    that contains its center and is at least twice as big as its radius.  The
+    cells are "loose", meaning that each one is treated as covering half of
+    its size past each of its edges.  That way every sprite fits entirely
+    inside its cell, so a sprite only has to move when its center leaves its
+    cell, and queries only have to visit the cells whose loose boxes touch
+    them.  Sprites outside of the bounds are kept in the root.  Any object
+    with get_position() and get_radius() methods can be indexed. """
+
+    class Node(object):
+        """ A single cell of the tree.  The children are only created once a
+        sprite small enough to fit in one of them is inserted.  Each cell
+        counts the sprites below it, so that empty branches can be skipped.
+        """
+
+        __slots__ = ('left', 'top', 'size', 'parent', 'children', 'sprites',
+                'count')
+
+        def __init__(self, left, top, size, parent=None):
+            self.left = left
+            self.top = top
+            self.size = size
+            self.parent = parent
+            self.children = None
+            self.sprites = []
+            self.count = 0
+
+        def add(self, sprite):
+            self.sprites.append(sprite)
+            node = self
+            while node is not None:
+                node.count += 1
+                node = node.parent
+
+        def discard(self, sprite):
+            self.sprites.remove(sprite)
+            node = self
+            while node is not None:
+                node.count -= 1
+                node = node.parent
+
+        def touching(self, left, top, right, bottom):
+            """ Return true if the loose box of this cell touches the given
+            box. """
+            size = self.size; half = size / 2
+            return not (self.left - half > right or
+                        self.top - half > bottom or
+                        self.left + size + half < left or
+                        self.top + size + half < top)
+
+        def distance(self, x, y):
+            """ Return the squared distance from the given point to the
+            closest point in this cell.  Every sprite in the cell has its
+            center somewhere inside, so this is a lower bound on how far away
+            any of them can be. """
+
+            left, top, size = self.left, self.top, self.size
+            dx = max(left - x, 0, x - left - size)
+            dy = max(top - y, 0, y - top - size)
+            return dx * dx + dy * dy
+
+    # Constructor {{{1
+    def __init__(self, bounds, max_depth=6):
+        size = max(bounds.width, bounds.height)
+
+        self.root = LooseQuadtree.Node(bounds.left, bounds.top, size)
+        self.max_depth = max_depth
+        self.locations = {}
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __iter__(self):
+        return (sprite for node, sprite in self.locations.values())
+
+    def __contains__(self, sprite):
+        return id(sprite) in self.locations
+
+    # Updates {{{1
+    def locate(self, sprite):
+        """ Return the cell that the given sprite belongs in, creating it if
+        necessary. """
+
+        x, y = sprite.get_position()
+        radius = sprite.get_radius()
+        node = self.root
+
+        if not (node.left <= x <= node.left + node.size and
+                node.top <= y <= node.top + node.size):
+            return node
+
+        for depth in range(self.max_depth):
+            half = node.size / 2
+            if radius > half / 2:
+                break
+
+            if node.children is None:
+                Node = LooseQuadtree.Node
+                left, top = node.left, node.top
+                node.children = (
+                        Node(left, top, half, node),
+                        Node(left + half, top, half, node),
+                        Node(left, top + half, half, node),
+                        Node(left + half, top + half, half, node))
+
+            column = 1 if x >= node.left + half else 0
+            row = 2 if y >= node.top + half else 0
+            node = node.children[row + column]
+
+        return node
+
+    def insert(self, sprite):
+        node = self.locate(sprite)
+        node.add(sprite)
+        self.locations[id(sprite)] = node, sprite
+
+    def remove(self, sprite):
+        node, sprite = self.locations.pop(id(sprite))
+        node.discard(sprite)
+
+    def update(self, sprite):
+        """ Move the given sprite into the right cell, if it's left the cell
+        it was in. """
+
+        node, sprite = self.locations[id(sprite)]
+        target = self.locate(sprite)
+
+        if target is not node:
+            node.discard(sprite)
+            target.add(sprite)
+            self.locations[id(sprite)] = target, sprite
+
+    def update_all(self):
+        for node, sprite in self.locations.values():
+            self.update(sprite)
+
+    # Queries {{{1
+    def query(self, left, top, right, bottom):
+        """ Return every sprite in a cell whose loose box touches the given
+        box.  These are only candidates, and still need to be checked. """
+
+        candidates = list(self.root.sprites)
+        stack = list(self.root.children or ())
+
+        while stack:
+            node = stack.pop()
+            if not node.count or not node.touching(left, top, right, bottom):
+                continue
+
+            candidates.extend(node.sprites)
+            if node.children is not None:
+                stack.extend(node.children)
+
+        return candidates
+
+    def query_rect(self, rectangle):
+        """ Return every sprite whose circle touches the given rectangle. """
+
+        circle_touching_box = kernels.circle_touching_box
+        left, top = rectangle.left, rectangle.top
+        right, bottom = rectangle.right, rectangle.bottom
+
+        touching = []
+        for sprite in self.query(left, top, right, bottom):
+            x, y = sprite.get_position()
+            if circle_touching_box(x, y, sprite.get_radius(),
+                    left, top, right, bottom):
+                touching.append(sprite)
+
+        return touching
+
+    def query_radius(self, center, radius):
+        """ Return every sprite whose circle comes within the given radius of
+        the given point. """
+
+        x, y = center
+        circles_nearby = kernels.circles_nearby
+
+        nearby = []
+        for sprite in self.query(x - radius, y - radius,
+                x + radius, y + radius):
+            sx, sy = sprite.get_position()
+            if circles_nearby(x, y, radius, sx, sy, sprite.get_radius(), 0):
+                nearby.append(sprite)
+
+        return nearby
+
+    def nearest(self, center, k=1):
+        """ Return the k sprites whose centers are closest to the given point,
+        closest first.  Cells are visited in order of how close they could
+        possibly be, so the search stops as soon as the closest remaining cell
+        is further away than the kth sprite found so far. """
+
+        x, y = center
+        heap = [(0, 0, self.root)]
+        nearest = []
+        counter = 1
+
+        while heap and len(nearest) < k:
+            distance, index, item = heapq.heappop(heap)
+
+            if not isinstance(item, LooseQuadtree.Node):
+                nearest.append(item)
+                continue
+
+            for sprite in item.sprites:
+                sx, sy = sprite.get_position()
+                distance = (sx - x) * (sx - x) + (sy - y) * (sy - y)
+                heapq.heappush(heap, (distance, counter, sprite))
+                counter += 1
+
+            for child in item.children or ():
+                if child.count:
+                    distance = child.distance(x, y)
+                    heapq.heappush(heap, (distance, counter, child))
+                    counter += 1
+
+        return nearest
+    # }}}1
+
+class SweepAndPrune(object):
+    """ Keeps moving sprites sorted by the left edges of their bounding boxes,
+    so that every pair of overlapping boxes can be found by sweeping once
+    across the list.  The list is re-sorted with an insertion sort, which is
+    nearly linear when sprites only move a little between frames.  Unlike the
+    spatial hash, this doesn't care how the sprites are clustered.
+
+    Each box covers the sprite's circle both where it was at the previous
+    update and where it is now, so sprites that pass right through each other
+    during a frame are still reported.  Any object with get_position() and
+    get_radius() methods can be indexed. """
+
+    # Constructor {{{1
+    def __init__(self, vertical=False):
+        # Sprites can be swept from top to bottom instead, which is better
+        # for maps that are taller than they are wide.
+        self.vertical = vertical
+
+        self.entries = []
+        self.previous = {}
+        self.overlaps = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return (sprite for box, sprite in self.entries)
+
+    def __contains__(self, sprite):
+        return id(sprite) in self.previous
+
+    # Updates {{{1
+    def locate(self, sprite):
+        """ Return the position of the given sprite, with the coordinates
+        swapped if the sweep is vertical. """
+
+        x, y = sprite.get_position()
+        return (y, x) if self.vertical else (x, y)
+
+    def insert(self, sprite):
+        self.previous[id(sprite)] = self.locate(sprite)
+        self.entries.append((None, sprite))
+
+    def remove(self, sprite):
+        del self.previous[id(sprite)]
+        self.entries = [(box, other) for box, other in self.entries
+                if other is not sprite]
+
+        for key, pair in self.overlaps.items():
+            if sprite in pair:
+                del self.overlaps[key]
+
+    def update(self):
+        """ Re-sort the sprites and sweep across them.  Return a list of the
+        pairs that started to overlap and a list of the pairs that stopped
+        overlapping since the last update.  Overlapping boxes only mean that
+        the sprites might be touching; check the pairs with the functions in
+        the collisions module to be sure. """
+
+        previous = self.previous
+        entries = []
+
+        # Find the box around each sprite's path since the last update.
+        for box, sprite in self.entries:
+            radius = sprite.get_radius()
+            x, y = self.locate(sprite)
+            px, py = previous[id(sprite)]
+
+            box = (min(x, px) - radius, max(x, px) + radius,
+                    min(y, py) - radius, max(y, py) + radius)
+
+            previous[id(sprite)] = x, y
+            entries.append((box, sprite))
+
+        # Insertion sort on the low edge of each box.
+        for index in range(1, len(entries)):
+            entry = entries[index]
+            low = entry[0][0]
+
+            while index > 0 and entries[index - 1][0][0] > low:
+                entries[index] = entries[index - 1]
+                index -= 1
+
+            entries[index] = entry
+
+        self.entries = entries
+
+        # Sweep across the boxes.  Each box only has to be compared with the
+        # ones that start before it ends.
+        overlaps = {}
+
+        for index, (box, first) in enumerate(entries):
+            low, high, top, bottom = box
+
+            for other, second in entries[index + 1:]:
+                if other[0] > high:
+                    break
+                if other[2] > bottom or other[3] < top:
+                    continue
+
+                key = id(first), id(second)
+                if key[0] > key[1]:
+                    key = key[1], key[0]
+                overlaps[key] = first, second
+
+        begun = [pair for key, pair in overlaps.items()
+                if key not in self.overlaps]
+        ended = [pair for key, pair in self.overlaps.items()
+                if key not in overlaps]
+
+        self.overlaps = overlaps
+        return begun, ended
+
+    # Queries {{{1
+    def pairs(self):
+        """ Return every pair of sprites whose boxes overlapped at the last
+        update. """
+        return self.overlaps.values()
+
+    def overlapping(self, first, second):
+        """ Return true if the boxes of the two given sprites overlapped at
+        the last update. """
+
+        key = id(first), id(second)
+        if key[0] > key[1]:
+            key = key[1], key[0]
+        return key in self.overlaps
+
+    def touching(self):
+        """ Return every pair of sprites whose circles are touching. """
+        circles_touching = Collisions.circles_touching
+        return [(first, second) for first, second in self.pairs()
+                if circles_touching(first.get_circle(), second.get_circle())]
+    # }}}1
+
+if __name__ == "__main__":
+
+    # Hierarchy Tests {{{1
+    def hierarchy_tests():
+        """ Make sure that the hierarchy finds exactly the same candidates as
+        testing every box individually. """
+
+        obstacles = []
+        for x in range(0, 200, 20):
+            for y in range(0, 200, 20):
+                if (x + y) % 40:
+                    obstacles.append(Rectangle(x, y, x + 10, y + 10))
+                else:
+                    obstacles.append(Circle(Vector(x + 5, y + 5), 5))
+
+        hierarchy = BoundingVolumeHierarchy(obstacles)
+        assert len(hierarchy) == len(obstacles)
+
+        queries = [
+                Circle(Vector(50, 50), 12),
+                Circle(Vector(-50, -50), 10),
+                Rectangle(33, 0, 47, 200),
+                Line(Vector(0, 0), Vector(200, 190)),
+                Line(Vector(15, 0), Vector(15, 200)),
+                Polygon([Vector(60, 60), Vector(90, 60), Vector(60, 90)]) ]
+
+        touching = Collisions.shapes_touching
+        circle_touching_box = Collisions.circle_touching_box
+        line_touching_box = Collisions.line_touching_box
+
+        for query in queries:
+            candidates = hierarchy.query_shape(query)
+
+            if isinstance(query, Circle):
+                test = lambda box: circle_touching_box(query, box)
+            elif isinstance(query, Line):
+                test = lambda box: line_touching_box(query, box)
+            else:
+                test = lambda box: touching(query.box, box)
+
+            expected = [shape for shape in obstacles if test(shape.box)]
+
+            assert len(candidates) == len(expected)
+            for shape in expected:
+                assert shape in candidates
+
+        # Every obstacle that really touches a query has to be a candidate.
+        circle = queries[0]
+        for shape in obstacles:
+            if isinstance(shape, Circle):
+                really = Collisions.circles_touching(circle, shape)
+            else:
+                really = Collisions.circle_touching_shape(circle, shape)
+
+            if really:
+                assert shape in hierarchy.query_circle(circle)
+
+        assert BoundingVolumeHierarchy([]).query_rect(queries[2]) == []
+
+    # Grid Tests {{{1
+    def grid_tests():
+        """ Make sure that the grid finds the same touching pairs as testing
+        every pair of sprites, even after the sprites move around. """
+
+        from flocking import Sprite
+
+        bounds = Rectangle.from_size(200, 200)
+        grid = SpatialHash(bounds, 10)
+        sprites = []
+
+        for index in range(60):
+            sprite = Sprite()
+            position = Vector(index * 37 % 210 - 5, index * 53 % 190)
+            sprite.setup(position, 2 + index % 7)
+
+            sprites.append(sprite)
+            grid.insert(sprite)
+
+        def brute_force():
+            touching = set()
+            for index, first in enumerate(sprites):
+                for second in sprites[index + 1:]:
+                    if Collisions.circles_touching(
+                            first.get_circle(), second.get_circle()):
+                        touching.add(frozenset((first, second)))
+            return touching
+
+        def indexed():
+            pairs = [frozenset(pair) for pair in grid.touching()]
+            assert len(pairs) == len(set(pairs))
+            return set(pairs)
+
+        assert len(grid) == len(sprites)
+        assert indexed() == brute_force()
+
+        for step in range(5):
+            for index, sprite in enumerate(sprites):
+                offset = Vector(index % 5 - 2, index % 3 - 1) * 7
+                sprite.set_position(sprite.get_position() + offset)
+                grid.update(sprite)
+
+            assert indexed() == brute_force()
+
+        removed = sprites.pop()
+        grid.remove(removed)
+
+        assert removed not in grid
+        assert indexed() == brute_force()
+
+        center = Vector(100, 100); radius = 30
+        nearby = grid.query_radius(center, radius)
+
+        for sprite in sprites:
+            touching = Collisions.circles_touching(
+                    Circle(center, radius), sprite.get_circle())
+            assert (sprite in nearby) == touching
+
+    # Quadtree Tests {{{1
+    def quadtree_tests():
+        """ Make sure that the quadtree answers every query the same way as
+        checking every sprite, even as the sprites move around. """
+
+        from flocking import Sprite
+
+        bounds = Rectangle.from_size(200, 100)
+        quadtree = LooseQuadtree(bounds)
+        sprites = []
+
+        for index in range(80):
+            sprite = Sprite()
+            position = Vector(index * 37 % 200, index * 53 % 100)
+            sprite.setup(position, [1, 2, 5, 30][index % 4])
+            quadtree.insert(sprite)
+            sprites.append(sprite)
+
+        # Some sprites wander off of the map.
+        sprites[0].set_position(Vector(-50, 40))
+        sprites[1].set_position(Vector(150, 500))
+
+        assert len(quadtree) == len(sprites)
+        assert set(map(id, quadtree)) == set(map(id, sprites))
+
+        def ids(sprites):
+            return sorted(map(id, sprites))
+
+        for step in range(6):
+            quadtree.update_all()
+
+            for x, y in (0, 0), (100, 50), (190, 90), (-40, 40), (150, 480):
+                center = Vector(x, y)
+
+                rectangle = Rectangle.from_center(center, 30, 20)
+                expected = [sprite for sprite in sprites if
+                        Collisions.circle_touching_box(
+                            sprite.get_circle(), rectangle)]
+                assert ids(quadtree.query_rect(rectangle)) == ids(expected)
+
+                expected = [sprite for sprite in sprites if
+                        Collisions.circles_touching(
+                            Circle(center, 15), sprite.get_circle())]
+                assert ids(quadtree.query_radius(center, 15)) == ids(expected)
+
+                distance = lambda sprite: \
+                        (sprite.get_position() - center).magnitude_squared
+                expected = sorted(map(distance, sprites))[:5]
+                nearest = quadtree.nearest(center, 5)
+                assert map(distance, nearest) == expected
+
+            for index, sprite in enumerate(sprites):
+                offset = Vector(index % 5 - 2, (index + step) % 3 - 1) * 9
+                sprite.set_position(sprite.get_position() + offset)
+
+        assert len(quadtree.nearest(Vector(0, 0), 1000)) == len(sprites)
+
+        removed = sprites.pop()
+        quadtree.remove(removed)
+
+        assert removed not in quadtree
+        assert removed not in quadtree.query_radius(
+                removed.get_position(), 1)
+
+    # Ray Tests {{{1
+    def ray_tests():
+        """ Make sure that casting rays through a hierarchy gives the same
+        results as casting them against every obstacle. """
+
+        obstacles = []
+        for x in range(0, 200, 20):
+            for y in range(0, 200, 20):
+                if (x + y) % 60 == 0:
+                    obstacles.append(Circle(Vector(x + 5, y + 5), 5))
+                elif (x + y) % 60 == 20:
+                    obstacles.append(Line(Vector(x, y), Vector(x + 10, y + 5)))
+                else:
+                    obstacles.append(Polygon.from_regular(
+                        Vector(x + 5, y + 5), 5, 3 + x // 20 % 4))
+
+        hierarchy = BoundingVolumeHierarchy(obstacles)
+        rays = [Line.from_direction(
+                    Vector(index % 13, index % 7) * 15 + Vector(1, 2),
+                    Vector.from_radians(index) * 80) for index in range(200)]
+
+        expected = Collisions.ray_casts(rays, obstacles)
+        results = Collisions.ray_casts(rays, hierarchy)
+
+        assert any(result is None for result in results)
+        assert any(result is not None for result in results)
+
+        for result, answer in zip(results, expected):
+            if answer is None:
+                assert result is None
+            else:
+                assert abs(result[0] - answer[0]) < 1e-9
+                assert result[1] is answer[1]
+
+    # Sweep Tests {{{1
+    def sweep_tests():
+        """ Make sure that sweep and prune finds every pair of overlapping
+        boxes, and that it reports pairs as they start and stop overlapping.
+        """
+
+        from flocking import Sprite
+
+        def boxes(sprites, starts):
+            boxes = []
+            for sprite, start in zip(sprites, starts):
+                path = Rectangle.from_corners(start, sprite.get_position())
+                boxes.append(path.grow(sprite.get_radius()))
+            return boxes
+
+        def brute_force(sprites, starts):
+            overlapping = set()
+            paths = boxes(sprites, starts)
+
+            for index, first in enumerate(sprites):
+                for other, second in zip(paths, sprites)[index + 1:]:
+                    if Collisions.boxes_touching(paths[index], other):
+                        overlapping.add(frozenset((first, second)))
+
+            return overlapping
+
+        for vertical in False, True:
+            sweep = SweepAndPrune(vertical)
+            sprites = []
+
+            for index in range(60):
+                sprite = Sprite()
+                position = Vector(index * 37 % 200, index * 53 % 200)
+                sprite.setup(position, 3 + index % 4)
+                sweep.insert(sprite)
+                sprites.append(sprite)
+
+            assert len(sweep) == len(sprites)
+            assert sprites[0] in sweep
+
+            previous = set()
+
+            for step in range(10):
+                starts = [sprite.get_position() for sprite in sprites]
+
+                for index, sprite in enumerate(sprites):
+                    offset = Vector(index % 5 - 2, (index + step) % 3 - 1)
+                    sprite.set_position(sprite.get_position() + 4 * offset)
+
+                begun, ended = sweep.update()
+                expected = brute_force(sprites, starts)
+
+                pairs = set(frozenset(pair) for pair in sweep.pairs())
+                assert pairs == expected
+
+                assert set(frozenset(pair) for pair in begun) == \
+                        expected - previous
+                assert set(frozenset(pair) for pair in ended) == \
+                        previous - expected
+
+                for first, second in sweep.touching():
+                    assert Collisions.circles_touching(
+                            first.get_circle(), second.get_circle())
+
+                previous = expected
+
+            removed = sprites.pop()
+            sweep.remove(removed)
+
+            assert removed not in sweep
+            assert len(sweep) == len(sprites)
+            assert all(removed not in pair for pair in sweep.pairs())
+
+        # Sprites that pass through each other in one frame still overlap.
+        sweep = SweepAndPrune()
+        fast, still = Sprite(), Sprite()
+
+        fast.setup(Vector(0, 0), 1)
+        still.setup(Vector(50, 0), 1)
+
+        sweep.insert(fast); sweep.insert(still)
+        sweep.update()
+
+        fast.set_position(Vector(100, 0))
+        begun, ended = sweep.update()
+
+        assert sweep.overlapping(fast, still)
+        assert sweep.overlapping(still, fast)
+        assert len(begun) == 1 and not ended
+
+        begun, ended = sweep.update()
+        assert not sweep.overlapping(fast, still)
+        assert not begun and len(ended) == 1
+
+    # Box Tests {{{1
+    def box_tests():
+        """ Make sure the broad phase box tests handle the corner cases. """
+
+        box = Rectangle(10, 10, 20, 20)
+
+        assert Collisions.circle_touching_box(Circle(Vector(15, 15), 1), box)
+        assert Collisions.circle_touching_box(Circle(Vector(5, 15), 5), box)
+        assert not Collisions.circle_touching_box(
+                Circle(Vector(5, 5), 5), box)
+
+        inside = Line(Vector(12, 12), Vector(18, 18))
+        crossing = Line(Vector(0, 15), Vector(30, 15))
+        vertical = Line(Vector(15, 0), Vector(15, 5))
+        diagonal = Line(Vector(0, 25), Vector(25, 0))
+        missing = Line(Vector(0, 12), Vector(12, 0))
+        point = Line(Vector(20, 20), Vector(20, 20))
+
+        assert Collisions.line_touching_box(inside, box)
+        assert Collisions.line_touching_box(crossing, box)
+        assert not Collisions.line_touching_box(vertical, box)
+        assert Collisions.line_touching_box(diagonal, box)
+        assert not Collisions.line_touching_box(missing, box)
+        assert Collisions.line_touching_box(point, box)
+    # }}}1
+
+    print "Testing spatial.py..."
+
+    box_tests()
+    hierarchy_tests()
+    grid_tests()
+    quadtree_tests()
+    ray_tests()
+    sweep_tests()
+
+    print "All tests passed."
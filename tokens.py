@@ -4,6 +4,7 @@ from vector import *
 from collisions import *
 from shapes import *
 from flocking import *
+from spatial import *
 
 class Map:
     # Map {{{1
@@ -16,11 +17,28 @@ class Map:
     def setup(self, world):
         self.world = world
 
+        # The map is set up after every other token, so all of the sprites
+        # already have positions by the time they're indexed.
+        self.quadtree = LooseQuadtree(self.size)
+        for sprite in world.get_me(), world.get_you(), world.get_button():
+            self.quadtree.insert(sprite)
+
     def teardown(self):
         pass
 
     def update(self, time):
-        pass
+        # The map is also updated last, so the index is refreshed after every
+        # sprite has moved.
+        self.quadtree.update_all()
+
+    def query_rect(self, rectangle):
+        return self.quadtree.query_rect(rectangle)
+
+    def query_radius(self, center, radius):
+        return self.quadtree.query_radius(center, radius)
+
+    def nearest(self, center, k=1):
+        return self.quadtree.nearest(center, k)
 
     def place_token(self):
         x = random.random() * self.size.width
@@ -38,6 +56,9 @@ class Map:
 
     def get_players(self):
         return self.players
+
+    def get_quadtree(self):
+        return self.quadtree
     # }}}1
 
 class Player (Sprite):
@@ -58,11 +79,16 @@ class Player (Sprite):
         self.mode = 'Person'
 
     def __getstate__(self):
-        state = {
-                "circle" : self.get_circle(),
-                "velocity" : self.get_velocity() }
+        # Only the circle and the velocity are sent over the network.
+        return self.pack_state()
 
-        return state
+    def __setstate__(self, state):
+        # Tokens that come over the network are never set up.  They only
+        # carry a circle and a velocity, which is all that is needed to
+        # refresh the local copy.  They are given a fixed facing, so that
+        # receiving them doesn't use up any random directions.
+        Sprite.__init__(self, Vector(1, 0))
+        self.unpack_state(state)
 
     def setup(self, world):
         self.world = world
@@ -72,15 +98,12 @@ class Player (Sprite):
     # }}}1
     # Update {{{1
     def update(self, time):
-        map = self.world.get_map()
-
-        # Set the acceleration.
-        force = self.force * self.direction
-        #friction = -self.mass * self.velocity   # This is actually drag.
+        ax, ay = self.steer(time)
+        self.move(time, ax, ay)
 
-        #self.acceleration = force + friction
-        self.acceleration = force
-        Sprite.update(self, time)
+    def move(self, time, ax, ay):
+        map = self.world.get_map()
+        Sprite.integrate(self, time, ax, ay)
 
         # Bounce the sight off the walls.
         boundary = map.get_size()
@@ -94,6 +117,13 @@ class Player (Sprite):
     def accelerate(self, direction):
         self.direction = direction
 
+        # Set the acceleration.
+        force = self.force * self.direction
+        #friction = -self.mass * self.velocity   # This is actually drag.
+
+        #self.acceleration = force + friction
+        self.acceleration = force
+
     def bite(self):
         me = self.get_circle()
         you = self.world.get_you().get_circle()
@@ -136,11 +166,16 @@ class Button (Sprite):
         self.elapsed = 0
 
     def __getstate__(self):
-        state = {
-                "circle" : self.get_circle(),
-                "velocity" : self.get_velocity() }
-
-        return state
+        # Only the circle and the velocity are sent over the network.
+        return self.pack_state()
+
+    def __setstate__(self, state):
+        # Tokens that come over the network are never set up.  They only
+        # carry a circle and a velocity, which is all that is needed to
+        # refresh the local copy.  They are given a fixed facing, so that
+        # receiving them doesn't use up any random directions.
+        Sprite.__init__(self, Vector(1, 0))
+        self.unpack_state(state)
 
     def setup(self, world):
         self.world = world
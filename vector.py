@@ -6,6 +6,12 @@ from __future__ import division
 
 import math
 import random
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class Vector(object):
     """ Represents a two-dimensional vector.  In particular, this class
@@ -20,10 +26,13 @@ class Vector(object):
         return Vector(0, 0)
 
     @staticmethod
-    def random(magnitude=1):
-        """ Create a unit vector pointing in a random direction. """
-        theta = random.uniform(0, 2 * math.pi)
-        return magnitude * Vector(math.cos(theta), math.sin(theta))
+    def random(magnitude=1, directions=None):
+        """ Create a vector pointing in a random direction.  The direction is
+        drawn from the given stream of random directions, or from a stream
+        shared by the whole module if no stream is given. """
+
+        directions = directions or random_directions
+        return directions.next(magnitude)
 
     @staticmethod
     def from_radians(angle):
@@ -87,72 +96,109 @@ class Vector(object):
     # Create shorter aliases for the dot and perp products.
     dot = dot_product
     perp = perp_product
+
+    # Serialization {{{1
+    # Vectors are packed as two little-endian floats.  Doubles are used by
+    # default, but single precision can be requested to halve the size.
+    formats = struct.Struct('<2d'), struct.Struct('<2f')
+
+    @staticmethod
+    def packed_size(single=False):
+        """ Return the number of bytes in a packed vector. """
+        return Vector.formats[single].size
+
+    @staticmethod
+    def unpack(buffer, offset=0, single=False):
+        """ Read a vector from the given offset into a buffer.  Any object
+        that supports the buffer interface can be used, so slices of a
+        memoryview are read without being copied. """
+
+        x, y = Vector.formats[single].unpack_from(buffer, offset)
+        return Vector(x, y)
+
+    def pack(self, single=False):
+        """ Return this vector as a fixed-width binary string. """
+        return Vector.formats[single].pack(self.__x, self.__y)
     # }}}1
 
     # Operators {{{1
+    # Vectors are created by the thousand every frame, so they don't carry an
+    # attribute dictionary.  The derived values are filled in the first time
+    # they are asked for and then reused, which is safe because vectors are
+    # immutable.
+    __slots__ = ('__x', '__y', '__magnitude', '__normal', '__orthonormal')
+
     def __init__(self, x, y):
         """ Construct a vector using the given coordinates. """
         self.__x = x
         self.__y = y
 
+        self.__magnitude = None
+        self.__normal = None
+        self.__orthonormal = None
+
+    def __reduce__(self):
+        """ Pickle this vector as nothing more than its coordinates. """
+        return Vector, (self.__x, self.__y)
+
     def __iter__(self):
         """ Iterate over this vectors coordinates. """
-        yield self.x; yield self.y
+        yield self.__x; yield self.__y
 
     def __add__(self, v):
         """ Return the sum of this vector and the argument. """
-        return Vector(self.x + v.x, self.y + v.y)
+        return Vector(self.__x + v.x, self.__y + v.y)
 
     def __sub__(self, v):
         """ Return the difference between this vector and the argument. """
-        return Vector(self.x - v.x, self.y - v.y)
+        return Vector(self.__x - v.x, self.__y - v.y)
 
     def __neg__(self):
         """ Return a copy of this vector with the signs flipped. """
-        return Vector(-self.x, -self.y)
+        return Vector(-self.__x, -self.__y)
 
     def __abs__(self):
         """ Return the absolute value of this vector. """
-        return Vector(abs(self.x), abs(self.y))
+        return Vector(abs(self.__x), abs(self.__y))
     
     def __mul__(self, c):
         """ Return the scalar product of this vector and the argument. """
-        return Vector(c * self.x, c * self.y)
+        return Vector(c * self.__x, c * self.__y)
 
     def __rmul__(self, c):
         """ Return the scalar product of this vector and the argument. """
-        return Vector(c * self.x, c * self.y)
+        return Vector(c * self.__x, c * self.__y)
 
     def __div__(self, c):
         """ Return the scalar quotient of this vector and the argument.  The
         argument is taken as a float to ensure true division. """
-        return Vector(self.x / float(c), self.y / float(c))
+        return Vector(self.__x / float(c), self.__y / float(c))
 
     def __truediv__(self, c):
         """ Return the scalar quotient of this vector and the argument. """
-        return Vector(self.x / c, self.y / c)
+        return Vector(self.__x / c, self.__y / c)
 
     def __floordiv__(self, c):
         """ Return the integer quotient of this vector and the argument. """
-        return Vector(self.x // c, self.y // c)
+        return Vector(self.__x // c, self.__y // c)
 
     def __mod__(self, c):
         """ Return the remainder after dividing this vector by the argument.
         This should work with integer and floating point input. """
-        return Vector(self.x % c, self.y % c)
+        return Vector(self.__x % c, self.__y % c)
 
     def __eq__(self, other):
         """ Return true if this vector is exactly the same as the argument.
         Floating point rounding error is completely unaccounted for. """
-        return self.x == other.x and self.y == other.y
+        return self.__x == other.x and self.__y == other.y
 
     def __ne__(self, other):
         """ Return true if this vector and the argument are not the same. """
-        return self.x != other.x or self.y != other.y
+        return self.__x != other.x or self.__y != other.y
 
     def __nonzero__(self):
         """ Return true is the vector is not degenerate. """
-        return self.x != 0 or self.y != 0
+        return self.__x != 0 or self.__y != 0
 
     def __repr__(self):
         """ Return a string representation of this vector. """
@@ -186,52 +232,61 @@ class Vector(object):
     @property
     def tuple(self):
         """ Return the vector as a tuple. """
-        return self.x, self.y
+        return self.__x, self.__y
 
     @property
     def pygame(self):
         """ Return the vector as a tuple of integers.  This is the format
         Pygame expects to receive coordinates in. """
-        return int(self.x), int(self.y)
+        return int(self.__x), int(self.__y)
 
     @property
     def magnitude(self):
-        """ Calculate the length of this vector. """
-        return math.sqrt(self.magnitude_squared)
+        """ Calculate the length of this vector.  The result is cached. """
+        if self.__magnitude is None:
+            x, y = self.__x, self.__y
+            self.__magnitude = math.sqrt(x * x + y * y)
+        return self.__magnitude
 
     @property
     def magnitude_squared(self):
         """ Calculate the square of the length of this vector.  This is
         slightly more efficient that finding the real length. """
-        return self.x**2 + self.y**2
+        return self.__x * self.__x + self.__y * self.__y
 
     @property
     def normal(self):
         """ Return a unit vector pointing in the same direction as this
-        one. """
+        one.  The result is cached. """
 
-        try:
-            return self / self.magnitude
-        except ZeroDivisionError:
-            raise NullVectorError()
+        if self.__normal is None:
+            try:
+                self.__normal = self / self.magnitude
+            except ZeroDivisionError:
+                raise NullVectorError()
+
+        return self.__normal
 
     @property
     def orthogonal(self):
         """ Return a vector that is orthogonal to this one.  The resulting
         vector is not normalized. """
-        return Vector(-self.y, self.x)
+        return Vector(-self.__y, self.__x)
 
     @property
     def orthonormal(self):
         """ Return a vector that is both normalized and orthogonal to this
-        one. """
-        return self.orthogonal.normal
+        one.  The result is cached. """
+
+        if self.__orthonormal is None:
+            self.__orthonormal = self.orthogonal.normal
+        return self.__orthonormal
 
     def get_x(self):
-        return self.x
+        return self.__x
 
     def get_y(self):
-        return self.y
+        return self.__y
 
     def get_r(self):
         return self.r
@@ -270,6 +325,343 @@ class Vector(object):
 
     # }}}1
 
+class VectorBatch(object):
+    """ Represents a column of two-dimensional vectors stored in a single
+    NumPy array with one row per vector.  The interface mirrors the Vector
+    class, except that every operation is applied to the whole column at once
+    and scalar results come back as arrays.  Like vectors, batches are
+    immutable; operations always return new batches. """
+
+    # Factory Methods {{{1
+    @staticmethod
+    def null(count):
+        """ Return a batch of null vectors. """
+        return VectorBatch(numpy.zeros((count, 2)))
+
+    @staticmethod
+    def random(count, magnitude=1, directions=None):
+        """ Create a batch of vectors pointing in random directions.  Like
+        Vector.random(), the directions are drawn from the given stream, or
+        from the stream shared by the whole module. """
+
+        directions = directions or random_directions
+        return directions.batch(count, magnitude)
+
+    @staticmethod
+    def from_radians(angles):
+        """ Create a batch of unit vectors from an array of angles. """
+        angles = numpy.asarray(angles, dtype=float)
+        x, y = numpy.cos(angles), numpy.sin(angles)
+        return VectorBatch.from_components(x, y)
+
+    @staticmethod
+    def from_degrees(angles):
+        """ Create a batch of unit vectors from an array of angles. """
+        angles = numpy.asarray(angles, dtype=float)
+        return VectorBatch.from_radians(angles * math.pi / 180)
+
+    @staticmethod
+    def from_components(x, y):
+        """ Create a batch from separate arrays of x and y coordinates. """
+        return VectorBatch(numpy.column_stack((x, y)))
+
+    @staticmethod
+    def from_vectors(vectors):
+        """ Create a batch from any sequence of Vector objects. """
+        coordinates = [(vector.x, vector.y) for vector in vectors]
+        array = numpy.array(coordinates, dtype=float)
+        return VectorBatch(array.reshape(-1, 2))
+
+    @staticmethod
+    def coerce(other):
+        """ Return the argument in a form that can be broadcast against the
+        rows of a batch.  Batches give up their arrays and single vectors are
+        turned into a single row. """
+
+        if isinstance(other, VectorBatch):
+            return other.array
+        if isinstance(other, Vector):
+            return numpy.array((other.x, other.y))
+        return numpy.asarray(other, dtype=float)
+
+    @staticmethod
+    def scalars(c):
+        """ Return the argument in a form that can scale each row of a batch.
+        Arrays with one value per row are turned into a column. """
+
+        c = numpy.asarray(c, dtype=float)
+        return c[:, numpy.newaxis] if c.ndim == 1 else c
+
+    # Math Methods {{{1
+    @staticmethod
+    def get_distance(A, B):
+        """ Return the Euclidean distances between the two input batches. """
+        return (A - B).magnitude
+
+    @staticmethod
+    def get_manhattan(A, B):
+        """ Return the Manhattan distances between the two input batches. """
+        disp = B - A
+        return numpy.abs(disp.x) + numpy.abs(disp.y)
+
+    @staticmethod
+    def dot_product(A, B):
+        """ Return the row-wise dot products of the given batches. """
+        A = VectorBatch.coerce(A); B = VectorBatch.coerce(B)
+        return A[..., 0] * B[..., 0] + A[..., 1] * B[..., 1]
+
+    @staticmethod
+    def perp_product(A, B):
+        """ Return the row-wise perp products of the given batches. """
+        A = VectorBatch.coerce(A); B = VectorBatch.coerce(B)
+        return A[..., 0] * B[..., 1] - A[..., 1] * B[..., 0]
+
+    # Create shorter aliases for the dot and perp products.
+    dot = dot_product
+    perp = perp_product
+    # }}}1
+
+    # Operators {{{1
+    def __init__(self, coordinates):
+        """ Construct a batch from an array-like object with two columns.  The
+        coordinates are copied into an array that can't be written to, so
+        that the batch can't be changed through the original array or
+        through any of its attributes. """
+
+        if numpy is None:
+            raise ImportError("VectorBatch requires NumPy.")
+
+        array = numpy.array(coordinates, dtype=float).reshape(-1, 2)
+        array.flags.writeable = False
+
+        self.__array = array
+
+    def __len__(self):
+        """ Return the number of vectors in this batch. """
+        return len(self.__array)
+
+    def __iter__(self):
+        """ Iterate over this batch as individual Vector objects. """
+        for x, y in self.__array.tolist():
+            yield Vector(x, y)
+
+    def __getitem__(self, index):
+        """ Return a single vector, or a smaller batch if the index selects
+        more than one row. """
+
+        rows = self.__array[index]
+        if rows.ndim == 1:
+            return Vector(float(rows[0]), float(rows[1]))
+        return VectorBatch(rows)
+
+    def __add__(self, v):
+        """ Return the sum of this batch and the argument. """
+        return VectorBatch(self.__array + VectorBatch.coerce(v))
+
+    def __radd__(self, v):
+        """ Return the sum of this batch and the argument. """
+        return VectorBatch(VectorBatch.coerce(v) + self.__array)
+
+    def __sub__(self, v):
+        """ Return the difference between this batch and the argument. """
+        return VectorBatch(self.__array - VectorBatch.coerce(v))
+
+    def __rsub__(self, v):
+        """ Return the difference between the argument and this batch. """
+        return VectorBatch(VectorBatch.coerce(v) - self.__array)
+
+    def __neg__(self):
+        """ Return a copy of this batch with the signs flipped. """
+        return VectorBatch(-self.__array)
+
+    def __abs__(self):
+        """ Return the absolute value of every vector in this batch. """
+        return VectorBatch(numpy.abs(self.__array))
+
+    def __mul__(self, c):
+        """ Return the scalar product of this batch and the argument, which
+        may be a single number or one number per row. """
+        return VectorBatch(self.__array * VectorBatch.scalars(c))
+
+    def __rmul__(self, c):
+        """ Return the scalar product of this batch and the argument. """
+        return VectorBatch(VectorBatch.scalars(c) * self.__array)
+
+    def __div__(self, c):
+        """ Return the scalar quotient of this batch and the argument. """
+        return self.__truediv__(c)
+
+    def __truediv__(self, c):
+        """ Return the scalar quotient of this batch and the argument. """
+        return VectorBatch(self.__array / VectorBatch.scalars(c))
+
+    def __eq__(self, other):
+        """ Return true if every vector in this batch is exactly the same as
+        the corresponding vector in the argument. """
+        other = VectorBatch.coerce(other)
+        return self.__array.shape == other.shape and \
+                bool((self.__array == other).all())
+
+    def __ne__(self, other):
+        """ Return true if this batch and the argument are not the same. """
+        return not self == other
+
+    def __repr__(self):
+        """ Return a string representation of this batch. """
+        return "<VectorBatch: %d vectors>" % len(self)
+
+    # Attributes {{{1
+    @property
+    def x(self):
+        """ Get the first coordinate of every vector in this batch. """
+        return self.__array[:, 0]
+
+    @property
+    def y(self):
+        """ Get the second coordinate of every vector in this batch. """
+        return self.__array[:, 1]
+
+    @property
+    def array(self):
+        """ Get the underlying N x 2 array.  It is read-only. """
+        return self.__array
+
+    @property
+    def vectors(self):
+        """ Return this batch as a list of Vector objects. """
+        return list(self)
+
+    @property
+    def magnitude(self):
+        """ Calculate the length of every vector in this batch. """
+        return numpy.sqrt(self.magnitude_squared)
+
+    @property
+    def magnitude_squared(self):
+        """ Calculate the squared length of every vector in this batch. """
+        x, y = self.x, self.y
+        return x * x + y * y
+
+    @property
+    def normal(self):
+        """ Return a batch of unit vectors pointing in the same directions as
+        the vectors in this one.  Like Vector.normal, this fails if any of
+        the vectors are null. """
+
+        magnitude = self.magnitude
+        if not magnitude.all():
+            raise NullVectorError()
+
+        return self / magnitude
+
+    @property
+    def orthogonal(self):
+        """ Return a batch of vectors that are orthogonal to these ones. """
+        return VectorBatch.from_components(-self.y, self.x)
+
+    @property
+    def orthonormal(self):
+        """ Return a batch of unit vectors orthogonal to these ones. """
+        return self.orthogonal.normal
+
+    def get_x(self):
+        return self.x
+
+    def get_y(self):
+        return self.y
+
+    def get_array(self):
+        return self.array
+
+    def get_vectors(self):
+        return self.vectors
+
+    def get_magnitude(self):
+        return self.magnitude
+
+    def get_magnitude_squared(self):
+        return self.magnitude_squared
+
+    def get_normal(self, magnitude=1):
+        return magnitude * self.normal
+
+    def get_orthogonal(self):
+        return self.orthogonal
+
+    def get_orthonormal(self, magnitude=1):
+        return magnitude * self.orthonormal
+
+    # }}}1
+
+class RandomDirections(object):
+    """ Produces a reproducible stream of random unit vectors.  Directions are
+    generated in bulk and handed out one at a time, which is much cheaper
+    than finding a sine and a cosine every time one is needed.  Two streams
+    created with the same seed will produce the same directions, although
+    the directions depend on whether or not NumPy is installed. """
+
+    # Operators {{{1
+    def __init__(self, seed=None, size=1024):
+        self.size = size
+        self.seed(seed)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    # Methods {{{1
+    def seed(self, seed=None):
+        """ Restart this stream from the given seed. """
+
+        if numpy is not None:
+            self.generator = numpy.random.RandomState(seed)
+        else:
+            self.generator = random.Random(seed)
+
+        self.buffer = []
+        self.index = 0
+
+    def refill(self):
+        """ Replace the buffer with a new set of random directions. """
+
+        if numpy is not None:
+            theta = self.generator.uniform(0, 2 * math.pi, self.size)
+            x = numpy.cos(theta).tolist()
+            y = numpy.sin(theta).tolist()
+        else:
+            uniform = self.generator.uniform
+            theta = [uniform(0, 2 * math.pi) for index in range(self.size)]
+            x = [math.cos(angle) for angle in theta]
+            y = [math.sin(angle) for angle in theta]
+
+        self.buffer = [Vector(*pair) for pair in zip(x, y)]
+        self.index = 0
+
+    def next(self, magnitude=1):
+        """ Return the next direction in this stream, scaled to the given
+        magnitude.  Unit vectors are handed out without being copied. """
+
+        if self.index >= len(self.buffer):
+            self.refill()
+
+        direction = self.buffer[self.index]
+        self.index += 1
+
+        return direction if magnitude == 1 else magnitude * direction
+
+    def batch(self, count, magnitude=1):
+        """ Return the next several directions in this stream as a batch.
+        This requires NumPy. """
+        return magnitude * VectorBatch.from_vectors(
+                [self.next() for index in range(count)])
+    # }}}1
+
+# This stream is used whenever a random direction is requested without
+# specifying a stream.  Seed it to make a whole run reproducible.
+random_directions = RandomDirections()
+
 class NullVectorError(Exception):
     """ Thrown when an operation chokes on a null vector. """
     pass
@@ -295,11 +687,128 @@ if __name__ == "__main__":
         degenerate input. """
 
         pass
+
+    # Batch Tests {{{1
+    def batch_tests():
+        """ Make sure that vector batches give the same answers as the
+        equivalent vector operations. """
+
+        if numpy is None:
+            print "NumPy is not installed, skipping the batch tests."
+            return
+
+        vectors = [Vector(3, 4), Vector(-1, 2), Vector(0, -5)]
+        others = [Vector(1, 1), Vector(2, -3), Vector(4, 0)]
+
+        batch = VectorBatch.from_vectors(vectors)
+        other = VectorBatch.from_vectors(others)
+
+        assert len(batch) == 3
+        assert list(batch) == vectors
+        assert batch.vectors == vectors
+        assert batch[1] == vectors[1]
+        assert batch[1:].vectors == vectors[1:]
+
+        pairs = zip(vectors, others)
+        offset = Vector(1, 1)
+
+        assert (batch + other).vectors == [a + b for a, b in pairs]
+        assert (batch - other).vectors == [a - b for a, b in pairs]
+        assert (batch + offset).vectors == [a + offset for a in vectors]
+        assert (-batch).vectors == [-a for a in vectors]
+        assert (2 * batch).vectors == [2 * a for a in vectors]
+        assert (batch * [1, 2, 3]).vectors == [
+                a * c for a, c in zip(vectors, (1, 2, 3))]
+        assert (batch / 2).vectors == [a / 2 for a in vectors]
+
+        assert list(VectorBatch.dot(batch, other)) == [
+                Vector.dot(a, b) for a, b in zip(vectors, others)]
+        assert list(VectorBatch.perp(batch, other)) == [
+                Vector.perp(a, b) for a, b in zip(vectors, others)]
+        assert list(VectorBatch.get_distance(batch, other)) == [
+                Vector.get_distance(a, b) for a, b in zip(vectors, others)]
+
+        assert list(batch.magnitude) == [a.magnitude for a in vectors]
+        assert batch.normal.vectors == [a.normal for a in vectors]
+        assert batch.orthogonal.vectors == [a.orthogonal for a in vectors]
+        assert batch.orthonormal.vectors == [a.orthonormal for a in vectors]
+
+        try: VectorBatch.null(2).normal
+        except NullVectorError: pass
+        else: assert False
+
+        directions = VectorBatch.random(100, 2)
+        assert numpy.allclose(directions.magnitude, 2)
+
+        first = VectorBatch.random(30, directions=RandomDirections(seed=3))
+        second = VectorBatch.random(30, directions=RandomDirections(seed=3))
+        assert first == second
+
+        # Batches keep their own read-only copy of the coordinates.
+        coordinates = numpy.array([[1.0, 2.0], [3.0, 4.0]])
+        batch = VectorBatch(coordinates)
+        coordinates[0, 0] = 5
+
+        assert batch[0] == Vector(1, 2)
+
+        for array in batch.x, batch.y, batch.array:
+            try: array[0] = 5
+            except ValueError: pass
+            else: assert False
+
+        stream = RandomDirections(seed=1, size=10)
+        directions = stream.batch(25, 2)
+        assert numpy.allclose(directions.magnitude, 2)
+
+    # Serialization Tests {{{1
+    def serialization_tests():
+        """ Make sure that vectors survive being packed and unpacked, even
+        when they're read out of the middle of a larger buffer. """
+
+        vector = Vector(1.5, -2.25)
+
+        assert len(vector.pack()) == Vector.packed_size() == 16
+        assert len(vector.pack(True)) == Vector.packed_size(True) == 8
+
+        assert Vector.unpack(vector.pack()) == vector
+        assert Vector.unpack(vector.pack(True), single=True) == vector
+
+        buffer = memoryview(Vector(0, 0).pack() + vector.pack())
+        assert Vector.unpack(buffer, 16) == vector
+        assert Vector.unpack(buffer[16:]) == vector
+
+    # Random Tests {{{1
+    def random_tests():
+        """ Make sure that streams of random directions can be reproduced and
+        that they only produce unit vectors. """
+
+        first = RandomDirections(seed=1, size=10)
+        second = RandomDirections(seed=1, size=7)
+        third = RandomDirections(seed=2, size=10)
+
+        A = [first.next() for index in range(25)]
+        B = [second.next() for index in range(25)]
+        C = [third.next() for index in range(25)]
+
+        assert A == B
+        assert A != C
+
+        for direction in A:
+            assert abs(direction.magnitude - 1) < 1e-12
+
+        first.seed(1)
+        assert [first.next() for index in range(25)] == A
+
+        vector = Vector.random(3, directions=third)
+        assert abs(vector.magnitude - 3) < 1e-12
     # }}}1
 
     print "Testing vector.py..."
 
     factory_tests()
+    batch_tests()
+    random_tests()
+    serialization_tests()
 
     print "All tests passed."
     print "However, there are not many tests for this module.  Use with caution."
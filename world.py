@@ -5,6 +5,7 @@ import network
 
 from tokens import *
 from collisions import *
+from spatial import *
 
 class World:
 
@@ -21,6 +22,16 @@ class World:
         self.behavior = False
         self.playing = True
 
+        # What every sprite looked like at the start of the last update.
+        # Anything that needs a consistent view of the world, like steering
+        # or collision checks, can read from it while the sprites move.
+        self.snapshot = Snapshot(())
+        self.tick = 0
+
+        # Sprites that jumped somewhere new since the start of the last
+        # update, rather than moving there.
+        self.teleported = []
+
     def __iter__(self):
         tokens = self.me, self.you, self.button, self.map
         #tokens = self.me, self.you, self.map
@@ -50,6 +61,23 @@ class World:
 
     def get_message(self):
         return self.message
+
+    def get_snapshot(self):
+        return self.snapshot
+
+    def get_previous_circle(self, sprite):
+        return self.snapshot.get_circle(sprite)
+
+    def get_motion(self, sprite):
+        """ Return where the given sprite started the last update and how
+        far it moved.  Teleported sprites didn't pass through anything on
+        their way, so they only count where they ended up. """
+
+        if sprite in self.teleported:
+            return sprite.get_circle(), Vector.null()
+
+        start = self.get_previous_circle(sprite)
+        return start, sprite.get_position() - start.center
     # }}}1
 
     # Setup and Update {{{1
@@ -63,6 +91,16 @@ class World:
         for token in self:
             token.setup(self)
 
+        # Only sprites that might be touching are checked for collisions.
+        self.sweep = SweepAndPrune()
+        for sprite in self.me, self.you, self.button:
+            self.sweep.insert(sprite)
+
+        # Things that happen when sprites meet should only happen once, even
+        # if the sprites stay together for several frames.
+        self.contacts = ContactTracker()
+        self.contacts.callback(enter=self.handle_contact)
+
         self.network = self.game.get_network()
 
         self.network.callback(
@@ -81,30 +119,64 @@ class World:
                 outgoing=self.handle_game_over)
 
     def update (self, time):
-        for token in self:
+        sprites = self.me, self.you, self.button
+
+        self.snapshot = Snapshot(sprites, self.tick)
+        self.teleported = []
+
+        # The players are all steered from the snapshot before any of them
+        # move, so it doesn't matter which one goes first.
+        players = self.me, self.you
+        accelerations = self.snapshot.steer(players, time)
+
+        for player, (ax, ay) in zip(players, accelerations):
+            player.move(time, ax, ay)
+
+        for token in self.button, self.map:
             token.update(time)
 
-        if self.is_person():
-            person = self.get_me().get_circle()
-            button = self.get_button().get_circle()
+        self.sweep.update()
+
+        # Fast sprites can pass right over each other in one step, so check
+        # the whole path of each sprite rather than just where it ended up.
+        touching = []
+        for first, second in self.sweep.pairs():
+            A, U = self.get_motion(first)
+            B, V = self.get_motion(second)
 
-            # Switch roles if the person has reached the button.
-            if Collisions.circles_touching(person, button):
-                self.flip_roles()
+            if Collisions.circles_impact(A, U, B, V) is not None:
+                touching.append((first, second))
+
+        self.contacts.update(touching)
+        self.tick += 1
 
     # Methods {{{1
     def teardown(self):
         for token in self:
             token.teardown()
 
+    def interpolate(self, sprite, fraction):
+        """ Return where the given sprite was the given fraction of the way
+        through the last update.  Teleported sprites are always drawn where
+        they ended up, rather than sliding there. """
+
+        previous = self.get_previous_circle(sprite).center
+        current = sprite.get_position()
+
+        if fraction >= 1 or sprite in self.teleported: return current
+        return previous + (current - previous) * fraction
+
     def refresh (self, you, button):
         # The two arguments are technically token objects, but they came over
         # the network and were never fully set up.  They only have circle and
-        # velocity attributes.  
+        # velocity attributes.  The local copies jump to wherever the network
+        # says they are, so they shouldn't be drawn sliding there.
 
         self.you.refresh(you)
         self.button.refresh(button)
 
+        self.teleported.extend((self.you, self.button))
+
     def handle_eat_player(self, eater, person, message):
         if eater is self.me:
             self.you.lose_health(1)
@@ -131,6 +203,12 @@ class World:
         else: raise AssertionError
 
 
+    def handle_contact(self, first, second):
+        # Switch roles if the person has reached the button.
+        if self.is_person() and self.button in (first, second) \
+                and self.me in (first, second):
+            self.flip_roles()
+
     def handle_game_over(self, winner, loser, message):
         self.playing = False
         self.message = "You win!" if winner is self.me else "You lose!"
@@ -158,5 +236,157 @@ class World:
     def move_button(self):
         position = self.place_token()
         self.button.set_position(position)
+        self.teleported.append(self.button)
     # }}}1
 
+if __name__ == "__main__":
+
+    # Contact Tests {{{1
+    def contact_tests():
+        """ Make sure that the person only reaches the button by moving into
+        it, and not when the button jumps past them. """
+
+        class Network:
+            def __init__(self): self.flips = 0
+            def callback(self, **arguments): pass
+            def flip_roles(self): self.flips += 1
+
+        class Game:
+            def __init__(self): self.network = Network()
+            def get_network(self): return self.network
+
+        def world(button):
+            world = World(Game())
+            world.setup()
+            world.become_person()
+
+            world.place_token = lambda: button
+            world.me.set_position(Vector(100, 100))
+            world.me.set_velocity(Vector(0, 0))
+            world.me.accelerate(Vector(0, 0))
+            world.you.set_position(Vector(400, 400))
+            world.button.set_position(Vector(50, 100))
+            world.button.reset_timer()
+
+            world.update(0.01)
+            return world
+
+        # The button jumps right across the person.
+        teleport = world(Vector(150, 100))
+        teleport.button.elapsed = teleport.button.get_timeout()
+        teleport.update(0.01)
+
+        assert teleport.button.get_position() == Vector(150, 100)
+        assert teleport.network.flips == 0
+        assert teleport.interpolate(teleport.button, 0) == Vector(150, 100)
+
+        # Players refreshed by the network also jump to where they are now.
+        you, button = Player('Ghost', 100, 1, 200, 10, 100), Button(10, 5)
+        you.set_circle(Circle(Vector(300, 200), 10))
+        button.set_circle(teleport.button.get_circle())
+
+        teleport.refresh(you, button)
+        assert teleport.interpolate(teleport.you, 0.5) == Vector(300, 200)
+
+        # The person runs right across the button.
+        running = world(Vector(50, 100))
+        running.me.set_velocity(Vector(-100, 0))
+        running.update(1)
+
+        assert running.me.get_position().x < 40
+        assert running.network.flips == 1
+        assert running.interpolate(running.me, 0.5) == Vector(50, 100)
+
+        # Players that chase each other are steered from where both of them
+        # were at the start of the update.
+        chase = world(Vector(50, 100))
+        me, you = chase.me, chase.you
+
+        me.add_behavior(Seek(me, 1, you))
+        you.add_behavior(Seek(you, 1, me))
+        me.set_velocity(Vector(0, 50))
+
+        mine = (you.get_position() - me.get_position()).normal
+        yours = (me.get_position() - you.get_position()).normal
+
+        chase.update(0.1)
+
+        assert me.behaviors[0].get_last_force() == \
+                mine * me.get_speed() - Vector(0, 50)
+        assert you.behaviors[0].get_last_force() == yours * you.get_speed()
+
+    # Pickle Tests {{{1
+    def pickle_tests():
+        """ Make sure that tokens sent over the network don't use up any of
+        the shared random directions when they are received. """
+
+        import pickle
+        from vector import random_directions, RandomDirections
+
+        player = Player('Test', 100, 1, 200, 10, 100)
+        button = Button(10, 5)
+
+        player.set_circle(Circle(Vector(1, 2), 10))
+        player.set_velocity(Vector(3, 4))
+        button.set_circle(Circle(Vector(5, 6), 10))
+
+        messages = [pickle.dumps(token) for token in player, button]
+
+        random_directions.seed(4)
+        received = [pickle.loads(message) for message in messages]
+
+        assert Vector.random() == RandomDirections(4).next()
+        assert received[0].get_circle() == player.get_circle()
+        assert received[0].get_velocity() == player.get_velocity()
+        assert received[1].get_circle() == button.get_circle()
+
+    # Step Tests {{{1
+    def step_tests():
+        """ Make sure that the game takes fixed steps, drops the time it
+        can't catch up on, and remembers how far into the next step it is.
+        Running game.py starts the game, so its tests live here. """
+
+        from game import Game
+
+        class Stepper(Game):
+            def __init__(self):
+                self.world = Counter()
+                self.accumulator = 0
+                self.interpolation = 1
+
+        class Counter:
+            def __init__(self): self.steps = []
+            def update(self, time): self.steps.append(time)
+
+        def close(first, second):
+            return abs(first - second) < 1e-9
+
+        game = Stepper()
+        step = 1 / settings.step_rate
+        limit = settings.max_steps
+
+        # A long frame takes as many steps as it's allowed to, and only
+        # keeps the part of a step that was left over.
+        assert game.step((limit + 2.5) * step) == limit
+        assert game.world.steps == [step] * limit
+        assert close(game.accumulator, 0.5 * step)
+        assert close(game.get_interpolation(), 0.5)
+
+        # A short frame doesn't take a step until enough time has built up.
+        assert game.step(0.25 * step) == 0
+        assert close(game.get_interpolation(), 0.75)
+
+        assert game.step(0.5 * step) == 1
+        assert len(game.world.steps) == limit + 1
+        assert close(game.accumulator, 0.25 * step)
+        assert close(game.get_interpolation(), 0.25)
+    # }}}1
+
+    print "Testing world.py..."
+
+    contact_tests()
+    pickle_tests()
+    step_tests()
+
+    print "All tests passed."
+